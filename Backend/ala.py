@@ -1,65 +1,141 @@
+# ala.py
+# Purpose: join the GloBI interactions (plant_animal_interactions.csv) with the
+# ALA checklist on the canonical animal name -> table_store "filtered_merged".
+# - Only keep_cols of the checklist are read. Its canonical name keys are
+#   factorized once into integer codes (one dictionary, shared by every chunk)
+#   and its rows are grouped by code
+# - The interactions are streamed in ALA_CHUNK_ROWS chunks: each chunk's keys
+#   are looked up in that dictionary, joined on the codes (repeat / take) and
+#   the joined chunk is written out at once, so memory follows the checklist,
+#   not interactions x checklist columns
+# - Two passes keep the row order of the in-memory version: pass 1 writes the
+#   rows that are not hostOf/hasHost, pass 2 the hostOf/hasHost rows, first
+#   per (plant, animal) pair, relabelled "has Host". The pairs seen so far are
+#   kept as integer codes (plant code, animal code), not strings
+
+import os
+
+import numpy as np
 import pandas as pd
 
+from table_store import FrameWriter, frame_path
+from taxon_names import canonical_keys
+
 # ---------------- I/O ----------------
-df1 = pd.read_csv("plant_animal_interactions.csv")
-df2 = pd.read_csv("checklist-2025-09-13.csv")
-
-# ---------------- Clean df1 ----------------
-# Drop rows where plant and animal names are identical (case-insensitive)
-df1 = df1[
-    df1["plant_scientific_name"].astype(str).str.strip().str.lower()
-    != df1["animal_taxon_name"].astype(str).str.strip().str.lower()
-]
+INTERACTIONS = "plant_animal_interactions.csv"
+CHECKLIST = "checklist-2025-09-13.csv"
+OUT_TABLE = "filtered_merged"
+CHUNK_ROWS = int(os.getenv("ALA_CHUNK_ROWS", "200000"))   # interaction rows per chunk
 
-# Drop rows with very long animal names (> 80 chars)
-df1 = df1[df1["animal_taxon_name"].astype(str).str.len() <= 80]
-
-# --- NEW: dedup within hostOf/hasHost by identical (plant, animal) pair,
-#          then normalize kept relation to "has Host"
-inter_col = "interaction_type_raw" if "interaction_type_raw" in df1.columns else "interaction_type"
-if inter_col in df1.columns:
-    inter_norm = df1[inter_col].astype(str).str.strip().str.lower()
-    host_mask = inter_norm.isin(["hostof", "hashost", "has host"])
-    if host_mask.any():
-        # normalized pair
-        df1["_p"] = df1["plant_scientific_name"].astype(str).str.strip().str.lower()
-        df1["_a"] = df1["animal_taxon_name"].astype(str).str.strip().str.lower()
-
-        # keep first per (plant, animal) inside hostOf/hasHost
-        keep_idx = (
-            df1.loc[host_mask]
-            .drop_duplicates(subset=["_p", "_a"], keep="first")
-            .index
-        )
-
-        # recombine: non-host rows + deduped host rows
-        df1 = pd.concat([df1.loc[~host_mask], df1.loc[keep_idx]], ignore_index=True)
-
-        # standardize relation text
-        inter_norm2 = df1[inter_col].astype(str).str.strip().str.lower()
-        host_mask2 = inter_norm2.isin(["hostof", "hashost", "has host"])
-        df1.loc[host_mask2, inter_col] = "has Host"
-
-        # cleanup helpers
-        df1 = df1.drop(columns=[c for c in ["_p", "_a"] if c in df1.columns])
-
-# ---------------- Prepare df2 ----------------
 keep_cols = [
     "Species","Species Name","Scientific Name Authorship",
     "Taxon Rank","Kingdom","Phylum","Class","Order","Family","Genus",
     "Vernacular Name","Number of records"
 ]
-df2 = df2[keep_cols].rename(columns={"Species Name": "animal_taxon_name"})
+MAX_ANIMAL_NAME = 80
+HOST_TYPES = ["hostof", "hashost", "has host"]
+
+# ---------------- Checklist (right side) ----------------
+class Checklist:
+    """keep_cols of the checklist with its rows grouped by the code of their animal key."""
+
+    def __init__(self, path: str):
+        df = pd.read_csv(path, usecols=keep_cols)
+        self.df = df[keep_cols].rename(columns={"Species Name": "animal_taxon_name"})
+        codes, uniques = pd.factorize(canonical_keys(self.df["animal_taxon_name"]))
+        self.keys = pd.Index(uniques)                      # key -> code
+        self.order = np.argsort(codes, kind="stable")      # rows by code, file order within a code
+        self.counts = np.bincount(codes, minlength=len(uniques))
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def codes(self, keys: pd.Series) -> np.ndarray:
+        """Code of every animal key, -1 where the checklist has no such key."""
+        return self.keys.get_indexer(keys)
+
+    def join(self, left: pd.DataFrame, codes: np.ndarray) -> pd.DataFrame:
+        """
+        Inner join of `left` (animal codes `codes`) with the checklist: same
+        rows, order and columns (_x / _y suffixes) as pd.merge(..., how="inner").
+        """
+        rows = np.flatnonzero(codes >= 0)
+        codes = codes[rows]
+        n = self.counts[codes]
+        left_pos = np.repeat(rows, n)
+        within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        right_pos = self.order[np.repeat(self.starts[codes], n) + within]
+
+        both = set(left.columns) & set(self.df.columns)
+        out = {}
+        for c in left.columns:
+            out[f"{c}_x" if c in both else c] = left[c].take(left_pos).reset_index(drop=True)
+        for c in self.df.columns:
+            out[f"{c}_y" if c in both else c] = self.df[c].take(right_pos).reset_index(drop=True)
+        return pd.DataFrame(out)
+
+# ---------------- Interactions (left side) ----------------
+def read_chunks():
+    # as text: per-chunk type inference could type one column differently per chunk
+    return pd.read_csv(INTERACTIONS, dtype=str, chunksize=CHUNK_ROWS)
+
+def clean(chunk: pd.DataFrame):
+    """(rows kept, their plant keys, their animal keys)."""
+    plant = canonical_keys(chunk["plant_scientific_name"])
+    animal = canonical_keys(chunk["animal_taxon_name"])
+    # Drop rows where plant and animal names are the same taxon (canonical key)
+    keep = plant != animal
+    # Drop rows with very long animal names (> 80 chars)
+    keep &= chunk["animal_taxon_name"].astype(str).str.len() <= MAX_ANIMAL_NAME
+    return chunk[keep], plant[keep], animal[keep]
+
+def host_mask(chunk: pd.DataFrame, inter_col: str) -> pd.Series:
+    return chunk[inter_col].astype(str).str.strip().str.lower().isin(HOST_TYPES)
+
+# ---------------- Merge ----------------
+def main():
+    ck = Checklist(CHECKLIST)
+    header = pd.read_csv(INTERACTIONS, dtype=str, nrows=0)
+    inter_col = next((c for c in ("interaction_type_raw", "interaction_type") if c in header.columns), None)
+    out_path = frame_path(OUT_TABLE)
+
+    with FrameWriter(out_path, table=OUT_TABLE) as out:
+        # pass 1: rows that are not hostOf/hasHost, in file order
+        for chunk in read_chunks():
+            chunk, _, animal = clean(chunk)
+            if inter_col:
+                rest = ~host_mask(chunk, inter_col)
+                chunk, animal = chunk[rest], animal[rest]
+            joined = ck.join(chunk, ck.codes(animal))
+            if len(joined):
+                out.write(joined)
+
+        # pass 2: hostOf/hasHost rows, first per (plant, animal) pair, as "has Host".
+        # Rows whose animal is not in the checklist never reach the output, so
+        # only matched rows are deduplicated
+        plant_codes: dict = {}      # plant key -> code, grows over the chunks
+        seen: set = set()           # plant code * len(checklist keys) + animal code
+        for chunk in (read_chunks() if inter_col else []):
+            chunk, plant, animal = clean(chunk)
+            codes = ck.codes(animal)
+            hit = (host_mask(chunk, inter_col) & (codes >= 0)).to_numpy()
+            chunk, plant, codes = chunk[hit], plant[hit], codes[hit]
+
+            p_codes, p_uniques = pd.factorize(plant)
+            p_codes = np.array([plant_codes.setdefault(k, len(plant_codes)) for k in p_uniques],
+                               dtype=np.int64)[p_codes]
+            pairs = pd.Index(p_codes * len(ck.keys) + codes)
+            first = ~pairs.duplicated() & ~pairs.isin(seen)
+            seen.update(pairs[first])
 
-# ---------------- Merge (case-insensitive on animal name) ----------------
-df1["animal_taxon_name_lower"] = df1["animal_taxon_name"].astype(str).str.strip().str.lower()
-df2["animal_taxon_name_lower"] = df2["animal_taxon_name"].astype(str).str.strip().str.lower()
+            chunk = chunk[first].copy()
+            chunk[inter_col] = "has Host"
+            joined = ck.join(chunk, codes[first])
+            if len(joined):
+                out.write(joined)
 
-merged = pd.merge(df1, df2, on="animal_taxon_name_lower", how="inner")
+        if not out.rows:    # nothing matched: an empty table with the merged columns and dtypes
+            out.write(ck.join(header, np.empty(0, dtype=np.intp)))
 
-# Drop helper col
-merged = merged.drop(columns=["animal_taxon_name_lower"])
+    print(f"Done! {out.rows} rows saved to {out_path}")
 
-# ---------------- Save ----------------
-merged.to_csv("filtered_merged.csv", index=False, encoding="utf-8")
-print(f"Done! {len(merged)} rows saved to filtered_merged.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
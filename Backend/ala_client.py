@@ -0,0 +1,236 @@
+# ala_client.py
+# Purpose: HTTP client shared by the ALA fetchers (alaimage.py, alalocation.py).
+# - One CachedSession (http_cache.py) with a connection pool sized for ALA_WORKERS
+# - get_json(): retries/backoff + one global request budget (ALA_RATE req/s,
+#   ALA_BURST) shared by every thread; a 429 pauses the whole budget for its
+#   Retry-After; fresh cache hits do not spend budget
+# - map_ordered(): runs a function over many species on a thread pool and
+#   yields the results in input order, so checkpoints are committed in order
+# - Every call is timed per label in fetch_metrics.py (plus retries, 429s and
+#   the time spent waiting on the budget / 429 pauses / backoff)
+# - biocache_images(): one biocache search for up to ALA_IMAGE_BATCH species
+#   (taxon names OR-ed in one q), first image per species
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import fetch_metrics as metrics
+import http_cache
+from http_cache import CacheMiss, CachedSession
+
+# ---------------------------- Configuration ----------------------------
+ALA_WORKERS = int(os.getenv("ALA_WORKERS", "8"))        # requests in flight
+ALA_RATE = float(os.getenv("ALA_RATE", "5"))            # requests / second, all threads
+ALA_BURST = int(os.getenv("ALA_BURST", "5"))
+ALA_IMAGE_BATCH = int(os.getenv("ALA_IMAGE_BATCH", "20"))  # species per biocache image query (1 = off)
+IMAGE_RECORDS_PER_SPECIES = 5                           # page size of a batch query, per species
+RETRIES = 3
+BACKOFF_BASE = 0.8
+
+# Public Biocache WS (no key required); every base URL can be pointed at
+# mock_sources.py for offline runs
+BIOCACHE_WS = os.getenv("ALA_BIOCACHE_WS", "https://biocache-ws.ala.org.au/ws")
+# ALA species endpoints (may or may not work anonymously)
+ALA_BASE = os.getenv("ALA_API_BASE", "https://api.ala.org.au")
+# Wikipedia REST summary (public) — MUST send a User-Agent per policy
+WIKI_BASE = os.getenv("WIKI_SUMMARY_BASE", "https://en.wikipedia.org/api/rest_v1/page/summary")
+WIKI_UA = "ALA-helper/1.0 (contact: ylii0684@student.monash.edu)"
+
+# ---------------------------- Rate budget ----------------------------
+class RateBudget:
+    """Thread-safe token bucket: `rate` requests/second, up to `burst` saved up."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait, reason = (1 - self._tokens) / self.rate, "rate_limit"
+                else:
+                    wait, reason = self._paused_until - now, "429_pause"
+            metrics.sleep(wait, reason)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (server asked us to back off)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+BUDGET = RateBudget(ALA_RATE, ALA_BURST)
+STATS = {"requests": 0, "429": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        STATS[key] += 1
+
+# ---------------------------- HTTP helper ----------------------------
+# GETs go through the on-disk cache (http_cache.py, HTTP_CACHE_MODE=on|off|replay)
+SESSION = CachedSession()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=ALA_WORKERS)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+
+def _retry_after(r: requests.Response, attempt: int) -> float:
+    try:
+        return max(float(r.headers.get("Retry-After", "")), 0.0)
+    except ValueError:
+        return BACKOFF_BASE * attempt
+
+
+def _is_cached(url: str, params: Dict) -> bool:
+    mode = http_cache.HTTP_CACHE_MODE
+    if mode == "off":
+        return False
+    hit = http_cache.lookup(url, params)
+    return mode == "replay" or (hit is not None and hit[3])
+
+
+def get_json(url: str, params: Dict, label: str, headers: Optional[Dict] = None,
+             timeout: float = 20) -> Optional[object]:
+    """GET JSON within the shared budget, with retries/backoff; None on failure."""
+    req_headers = {"accept": "application/json"}
+    if headers:
+        req_headers.update(headers)
+
+    for attempt in range(1, RETRIES + 1):
+        try:
+            if not _is_cached(url, params):
+                BUDGET.acquire()
+                _count("requests")
+            t0 = time.perf_counter()
+            try:
+                r = SESSION.get(url, params=params, headers=req_headers, timeout=timeout)
+            except requests.RequestException:
+                metrics.observe(label, time.perf_counter() - t0, "error")
+                raise
+            if getattr(r, "from_cache", False):
+                metrics.count("cache_hit")
+            else:
+                metrics.observe(label, time.perf_counter() - t0, r.status_code)
+            if r.status_code == 429:
+                _count("429")
+                wait = _retry_after(r, attempt)
+                print(f"{label}: 429 Too Many Requests, backoff {wait:.1f}s")
+                BUDGET.pause(wait)
+                metrics.count("retry")
+                continue
+            if r.status_code >= 400:
+                snippet = (r.text or "")[:200].replace("\n", " ")
+                print(f"{label}: HTTP {r.status_code} -> {snippet}")
+            r.raise_for_status()
+            return r.json()
+        except CacheMiss as e:
+            print(f"{label}: {e}")
+            return None
+        except requests.RequestException as e:
+            if attempt == RETRIES:
+                print(f"{label}: request failed ({e}).")
+                return None
+            wait = BACKOFF_BASE * attempt
+            print(f"{label}: error ({e}), retry in {wait:.1f}s")
+            metrics.count("retry")
+            metrics.sleep(wait, "backoff")
+    return None
+
+# ---------------------------- Parallel map ----------------------------
+def map_ordered(fn: Callable, items: Iterable, workers: int = ALA_WORKERS) -> Iterator[Tuple[object, object, Optional[Exception]]]:
+    """
+    Yield (item, fn(item), None) — or (item, None, error) — in input order,
+    running up to `workers` calls at once and at most 2*workers ahead.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for item in items:
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= 2 * workers:
+                yield _result(*pending.popleft())
+        while pending:
+            yield _result(*pending.popleft())
+
+
+def _result(item, fut):
+    try:
+        return item, fut.result(), None
+    except Exception as e:
+        return item, None, e
+
+
+def chunks(items: List, size: int) -> Iterator[List]:
+    size = max(size, 1)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# ---------------------------- Biocache ----------------------------
+def biocache_records(q_expr: str, page_size: int, fields: str, label: str) -> List[dict]:
+    """Records of one occurrences/search call restricted to records with images."""
+    params = {
+        "q": q_expr,
+        "fq": "multimedia:Image",
+        "pageSize": page_size,
+        "fields": fields,
+    }
+    j = get_json(f"{BIOCACHE_WS}/occurrences/search", params, label)
+    if isinstance(j, dict):
+        return j.get("occurrences") or j.get("results") or j.get("content") or []
+    if isinstance(j, list):
+        return j
+    return []
+
+
+def quote_name(name: str) -> str:
+    return name.strip().replace('"', '\\"')
+
+
+def biocache_images(names: List[str]) -> Dict[str, str]:
+    """
+    First image URL per species for up to ALA_IMAGE_BATCH names in ONE query
+    (taxon_name:("a" OR "b" ...)). Species without an image among the returned
+    records are simply absent: the caller falls back to a per-species query.
+    """
+    if not names:
+        return {}
+    q = "taxon_name:(" + " OR ".join(f'"{quote_name(n)}"' for n in names) + ")"
+    recs = biocache_records(q, len(names) * IMAGE_RECORDS_PER_SPECIES,
+                            "imageUrl,smallImageUrl,scientificName,raw_scientificName",
+                            "biocache/occurrences/search (batch)")
+    wanted = {n.strip().lower(): n for n in names}
+    found: Dict[str, str] = {}
+    for rec in recs:
+        url = (rec or {}).get("imageUrl") or (rec or {}).get("smallImageUrl")
+        if not url:
+            continue
+        for field in ("scientificName", "raw_scientificName"):
+            name = wanted.get(str(rec.get(field) or "").strip().lower())
+            if name and name not in found:
+                found[name] = url
+    return found
+
+
+def report(species: int, secs: float) -> None:
+    rate = species / secs * 60 if secs > 0 else 0.0
+    print(f"[ala] {species} species in {secs:.1f}s ({rate:.1f} species/min) | "
+          f"requests={STATS['requests']} | 429s={STATS['429']}")
@@ -1,23 +1,42 @@
 # clean_non_animal_and_sync.py
-# Overwrite three CSVs in place:
+# Read three table_store intermediates and export the CSVs load_to_pg.py loads:
 #   - species_information_dataset.csv
 #   - relationship_dataset.csv
 #   - species_occurrences_cleaned.csv
+# (with PIPELINE_FORMAT=csv the intermediates are these CSVs, rewritten in place)
+# Occurrences are streamed in OBS_CHUNK_ROWS chunks against the drop-set, so
+# memory stays flat however many rows there are (check with
+# BENCH_STAGES=alacleanspieces python bench_pipeline.py). Every output is
+# written to a temp file and renamed over the old one only after it is complete.
 # Rule: if BOTH "Weeds of National Significance ..." and "VIC State Notifiable Pests"
 #       are blank AND Kingdom in {Plantae,Bacteria,Chromista,Fungi,Protista,Virus},
-#       drop the species from species_information; then remove the same species
-#       from relationship and occurrences datasets.
+#       drop the species from species_information (per row, on the exact name); then
+#       remove the same species from relationship and occurrences datasets, matched on
+#       taxon_names.canonical_key so spelling and authorship variants of a dropped name
+#       go too. A key that a kept species also has (e.g. "Lavandula 'Hidcote'" and
+#       "Lavandula" both key to "lavandula") is not removed from either.
 
-import pandas as pd
+import os
 from pathlib import Path
 
-# ---- file names (kept the same) ----
+import pandas as pd
+
+from table_store import FrameWriter, frame_columns, iter_frames, read_frame
+from taxon_names import canonical_keys
+
+# ---- intermediate tables (table_store names) ----
+SPECIES = "species_information_dataset"
+REL     = "relationship_dataset"
+OBS     = "species_occurrences_cleaned"
+
+# ---- exported file names (kept the same) ----
 SPECIES_CSV = Path("species_information_dataset.csv")
 REL_CSV     = Path("relationship_dataset.csv")
 OBS_CSV     = Path("species_occurrences_cleaned.csv")
 
 # ---- parameters ----
 NON_ANIMAL_KINGDOMS = {"plantae","bacteria","chromista","fungi","protista","virus"}
+OBS_CHUNK_ROWS = int(os.getenv("OBS_CHUNK_ROWS", "500000"))
 
 # ---- helpers ----
 def _find_col(cols, needle):
@@ -34,7 +53,7 @@ def _find_col_contains(cols, substring):
 
 def main():
     # ---------- load species info ----------
-    sp = pd.read_csv(SPECIES_CSV)
+    sp = read_frame(SPECIES)
     # required columns
     col_animal = _find_col(sp.columns, "animal_taxon_name")
     col_king   = _find_col(sp.columns, "Kingdom")
@@ -56,14 +75,22 @@ def main():
     to_drop = sp.loc[drop_mask, col_animal].dropna().astype(str).str.strip().unique().tolist()
 
     print(f"[species] total={len(sp)} | remove(non-animal & no flags)={len(to_drop)}")
-    # keep the rest
-    sp_kept = sp.loc[~sp[col_animal].isin(to_drop)].copy()
+    # keep the rest (the rule is applied per row, on the exact name)
+    sp_kept = sp.loc[~drop_mask].copy()
+    # keys carry the drop into the other tables, except keys a kept species also has
+    kept_keys = frozenset(canonical_keys(sp_kept[col_animal]))
+    dropped_keys = frozenset(canonical_keys(pd.Series(to_drop, dtype=object))) - {""}
+    drop_keys = dropped_keys - kept_keys
+    if dropped_keys & kept_keys:
+        print(f"[species] {len(dropped_keys & kept_keys)} dropped name key(s) also belong to a kept "
+              "species: their relationship / occurrence rows are kept")
     # overwrite file
-    sp_kept.to_csv(SPECIES_CSV, index=False)
+    with FrameWriter(str(SPECIES_CSV)) as out:
+        out.write(sp_kept)
     print(f"[species] wrote -> {SPECIES_CSV} | kept={len(sp_kept)}")
 
     # ---------- sync remove in relationship ----------
-    rel = pd.read_csv(REL_CSV)
+    rel = read_frame(REL)
     rel_animal = _find_col(rel.columns, "animal_taxon_name")
     if not rel_animal:
         # be tolerant to a common variant
@@ -72,22 +99,25 @@ def main():
         raise SystemExit("relationship_dataset.csv must contain 'animal_taxon_name' (or *_x/_y).")
 
     before_rel = len(rel)
-    rel_kept = rel.loc[~rel[rel_animal].astype(str).str.strip().isin(to_drop)].copy()
+    rel_kept = rel.loc[~canonical_keys(rel[rel_animal]).isin(drop_keys)].copy()
     print(f"[relation] total={before_rel} | removed={before_rel - len(rel_kept)}")
-    rel_kept.to_csv(REL_CSV, index=False)
+    with FrameWriter(str(REL_CSV)) as out:
+        out.write(rel_kept)
     print(f"[relation] wrote -> {REL_CSV} | kept={len(rel_kept)}")
 
-    # ---------- sync remove in occurrences ----------
-    obs = pd.read_csv(OBS_CSV)
-    obs_animal = _find_col(obs.columns, "animal_taxon_name")
+    # ---------- sync remove in occurrences (streamed) ----------
+    obs_cols = frame_columns(OBS)
+    obs_animal = _find_col(obs_cols, "animal_taxon_name")
     if not obs_animal:
         raise SystemExit("species_occurrences_cleaned.csv must contain 'animal_taxon_name'.")
 
-    before_obs = len(obs)
-    obs_kept = obs.loc[~obs[obs_animal].astype(str).str.strip().isin(to_drop)].copy()
-    print(f"[occurrences] total={before_obs} | removed={before_obs - len(obs_kept)}")
-    obs_kept.to_csv(OBS_CSV, index=False)
-    print(f"[occurrences] wrote -> {OBS_CSV} | kept={len(obs_kept)}")
+    before_obs = 0
+    with FrameWriter(str(OBS_CSV), columns=obs_cols) as out:
+        for chunk in iter_frames(OBS, OBS_CHUNK_ROWS):
+            before_obs += len(chunk)
+            out.write(chunk.loc[~canonical_keys(chunk[obs_animal]).isin(drop_keys)])
+    print(f"[occurrences] total={before_obs} | removed={before_obs - out.rows}")
+    print(f"[occurrences] wrote -> {OBS_CSV} | kept={out.rows}")
 
     # ---------- summary ----------
     print(f"[done] species removed: {len(to_drop)}")
@@ -1,23 +1,47 @@
-# Outputs:
-#   1) relationship_dataset.csv  – normalized interactions, deduped
-#   2) species_information_dataset.csv – per animal, joined with checklist + image/summary, filtered
+# Outputs (table_store intermediates, exported to CSV by alacleanspieces.py):
+#   1) relationship_dataset  – normalized interactions, deduped
+#   2) species_information_dataset – per animal, joined with checklist + image/summary, filtered
+# filtered_merged is loaded once, text columns as categoricals, and both outputs
+# are built from that frame. Name / interaction normalization runs once per
+# distinct value (the categories) and is mapped back to the rows by code.
 
 import pandas as pd
 from pathlib import Path
+from typing import Callable
+
+from table_store import existing_path, frame_columns, read_frame, write_frame
+from taxon_names import clean_name
 
 # ---- input files ----
-FILTERED_MERGED = "filtered_merged.csv"
+FILTERED_MERGED = "filtered_merged"   # table_store name
 CHECKLIST = "checklist-2025-09-13.csv"
 IMAGES = "ala_animal_images.csv"
 
-# ---- output files ----
-OUT_REL = "relationship_dataset.csv"
-OUT_SPECIES = "species_information_dataset.csv"
+# ---- output tables ----
+OUT_REL = "relationship_dataset"
+OUT_SPECIES = "species_information_dataset"
 
 # ---- small helpers ----
+def per_value(s: pd.Series, fn: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    Apply an element-wise Series function to the distinct values of `s` only
+    and map the results back; returns a categorical Series.
+    """
+    cat = s.astype("category")
+    values = cat.cat.categories.append(pd.Index([float("nan")]))  # slot -1: missing
+    mapped = fn(pd.Series(values, dtype=object)).to_numpy(dtype=object)
+    codes, uniques = pd.factorize(mapped)  # results may collide: re-code them
+    return pd.Series(pd.Categorical.from_codes(codes[cat.cat.codes.to_numpy()], uniques),
+                     index=s.index, name=s.name)
+
+def plain(df: pd.DataFrame) -> pd.DataFrame:
+    """Categorical columns back to ordinary values (before merging / writing)."""
+    cats = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: str for c in cats})
+
 def normalize_space(s: pd.Series) -> pd.Series:
-    """Trim and collapse inner spaces; keep original case."""
-    return s.astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+    """Trim and collapse inner spaces; keep original case (taxon_names.clean_name)."""
+    return per_value(s, lambda v: v.map(clean_name))
 
 def canonical_interaction(s: pd.Series) -> pd.Series:
     """Map same-meaning interactions to a canonical label."""
@@ -45,47 +69,56 @@ def canonical_interaction(s: pd.Series) -> pd.Series:
         "hostof": "hasHost",
         "hashost": "hasHost",
     }
-    key = s.astype(str).str.replace(r"\s+", "", regex=True).str.lower()
-    return key.map(mapping).fillna(s)
+    def canon(v: pd.Series) -> pd.Series:
+        key = v.astype(str).str.replace(r"\s+", "", regex=True).str.lower()
+        return key.map(mapping).fillna(v)
+    return per_value(s, canon)
 
 def is_extinct(val: str) -> bool:
     """Detect 'Extinct' anywhere in the phrase (case-insensitive)."""
     return isinstance(val, str) and ("extinct" in val.lower())
 
-# ---- 1) relationship dataset ----
-def build_relationships():
-    df = pd.read_csv(FILTERED_MERGED)
-
-    # decide animal column name
-    animal_col = "animal_taxon_name_y" if "animal_taxon_name_y" in df.columns else \
-                 "animal_taxon_name_x" if "animal_taxon_name_x" in df.columns else \
-                 "animal_taxon_name"
+# ---- 0) shared input ----
+def pick_animal_column(cols) -> str:
+    return "animal_taxon_name_y" if "animal_taxon_name_y" in cols else \
+           "animal_taxon_name_x" if "animal_taxon_name_x" in cols else \
+           "animal_taxon_name"
+
+def load_filtered_merged() -> pd.DataFrame:
+    """
+    filtered_merged with the columns both outputs use, read once (text as
+    categoricals); adds the normalized "animal_taxon_name".
+    """
+    fm_cols = frame_columns(FILTERED_MERGED)
+    animal_col = pick_animal_column(fm_cols)
+    wanted = {"plant_scientific_name", animal_col, "interaction_type_raw", "Species", "Kingdom",
+              "Phylum", "Class", "Order", "Family", "Genus", "Vernacular Name", "Number of records"}
+    fm = read_frame(FILTERED_MERGED, columns=[c for c in fm_cols if c in wanted], categorical=True)
+    fm["animal_taxon_name"] = normalize_space(fm[animal_col])
+    return fm
 
-    rel = df[["plant_scientific_name", animal_col, "interaction_type_raw"]].copy()
-    rel = rel.rename(columns={animal_col: "animal_taxon_name"})
-    rel["animal_taxon_name"] = normalize_space(rel["animal_taxon_name"])
+# ---- 1) relationship dataset ----
+def build_relationships(fm: pd.DataFrame):
+    rel = fm[["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"]].copy()
 
     # canonicalize & dedupe
     rel["interaction_type_raw"] = canonical_interaction(rel["interaction_type_raw"])
-    rel = rel.drop_duplicates(subset=["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"])
+    rel = plain(rel.drop_duplicates(subset=["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"]))
 
-    rel.to_csv(OUT_REL, index=False, encoding="utf-8")
-    print(f"[OK] {OUT_REL}: {len(rel)} rows")
+    out = write_frame(rel, OUT_REL)
+    print(f"[OK] {out}: {len(rel)} rows")
 
 # ---- 2) species information dataset ----
-def build_species_info():
-    fm = pd.read_csv(FILTERED_MERGED)
-    ck = pd.read_csv(CHECKLIST)
+def build_species_info(fm: pd.DataFrame):
+    ck_wanted = {"Species", "Species Name", "Victoria : Conservation Status",
+                 "EPBC Act Threatened Species",
+                 "Weeds of National Significance (WoNS) as at Feb. 2013",
+                 "VIC State Notifiable Pests"}
+    ck = pd.read_csv(CHECKLIST, usecols=lambda c: c in ck_wanted)
     img = pd.read_csv(IMAGES)
 
-    # choose animal column in filtered_merged
-    animal_col = "animal_taxon_name_y" if "animal_taxon_name_y" in fm.columns else \
-                 "animal_taxon_name_x" if "animal_taxon_name_x" in fm.columns else \
-                 "animal_taxon_name"
-
-    # normalize keys
-    fm["animal_taxon_name"] = normalize_space(fm[animal_col])
-    img["animal_taxon_name"] = normalize_space(img["animal_taxon_name"])
+    # normalize keys (fm's animal_taxon_name is normalized on load)
+    img["animal_taxon_name"] = normalize_space(img["animal_taxon_name"]).astype(str)
 
     # columns we want from filtered_merged as base
     base_cols = [
@@ -93,7 +126,7 @@ def build_species_info():
         "Family", "Genus", "Vernacular Name", "Number of records"
     ]
     base_cols = [c for c in base_cols if c in fm.columns]
-    sp = fm[base_cols].drop_duplicates(subset=["animal_taxon_name"]).copy()
+    sp = plain(fm[base_cols].drop_duplicates(subset=["animal_taxon_name"]))
     sp = sp.rename(columns={"Number of records": "Number of Records"})
 
     # pull selected columns from checklist for statuses (join by 'Species' URL if present)
@@ -160,13 +193,18 @@ def build_species_info():
     final_cols = [c for c in ordered if c in sp.columns] + [c for c in sp.columns if c not in ordered]
     sp = sp[final_cols]
 
-    sp.to_csv(OUT_SPECIES, index=False, encoding="utf-8")
-    print(f"[OK] {OUT_SPECIES}: {len(sp)} rows")
+    out = write_frame(sp, OUT_SPECIES)
+    print(f"[OK] {out}: {len(sp)} rows")
 
 # ---- run ----
 if __name__ == "__main__":
-    for p in [FILTERED_MERGED, CHECKLIST, IMAGES]:
+    try:
+        existing_path(FILTERED_MERGED)
+    except FileNotFoundError as e:
+        print(f"[WARN] {e}")
+    for p in [CHECKLIST, IMAGES]:
         if not Path(p).exists():
             print(f"[WARN] Missing file: {p}")
-    build_relationships()
-    build_species_info()
+    fm = load_filtered_merged()
+    build_relationships(fm)
+    build_species_info(fm)
@@ -4,26 +4,38 @@
 #          Summary: try ALA species (guid -> details) first; fallback to Wikipedia REST (with User-Agent)
 #
 # Behavior:
-#   - Reads unique animal names from filtered_merged.csv
+#   - Reads unique animal names from filtered_merged (table_store, name column only)
 #   - For each, fetches one image URL + a short summary
-#   - Appends rows incrementally to ala_animal_images.csv (resumable)
+#   - Many species in flight (ala_client.py: ALA_WORKERS threads, one ALA_RATE
+#     request budget); image and summary of a species are looked up concurrently
+#   - Images of ALA_IMAGE_BATCH species come from one OR-ed biocache query;
+#     species it misses fall back to the per-species queries
+#   - Commits one row per animal, in input order, to ala_animal_images.csv
+#     (resumable, crash-safe; resume point in ala_animal_images.csv.done, see fetch_output.py)
+#   - Latency, retries, fallbacks and ETA are recorded by fetch_metrics.py
+#   - name -> ALA guid resolutions are kept in the synonym cache (taxon_names.py)
 
-import csv
 import time
-import pathlib
 import re
-from typing import Optional, List
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, List, Tuple
 
 import pandas as pd
 import requests
 
+import ala_client
+import fetch_metrics as metrics
+import taxon_names
+from ala_client import ALA_BASE, WIKI_BASE, WIKI_UA
+from fetch_output import CheckpointWriter
+from table_store import frame_columns, read_frame
+
 # ---------------------------- Configuration ----------------------------
-INPUT_CSV = "filtered_merged.csv"
+INPUT_TABLE = "filtered_merged"   # table_store name
 OUTPUT_CSV = "ala_animal_images.csv"   # three columns
-RATE_LIMIT_SEC = 0.6
+OUTPUT_HEADER = ["animal_taxon_name", "image_url", "summary"]
 TIMEOUT_SEC = 20
-RETRIES = 3
-BACKOFF_BASE = 0.8
 
 ANIMAL_COL_CANDIDATES = [
     "animal_taxon_name_x",
@@ -32,64 +44,15 @@ ANIMAL_COL_CANDIDATES = [
     "Species Name",
 ]
 
-# Public Biocache WS for IMAGES (no key required)
-BIOCACHE_WS = "https://biocache-ws.ala.org.au/ws"
-
-# ALA species endpoints for SUMMARY (may or may not work anonymously)
-ALA_BASE = "https://api.ala.org.au"  # /species/guid/{name}  and  /species/{guid}
-
-# Wikipedia REST summary (public) — MUST send a User-Agent per policy
-WIKI_BASE = "https://en.wikipedia.org/api/rest_v1/page/summary"
-WIKI_UA = "ALA-helper/1.0 (contact: ylii0684@student.monash.edu)"  
-
 # ---------------------------- HTTP helper ----------------------------
 def _get_json(url: str, params: dict, label: str, headers: Optional[dict] = None) -> Optional[dict]:
-    """GET JSON with retries/backoff; print minimal diagnostics on failure."""
-    req_headers = {"accept": "application/json"}
-    if headers:
-        req_headers.update(headers)
-
-    for attempt in range(1, RETRIES + 1):
-        try:
-            r = requests.get(url, params=params, headers=req_headers, timeout=TIMEOUT_SEC)
-            if r.status_code == 429:
-                wait = BACKOFF_BASE * attempt
-                print(f"{label}: 429 Too Many Requests, backoff {wait:.1f}s")
-                time.sleep(wait)
-                continue
-            if r.status_code >= 400:
-                snippet = (r.text or "")[:200].replace("\n", " ")
-                print(f"{label}: HTTP {r.status_code} -> {snippet}")
-            r.raise_for_status()
-            return r.json()
-        except requests.RequestException as e:
-            if attempt == RETRIES:
-                print(f"{label}: request failed ({e}).")
-                return None
-            wait = BACKOFF_BASE * attempt
-            print(f"{label}: error ({e}), retry in {wait:.1f}s")
-            time.sleep(wait)
-    return None
+    """GET JSON through ala_client (shared budget, retries/backoff, cache)."""
+    return ala_client.get_json(url, params, label, headers=headers, timeout=TIMEOUT_SEC)
 
-# ---------------------------- IMAGE lookup (unchanged) ----------------------------
+# ---------------------------- IMAGE lookup ----------------------------
 def _biocache_try(q_expr: str) -> Optional[str]:
     """Call Biocache occurrences search and return imageUrl/smallImageUrl if present."""
-    params = {
-        "q": q_expr,
-        "fq": "multimedia:Image",
-        "pageSize": 1,
-        "fields": "imageUrl,smallImageUrl",
-    }
-    j = _get_json(f"{BIOCACHE_WS}/occurrences/search", params, "biocache/occurrences/search")
-    if not j:
-        return None
-
-    recs: List[dict] = []
-    if isinstance(j, dict):
-        recs = j.get("occurrences") or j.get("results") or j.get("content") or []
-    elif isinstance(j, list):
-        recs = j
-
+    recs = ala_client.biocache_records(q_expr, 1, "imageUrl,smallImageUrl", "biocache/occurrences/search")
     if not recs:
         return None
 
@@ -100,14 +63,16 @@ def fetch_image_url_from_ala(scientific_name: str) -> Optional[str]:
     """Keep the working image flow intact: Biocache only."""
     if not scientific_name or scientific_name.lower().startswith("http"):
         return None
-    name_q = scientific_name.strip().replace('"', '\\"')
+    name_q = ala_client.quote_name(scientific_name)
 
     url = _biocache_try(f'taxon_name:"{name_q}"')
     if url:
         return url
+    metrics.count("fallback:image_scientificName")
     url = _biocache_try(f'scientificName:"{name_q}"')
     if url:
         return url
+    metrics.count("fallback:image_text")
     url = _biocache_try(f'"{name_q}"')
     if url:
         return url
@@ -126,20 +91,21 @@ def _clean_summary(text: str, max_len: int = 400) -> str:
         cut = max_len
     return t[:cut].strip() + "…"
 
+def _ala_guid(scientific_name: str) -> Optional[str]:
+    """ALA /species/guid/{name} -> taxon concept guid, or None."""
+    guid_resp = _get_json(f"{ALA_BASE}/species/guid/{requests.utils.quote(scientific_name)}", {}, "species/guid")
+    if isinstance(guid_resp, dict):
+        return guid_resp.get("guid") or guid_resp.get("taxonConceptID") or guid_resp.get("id")
+    if isinstance(guid_resp, str):
+        return guid_resp.strip() or None
+    return None
+
 def _ala_summary(scientific_name: str) -> Optional[str]:
     """
     Try ALA species: /species/guid/{name} -> /species/{guid}
     Extract a short description from typical fields if available.
     """
-    guid_resp = _get_json(f"{ALA_BASE}/species/guid/{requests.utils.quote(scientific_name)}", {}, "species/guid")
-    if not guid_resp:
-        return None
-
-    guid = None
-    if isinstance(guid_resp, dict):
-        guid = guid_resp.get("guid") or guid_resp.get("taxonConceptID") or guid_resp.get("id")
-    elif isinstance(guid_resp, str):
-        guid = guid_resp.strip()
+    guid = taxon_names.resolve("ala", scientific_name, _ala_guid)
     if not guid:
         return None
 
@@ -191,6 +157,7 @@ def fetch_summary(scientific_name: str) -> Optional[str]:
     s = _ala_summary(scientific_name)
     if s:
         return s
+    metrics.count("fallback:wikipedia")
     s = _wikipedia_summary(scientific_name)
     if s:
         return s
@@ -205,31 +172,49 @@ def pick_animal_column(df: pd.DataFrame) -> str:
         return "animal_taxon_name"
     raise KeyError("No animal name column found.")
 
-def load_done_set(path: str) -> set:
-    p = pathlib.Path(path)
-    done = set()
-    if p.exists():
-        with p.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            next(reader, None)
-            for row in reader:
-                if not row:
-                    continue
-                done.add(row[0].strip())
-    return done
-
-def append_row(path: str, animal: str, img: str, summary: str) -> None:
-    p = pathlib.Path(path)
-    file_exists = p.exists()
-    with p.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["animal_taxon_name", "image_url", "summary"])
-        writer.writerow([animal, img, summary])
+# ---------------------------- Concurrent enrichment ----------------------------
+def _image_for(name: str, batch: Optional[Future]) -> Optional[str]:
+    """Image from the species' batch query if it had one, else the per-species queries."""
+    found: Dict[str, str] = batch.result() if batch is not None else {}
+    if name in found:
+        return found[name]
+    if batch is not None:
+        metrics.count("fallback:image_single")
+    return fetch_image_url_from_ala(name)
+
+def enrich(names: List[str]) -> Iterator[Tuple[str, Optional[str], Optional[str], Optional[Exception]]]:
+    """
+    Yield (name, image_url, summary, error) in input order while up to
+    ALA_WORKERS lookups run at once. Per species, the image and the summary
+    are separate tasks; per group of ALA_IMAGE_BATCH species, one batch image
+    query is submitted ahead of the group's image tasks. The pool takes tasks in
+    submission order, so a batch query is always running before the image
+    tasks that wait on it (no deadlock).
+    """
+    workers = ala_client.ALA_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+
+        def finish():
+            name, img_f, sum_f = pending.popleft()
+            try:
+                return name, img_f.result(), sum_f.result(), None
+            except Exception as e:
+                return name, None, None, e
+
+        for group in ala_client.chunks(names, ala_client.ALA_IMAGE_BATCH):
+            batch = pool.submit(ala_client.biocache_images, group) if len(group) > 1 else None
+            for name in group:
+                pending.append((name, pool.submit(_image_for, name, batch), pool.submit(fetch_summary, name)))
+            while len(pending) > 2 * workers:
+                yield finish()
+        while pending:
+            yield finish()
 
 # ---------------------------- Main ----------------------------
 def main():
-    df = pd.read_csv(INPUT_CSV)
+    cols = frame_columns(INPUT_TABLE)
+    df = read_frame(INPUT_TABLE, columns=[c for c in ANIMAL_COL_CANDIDATES if c in cols])
     animal_col = pick_animal_column(df)
 
     animals = (
@@ -237,25 +222,30 @@ def main():
         .dropna().drop_duplicates().tolist()
     )
 
-    done = load_done_set(OUTPUT_CSV)
-    print(f"Unique animals: {len(animals)}; already done: {len(done)}")
-
-    for idx, name in enumerate(animals, start=1):
-        if name in done or name == "" or name.lower().startswith("http"):
-            continue
-
-        img_url = fetch_image_url_from_ala(name) or "NA"
-        summary = fetch_summary(name) or "NA"
-
-        append_row(OUTPUT_CSV, name, img_url, summary)
-        done.add(name)
+    out = CheckpointWriter(OUTPUT_CSV, OUTPUT_HEADER)
+    print(f"Unique animals: {len(animals)}; already done: {len(out.done)}")
+
+    todo = [n for n in animals if n not in out and n != "" and not n.lower().startswith("http")]
+    metrics.start("alaimage", len(todo))
+    t0 = time.perf_counter()
+    with out:
+        for idx, (name, img_url, summary, err) in enumerate(enrich(todo), start=1):
+            if err is not None:
+                print(f"[{idx}/{len(todo)}] {name} -> error: {err} (not committed, retried next run)")
+                metrics.species_failed(name, err)
+                continue
+            img_url = img_url or "NA"
+            summary = summary or "NA"
 
-        preview = summary if summary == "NA" else (summary[:60] + ("…" if len(summary) > 60 else ""))
-        print(f"[{idx}/{len(animals)}] {name} -> image: {'OK' if img_url!='NA' else 'NA'}, summary: {preview}")
+            out.commit(name, [[name, img_url, summary]])
+            metrics.species_done(name, 1)
 
-        time.sleep(RATE_LIMIT_SEC)
+            preview = summary if summary == "NA" else (summary[:60] + ("…" if len(summary) > 60 else ""))
+            print(f"[{idx}/{len(todo)}] {name} -> image: {'OK' if img_url!='NA' else 'NA'}, summary: {preview}")
 
-    print(f"Finished. Wrote {len(done)} rows to {OUTPUT_CSV}")
+    ala_client.report(len(todo), time.perf_counter() - t0)
+    metrics.summary()
+    print(f"Finished. Wrote {len(out.done)} rows to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,49 @@
 # species_occurrences_to_csv.py
-# Build a CSV of per-occurrence locations for each unique species in filtered_merged.csv.
+# Build a CSV of per-occurrence locations for each unique species in filtered_merged (table_store).
 # Columns: species name, lat, lon, and key occurrence fields.
 # - Public Biocache API only (no key)
 # - Offset paging with start+pageSize (simple & robust)
-# - Stream to CSV, species-level resume
+# - Each species is buffered and committed in one write (fetch_output.py): a crash
+#   never leaves a partial species, resume point in species_occurrences.csv.done
+# - Record-level resume: after every page the species' kept rows and its cursor
+#   (next start, kept count, packed lat/lon dedupe set) are saved
+#   (species_occurrences.pages/, or the cursor table with OCC_SINK=pg), so an
+#   interrupted species continues at its next page with no duplicates; a page
+#   that cannot be fetched fails the species instead of ending it early
+# - Several species are fetched at once (ala_client.py: ALA_WORKERS threads, one
+#   ALA_RATE request budget) and committed in input order
 # - NEW: cap at MAX_PER_SPECIES per species, and deduplicate by lat/lon
-
-import csv
+#   (THIN_MODE=grid: one point per grid cell per species per year instead,
+#   see occurrence_thin.py; kept/dropped totals are printed at the end)
+# - OCC_SINK=pg: pages are COPYed straight into Postgres instead of the CSV
+#   (occurrence_pg.py); each species goes live in the APIs' table as soon as it
+#   is complete, no clean_observations.py / load_to_pg.py round trip needed
+# - Latency per endpoint, retries, 429s, sleeps, rows/s and ETA are recorded by
+#   fetch_metrics.py (JSON lines + summary table at exit)
+
+import os
 import time
-import pathlib
-from typing import Optional, List, Dict, Tuple
+from typing import Callable, Optional, List, Dict
 
 import pandas as pd
-import requests
+
+import ala_client
+import fetch_metrics as metrics
+from ala_client import BIOCACHE_WS
+import occurrence_thin as thin
+from fetch_output import CheckpointWriter, PageSpool
+from table_store import frame_columns, read_frame
 
 # ---------------------------- Config ----------------------------
-INPUT_CSV = "filtered_merged.csv"
+INPUT_TABLE = "filtered_merged"   # table_store name
 OUTPUT_CSV = "species_occurrences.csv"
-RATE_LIMIT_SEC = 0.25
+OUTPUT_HEADER = ["animal_taxon_name", "decimalLatitude", "decimalLongitude",
+                 "eventDate", "occurrenceID", "recordedBy", "locality",
+                 "stateProvince", "country", "dataResourceName", "basisOfRecord"]
 TIMEOUT_SEC = 25
-RETRIES = 3
-BACKOFF_BASE = 0.7
 PAGE_SIZE = 500
+OCC_SINK = os.getenv("OCC_SINK", "csv").lower()   # csv | pg
+SPOOL_DIR = "species_occurrences.pages"           # pages of unfinished species (csv sink)
 
 # Cap per species (keep at most this many rows)
 MAX_PER_SPECIES: Optional[int] = 10000
@@ -33,8 +55,6 @@ ANIMAL_COL_CANDIDATES = [
     "Species Name",
 ]
 
-BIOCACHE_WS = "https://biocache-ws.ala.org.au/ws"
-
 # Minimal fields for speed + mapping
 FIELDS = [
     "decimalLatitude",
@@ -51,29 +71,8 @@ FIELDS = [
 
 # ---------------------------- HTTP helper ----------------------------
 def _get_json(url: str, params: Dict, label: str) -> Optional[Dict]:
-    """GET JSON with retries/backoff; minimal diagnostics on failure."""
-    headers = {"accept": "application/json"}
-    for attempt in range(1, RETRIES + 1):
-        try:
-            r = requests.get(url, params=params, headers=headers, timeout=TIMEOUT_SEC)
-            if r.status_code == 429:
-                wait = BACKOFF_BASE * attempt
-                print(f"{label}: 429 Too Many Requests, wait {wait:.1f}s")
-                time.sleep(wait)
-                continue
-            if r.status_code >= 400:
-                snippet = (r.text or "")[:180].replace("\n", " ")
-                print(f"{label}: HTTP {r.status_code} -> {snippet}")
-            r.raise_for_status()
-            return r.json()
-        except requests.RequestException as e:
-            if attempt == RETRIES:
-                print(f"{label}: request failed ({e}).")
-                return None
-            wait = BACKOFF_BASE * attempt
-            print(f"{label}: error ({e}), retry in {wait:.1f}s")
-            time.sleep(wait)
-    return None
+    """GET JSON through ala_client (shared budget, retries/backoff, cache)."""
+    return ala_client.get_json(url, params, label, timeout=TIMEOUT_SEC)
 
 # ---------------------------- Species list ----------------------------
 def pick_animal_column(df: pd.DataFrame) -> str:
@@ -85,8 +84,9 @@ def pick_animal_column(df: pd.DataFrame) -> str:
         return "animal_taxon_name"
     raise KeyError("No animal name column found.")
 
-def unique_animals_from_input(path: str) -> List[str]:
-    df = pd.read_csv(path)
+def unique_animals_from_input(name: str) -> List[str]:
+    cols = frame_columns(name)
+    df = read_frame(name, columns=[c for c in ANIMAL_COL_CANDIDATES if c in cols])
     col = pick_animal_column(df)
     return (
         df[col]
@@ -98,39 +98,6 @@ def unique_animals_from_input(path: str) -> List[str]:
         .tolist()
     )
 
-# ---------------------------- CSV I/O ----------------------------
-def load_done_species(path: str) -> set:
-    p = pathlib.Path(path)
-    if not p.exists():
-        return set()
-    done = set()
-    with p.open("r", newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        next(reader, None)
-        for row in reader:
-            if row:
-                done.add(row[0])
-    return done
-
-def ensure_header(path: str) -> None:
-    p = pathlib.Path(path)
-    if p.exists():
-        return
-    with p.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            ["animal_taxon_name", "decimalLatitude", "decimalLongitude",
-             "eventDate", "occurrenceID", "recordedBy", "locality",
-             "stateProvince", "country", "dataResourceName", "basisOfRecord"]
-        )
-
-def append_rows(path: str, rows: List[List[str]]) -> None:
-    if not rows:
-        return
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(rows)
-
 # ---------------------------- Utils ----------------------------
 def _norm_coord(value) -> Optional[str]:
     """
@@ -145,12 +112,24 @@ def _norm_coord(value) -> Optional[str]:
         return None
 
 # ---------------------------- Core ----------------------------
-def fetch_occurrences_for_species(species_name: str) -> int:
-    """Stream occurrences for one species (Victoria only), dedupe by lat/lon, cap per species."""
+def fetch_occurrences_for_species(species_name: str, on_page: Callable[[List[List[str]], Dict], None],
+                                  cursor: Optional[Dict] = None) -> int:
+    """
+    Page through occurrences for one species (Victoria only), dedupe by lat/lon
+    or thin to grid cells (THIN_MODE), cap per species. Each page's kept rows are handed to `on_page` together with
+    the cursor to resume after it; `cursor` (from an earlier run) continues
+    there. Returns the number kept. Runs on ala_client's worker threads, so it
+    keeps no shared state.
+    """
     total_kept = 0
     start = 0
-
-    seen_coords: set[Tuple[str, str]] = set()
+    seen_coords = thin.new_seen()
+    if cursor is not None:
+        if cursor.get("thin", "exact") != thin.signature():
+            raise RuntimeError(f"saved cursor was made with THIN settings {cursor.get('thin', 'exact')!r}, "
+                               f"now {thin.signature()!r}; restore them or remove the saved pages")
+        start, total_kept, seen_coords = cursor["start"], cursor["kept"], thin.unpack_seen(cursor["seen"])
+        print(f"  {species_name}: resuming at start {start} ({total_kept} kept)")
 
     base_params = {
         "q": f'taxon_name:"{species_name}"',
@@ -165,30 +144,35 @@ def fetch_occurrences_for_species(species_name: str) -> int:
     }
 
 
-    while True:
+    while MAX_PER_SPECIES is None or total_kept < MAX_PER_SPECIES:
         params = dict(base_params)
         params["start"] = start
 
         data = _get_json(f"{BIOCACHE_WS}/occurrences/search", params, "occurrences/search")
         if not isinstance(data, dict):
-            break
+            # not "no more records": the species is retried from this page next run
+            raise RuntimeError(f"page at start {start} could not be fetched")
 
         recs = data.get("occurrences") or data.get("results") or data.get("content") or []
         if not recs:
             break
 
         out_rows: List[List[str]] = []
-        for rec in recs:
+        dup = nocoord = over_cap = 0
+        for i, rec in enumerate(recs):
             if MAX_PER_SPECIES is not None and total_kept >= MAX_PER_SPECIES:
+                over_cap = len(recs) - i
                 break
 
             lat_s = _norm_coord(rec.get("decimalLatitude"))
             lon_s = _norm_coord(rec.get("decimalLongitude"))
             if not lat_s or not lon_s:
+                nocoord += 1
                 continue
 
-            key = (lat_s, lon_s)
+            key = thin.point_key(lat_s, lon_s, rec.get("eventDate"))
             if key in seen_coords:
+                dup += 1
                 continue
 
             seen_coords.add(key)
@@ -207,11 +191,13 @@ def fetch_occurrences_for_species(species_name: str) -> int:
             ])
             total_kept += 1
 
-        append_rows(OUTPUT_CSV, out_rows)
+        on_page(out_rows, {"start": start + PAGE_SIZE, "kept": total_kept,
+                           "seen": thin.pack_seen(seen_coords), "thin": thin.signature()})
+        thin.STATS.add(len(out_rows), dup, nocoord, over_cap, seen_coords)
 
         total = data.get("totalRecords")
         print(
-            f"  wrote {len(out_rows)} | total kept {total_kept}"
+            f"  {species_name}: got {len(out_rows)} | total kept {total_kept}"
             + (f" / cap {MAX_PER_SPECIES}" if MAX_PER_SPECIES is not None else "")
             + (f" / est {total}" if isinstance(total, int) else "")
             + f" | start -> {start + PAGE_SIZE}"
@@ -221,31 +207,79 @@ def fetch_occurrences_for_species(species_name: str) -> int:
             break
 
         start += PAGE_SIZE
-        time.sleep(RATE_LIMIT_SEC)
 
     return total_kept
 
+def fetch_rows(species_name: str, spool: PageSpool) -> List[List[str]]:
+    """All kept rows of one species for the CSV checkpoint, spooled page by page."""
+    fetch_occurrences_for_species(
+        species_name, lambda rows, cur: spool.append(species_name, rows, cur), spool.load(species_name))
+    return spool.rows(species_name)
+
 # ---------------------------- Main ----------------------------
-def main():
-    animals = unique_animals_from_input(INPUT_CSV)
-    ensure_header(OUTPUT_CSV)
-    done_species = load_done_species(OUTPUT_CSV)
+def main_pg(animals: List[str]) -> None:
+    """OCC_SINK=pg: stream pages into Postgres, publish each finished species."""
+    from occurrence_pg import LIVE_TABLE, PgOccurrenceSink
+
+    with PgOccurrenceSink(OUTPUT_HEADER) as sink:
+        done = sink.done()
+        print(f"Unique species: {len(animals)} | already in public.{LIVE_TABLE}: {len(done)}")
+        todo = [n for n in animals if n and not n.lower().startswith("http") and n not in done]
+
+        def fetch_to_pg(name: str) -> int:
+            return fetch_occurrences_for_species(
+                name, lambda rows, cur: sink.copy_page(name, rows, cur), sink.load_cursor(name))
+
+        metrics.start("alalocation", len(todo))
+        t0 = time.perf_counter()
+        results = ala_client.map_ordered(fetch_to_pg, todo)
+        for idx, (name, _, err) in enumerate(results, start=1):
+            if err is not None:
+                print(f"[{idx}/{len(todo)}] {name} error: {err} (not published, resumes next run)")
+                metrics.species_failed(name, err)
+                continue
 
-    print(f"Unique species: {len(animals)} | already in file (by species): {len(done_species)}")
-    for idx, name in enumerate(animals, start=1):
-        if not name or name.lower().startswith("http") or name in done_species:
-            continue
+            written = sink.finish(name)
+            metrics.species_done(name, written)
+            print(f"[{idx}/{len(todo)}] DONE species '{name}': {written} rows live")
 
-        print(f"[{idx}/{len(animals)}] {name} ...")
-        try:
-            written = fetch_occurrences_for_species(name)
-        except Exception as e:
-            print(f"  error: {e}")
-            written = 0
+        ala_client.report(len(todo), time.perf_counter() - t0)
+        thin.STATS.report()
+        metrics.summary()
+    print("All done!")
+
+def main():
+    animals = unique_animals_from_input(INPUT_TABLE)
+    if OCC_SINK == "pg":
+        return main_pg(animals)
+    if OCC_SINK != "csv":
+        raise SystemExit(f"OCC_SINK must be csv or pg, got {OCC_SINK!r}")
+    out = CheckpointWriter(OUTPUT_CSV, OUTPUT_HEADER)
+    spool = PageSpool(SPOOL_DIR)
+    for key in spool.keys():
+        if key in out:
+            spool.remove(key)  # committed just before a crash
+
+    print(f"Unique species: {len(animals)} | already in file (by species): {len(out.done)}")
+    todo = [n for n in animals if n and not n.lower().startswith("http") and n not in out]
+    metrics.start("alalocation", len(todo))
+    t0 = time.perf_counter()
+    with out:
+        results = ala_client.map_ordered(lambda name: fetch_rows(name, spool), todo)
+        for idx, (name, rows, err) in enumerate(results, start=1):
+            if err is not None:
+                print(f"[{idx}/{len(todo)}] {name} error: {err} (not committed, resumes next run)")
+                metrics.species_failed(name, err)
+                continue
 
-        print(f"  DONE species '{name}': wrote {written} rows")
-        time.sleep(RATE_LIMIT_SEC)
+            written = out.commit(name, rows)
+            metrics.species_done(name, written)
+            spool.remove(name)
+            print(f"[{idx}/{len(todo)}] DONE species '{name}': wrote {written} rows")
 
+    ala_client.report(len(todo), time.perf_counter() - t0)
+    thin.STATS.report()
+    metrics.summary()
     print("All done!")
 
 if __name__ == "__main__":
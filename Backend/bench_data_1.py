@@ -0,0 +1,229 @@
+# bench_data_1.py
+# Purpose: time data_1.py's variety cleaning against the per-cell path it
+# replaced, on a variety file BENCH_SCALE times the size of the real export.
+# - Writes the synthetic variety CSV into a fresh temp directory: the rows of
+#   VARIETY_CSV repeated BENCH_SCALE times if that file is here, else
+#   BENCH_BASE_ROWS generated rows (categories from the sowing chart, long
+#   text fields with "Learn more about ..." sentences) times BENCH_SCALE
+# - Runs each path as its own process, up to the rows it would send to
+#   Postgres (no database needed by default):
+#     per-cell    the original load: one read_csv, .apply(clean_plant_name /
+#                 strip_learn_more) per cell, to_dict("records") for execute_batch
+#     vectorized  data_1.load_and_transform(): VARIETY_CHUNK_ROWS chunks, .str
+#                 ops, each chunk serialized as the CSV copy_text_frame COPYs
+# - BENCH_DB=1: each path also writes its rows into a scratch table
+#   (bench_variety_details, dropped again) on the DB_* database (per-cell with the original execute_batch INSERT, vectorized with
+#   data_1.copy_text_frame), so the COPY side of the change is timed too
+# - Reports wall time, rows/s and peak RSS per path
+#
+# Env:
+#   BENCH_SCALE      copies of the base rows (default 100)
+#   BENCH_DB=1       also write the rows to Postgres (scratch table, dropped after)
+#   BENCH_BASE_ROWS  generated base rows when there is no VARIETY_CSV (default 1500)
+#   VARIETY_CHUNK_ROWS  passed through to data_1.py
+#   BENCH_KEEP=1     keep the temp directory (input and logs)
+#
+# Run: python bench_data_1.py
+
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+# ------------ Config ------------
+HERE = Path(__file__).resolve().parent
+PATHS = ("per-cell", "vectorized")
+BENCH_SCALE = int(os.getenv("BENCH_SCALE", "100"))
+BENCH_BASE_ROWS = int(os.getenv("BENCH_BASE_ROWS", "1500"))
+BENCH_KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+BENCH_DB = os.getenv("BENCH_DB", "0") == "1"
+BENCH_TABLE = "bench_variety_details"
+VARIETY_CSV = HERE / os.getenv("VARIETY_CSV", "variety_details.csv")
+SOWING_CSV = HERE / os.getenv("SOWING_CSV", "sowing_chart_wide_with_links_and_category.csv")
+
+COLUMNS = ["Category", "Variety", "Overview", "Quick_Method", "Quick_SowingDepth", "Quick_Season",
+           "Quick_Germination", "Quick_HardinessLifeCycle", "Quick_PlantSpacing", "Quick_PlantHeight",
+           "Quick_Position", "Quick_DaysUntilMaturity", "Notes", "Preparation", "HowToSow",
+           "HowToGrow", "HowToHarvest", "SourceURL", "ImageURL"]
+# variety_details column -> variety CSV column
+DB_COLUMNS = dict(zip(
+    ["variety", "overview", "quick_method", "quick_sowing_depth", "quick_season", "quick_germination",
+     "quick_hardiness_lifecycle", "quick_plant_spacing", "quick_plant_height", "quick_position",
+     "quick_days_until_maturity", "notes", "preparation", "how_to_sow", "how_to_grow", "how_to_harvest",
+     "source_url", "image_url"],
+    COLUMNS[1:]))
+SENTENCES = ["Sow directly into well prepared soil after the last frost.",
+             "Learn more about growing this plant in our guide.",
+             "Keep the soil moist but not waterlogged until the seedlings emerge.",
+             "learn  more about companion planting here.",
+             "Harvest regularly to encourage more fruit.",
+             "Thin seedlings to the recommended spacing once they are large enough to handle."]
+
+# ------------ Per-cell path (data_1.py before vectorizing) ------------
+OLD_SUFFIX_RE = re.compile(r"\s+(Seeds?|Crowns?|Canes?|Cuttings?|Bulbs?|Tubers?)\s*$", flags=re.IGNORECASE)
+OLD_LEARN_MORE_RE = re.compile(r"(?i)learn\s+more\s+about[^.]*\.")
+OLD_TEXT_COLS = ["Overview", "Notes", "Preparation", "HowToSow", "HowToGrow", "HowToHarvest"]
+
+def clean_plant_name(name) -> str:
+    if not isinstance(name, str):
+        return ""
+    out = name.strip()
+    prev = None
+    while prev != out:
+        prev = out
+        out = OLD_SUFFIX_RE.sub("", out).strip()
+    return out
+
+def strip_learn_more(text) -> str:
+    if not isinstance(text, str) or not text:
+        return ""
+    s = text
+    prev = None
+    while prev != s:
+        prev = s
+        s = OLD_LEARN_MORE_RE.sub("", s)
+    return re.sub(r"[ \t]{2,}", " ", s).strip()
+
+def per_cell_variety(path) -> pd.DataFrame:
+    """variety_details rows exactly as the original load_and_transform built them."""
+    var = pd.read_csv(path)
+    var["plant_name"] = var["Category"].apply(lambda x: clean_plant_name(str(x)))
+    for col in OLD_TEXT_COLS:
+        var[col] = var[col].apply(strip_learn_more) if col in var.columns else ""
+    for col in COLUMNS[1:]:
+        if col not in var.columns:
+            var[col] = ""
+    out = {"plant_name": var["plant_name"].fillna("")}
+    out.update({db: var[col].fillna("") for db, col in DB_COLUMNS.items()})
+    return pd.DataFrame(out)
+
+# ------------ Inputs ------------
+def write_input(path: Path) -> int:
+    if VARIETY_CSV.exists():
+        base = pd.read_csv(VARIETY_CSV, dtype=str, keep_default_na=False)
+    else:
+        rnd = random.Random(7)
+        plants = pd.read_csv(SOWING_CSV)["Plant"].tolist()
+        base = pd.DataFrame([
+            [rnd.choice(plants), f"Variety {i}"]
+            + [" ".join(rnd.choice(SENTENCES) for _ in range(rnd.randint(1, 4)))]
+            + [rnd.choice(["Direct sow", "Raise seedlings"]), f"{rnd.randint(1, 12)}mm", "Spring",
+               f"{rnd.randint(5, 21)} days", "Annual", f"{rnd.randint(10, 90)}cm", f"{rnd.randint(20, 200)}cm",
+               rnd.choice(["Full sun", "Part shade"]), str(rnd.randint(40, 120))]
+            + [" ".join(rnd.choice(SENTENCES) for _ in range(rnd.randint(0, 5))) for _ in range(5)]
+            + [f"https://example.org/variety/{i}", f"https://example.org/img/{i}.jpg"]
+            for i in range(BENCH_BASE_ROWS)
+        ], columns=COLUMNS)
+    header = True
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for _ in range(BENCH_SCALE):
+            base.to_csv(f, index=False, header=header)
+            header = False
+    return len(base) * BENCH_SCALE
+
+# ------------ Runs (child process) ------------
+class _NoDB:
+    """Cursor stand-in without BENCH_DB: the COPY payload is built, not sent."""
+
+    def copy_expert(self, sql, buf):
+        buf.read()
+
+def _bench_cursor():
+    import psycopg2
+    from load_to_pg import DB_CONFIG
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    cols = ", ".join(f"{c} TEXT" for c in ["plant_name", *DB_COLUMNS])
+    cur.execute(f"DROP TABLE IF EXISTS public.{BENCH_TABLE};")
+    cur.execute(f"CREATE TABLE public.{BENCH_TABLE} (id BIGSERIAL PRIMARY KEY, {cols});")
+    conn.commit()
+    return conn, cur
+
+def run_path(name: str, path: str) -> None:
+    sys.path.insert(0, str(HERE))
+    os.environ["VARIETY_CSV"] = path
+    import data_1
+    conn, cur = _bench_cursor() if BENCH_DB else (None, _NoDB())
+    t0 = time.perf_counter()
+    rows = 0
+    if name == "per-cell":
+        records = per_cell_variety(path).to_dict("records")   # what execute_batch got
+        rows = len(records)
+        if BENCH_DB:
+            from psycopg2.extras import execute_batch
+            cols = ["plant_name", *DB_COLUMNS]
+            sql = (f"INSERT INTO public.{BENCH_TABLE} ({', '.join(cols)}) "
+                   f"VALUES ({', '.join(f'%({c})s' for c in cols)})")
+            execute_batch(cur, sql, records, page_size=300)
+    else:
+        for chunk in data_1.load_and_transform()["variety"]:
+            data_1.copy_text_frame(cur, BENCH_TABLE, chunk)
+            rows += len(chunk)
+    if conn is not None:
+        conn.commit()
+    secs = time.perf_counter() - t0
+    if conn is not None:
+        cur.execute(f"DROP TABLE public.{BENCH_TABLE};")
+        conn.commit()
+        conn.close()
+    print(f"rows={rows} secs={secs:.3f}")
+
+# ------------ Runs ------------
+def run(name: str, path: Path, log: Path) -> Dict:
+    t0 = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as out:
+        proc = subprocess.Popen([sys.executable, __file__, "--run", name, str(path)], cwd=HERE,
+                                stdout=out, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)   # rusage of this child only
+    text = log.read_text(encoding="utf-8")
+    m = re.search(r"rows=(\d+) secs=([\d.]+)", text)
+    return {
+        "path": name,
+        "exit": os.waitstatus_to_exitcode(status),
+        "secs": float(m.group(2)) if m else time.perf_counter() - t0,
+        "rows": int(m.group(1)) if m else 0,
+        "peak_mb": usage.ru_maxrss / 1024,
+    }
+
+def print_table(results: List[Dict]) -> None:
+    print()
+    print(f"{'path':<11} {'exit':>5} {'rows':>9} {'secs':>8} {'rows/s':>9} {'peak MB':>8}")
+    for r in results:
+        rate = r["rows"] / r["secs"] if r["secs"] else 0.0
+        print(f"{r['path']:<11} {r['exit']:>5} {r['rows']:>9} {r['secs']:8.2f} {rate:9.0f} {r['peak_mb']:8.0f}")
+    ok = {r["path"]: r for r in results if r["exit"] == 0}
+    if len(ok) == 2:
+        print(f"speedup {ok['per-cell']['secs'] / ok['vectorized']['secs']:.1f}x | "
+              f"peak memory {ok['vectorized']['peak_mb'] / ok['per-cell']['peak_mb']:.2f}x")
+
+def main():
+    work = Path(tempfile.mkdtemp(prefix="bench_data_1_"))
+    path = work / "variety_details.csv"
+    rows = write_input(path)
+    print(f"[bench] {rows} variety rows ({path.stat().st_size / 2**20:.0f} MB) in {work}"
+          + (" | writing to Postgres" if BENCH_DB else ""))
+    results = []
+    try:
+        for name in PATHS:
+            print(f"[bench] {name} ...")
+            results.append(run(name, path, work / f"{name}.log"))
+    finally:
+        if BENCH_KEEP or any(r["exit"] != 0 for r in results):
+            print(f"[bench] input and logs kept in {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    print_table(results)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run_path(sys.argv[2], sys.argv[3])
+    else:
+        main()
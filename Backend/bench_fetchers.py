@@ -0,0 +1,178 @@
+# bench_fetchers.py
+# Purpose: run the fetchers against mock_sources.py and report their throughput.
+# - Starts mock_sources.py (uvicorn) on a free local port; its MOCK_* env
+#   (latency, 500 / 429 injection, recordings) is passed through unchanged
+# - Each fetcher runs as its own process in a fresh temp directory holding a
+#   synthetic input of BENCH_SPECIES names, with every base URL pointed at the
+#   mock and HTTP_CACHE_MODE=off (so every request really goes out)
+# - Reports wall time, requests/s (counted by the mock), species/min, output
+#   rows and the faults injected during the run
+# - Fetcher settings (ALA_RATE, GLOBI_RATE, ALA_WORKERS, ...) come from the env
+#
+# Env:
+#   BENCH_FETCHERS   comma list of globiapi, globi_async, alaimage, alalocation (default: all)
+#   BENCH_SPECIES    species per run (default 50)
+#   BENCH_TIMEOUT    seconds before a fetcher run is killed (default 1800)
+#   BENCH_KEEP=1     keep the temp directories (outputs and logs)
+#
+# Run: python bench_fetchers.py
+
+import csv
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+# ------------ Config ------------
+HERE = Path(__file__).resolve().parent
+FETCHERS = {
+    # name: (script, input file, output csv)
+    "globiapi": ("globiapi.py", "scientific_names.csv", "plant_animal_interactions.csv"),
+    "globi_async": ("globi_async.py", "scientific_names.csv", "plant_animal_interactions.csv"),
+    "alaimage": ("alaimage.py", "filtered_merged.csv", "ala_animal_images.csv"),
+    "alalocation": ("alalocation.py", "filtered_merged.csv", "species_occurrences.csv"),
+}
+BENCH_FETCHERS = [f.strip() for f in os.getenv("BENCH_FETCHERS", ",".join(FETCHERS)).split(",") if f.strip()]
+BENCH_SPECIES = int(os.getenv("BENCH_SPECIES", "50"))
+BENCH_TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "1800"))
+BENCH_KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+
+unknown = [f for f in BENCH_FETCHERS if f not in FETCHERS]
+if unknown:
+    raise SystemExit(f"BENCH_FETCHERS: unknown fetcher(s) {unknown}; choose from {list(FETCHERS)}")
+
+# ------------ Mock server ------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def mock_call(base: str, path: str, method: str = "GET") -> Dict:
+    req = urllib.request.Request(base + path, method=method)
+    with urllib.request.urlopen(req, timeout=5) as r:
+        return json.loads(r.read())
+
+def start_mock(port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mock_sources:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=HERE,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise SystemExit("mock_sources.py exited on startup")
+        try:
+            mock_call(base, "/__stats")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("mock_sources.py did not come up")
+
+def mock_env(base: str) -> Dict[str, str]:
+    return {
+        "GLOBI_API_BASE": f"{base}/globi",
+        "ALA_BIOCACHE_WS": f"{base}/biocache/ws",
+        "ALA_API_BASE": f"{base}/ala",
+        "WIKI_SUMMARY_BASE": f"{base}/wiki/api/rest_v1/page/summary",
+        "HTTP_CACHE_MODE": "off",
+        "PIPELINE_FORMAT": "csv",
+        "OCC_SINK": "csv",
+        "PYTHONUNBUFFERED": "1",
+    }
+
+# ------------ Inputs ------------
+def species_names(n: int) -> List[str]:
+    return [f"Benchgenus species{i:04d}" for i in range(n)]
+
+def write_input(path: Path, names: List[str]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if path.name == "scientific_names.csv":
+            w.writerow(["scientific_name"])
+        else:
+            w.writerow(["plant_taxon_name", "animal_taxon_name"])
+        for name in names:
+            w.writerow([name] if path.name == "scientific_names.csv" else ["Benchplant", name])
+
+def count_rows(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with open(path, newline="", encoding="utf-8") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+# ------------ Runs ------------
+def run_fetcher(name: str, base: str) -> Dict:
+    script, input_file, output_csv = FETCHERS[name]
+    work = Path(tempfile.mkdtemp(prefix=f"bench_{name}_"))
+    names = species_names(BENCH_SPECIES)
+    write_input(work / input_file, names)
+
+    mock_call(base, "/__reset", "POST")
+    env = {**os.environ, **mock_env(base)}
+    t0 = time.perf_counter()
+    with open(work / "run.log", "w", encoding="utf-8") as log:
+        try:
+            rc = subprocess.run([sys.executable, str(HERE / script)], cwd=work, env=env,
+                                stdout=log, stderr=subprocess.STDOUT, timeout=BENCH_TIMEOUT).returncode
+        except subprocess.TimeoutExpired:
+            rc = "timeout"
+    secs = time.perf_counter() - t0
+    stats = mock_call(base, "/__stats")
+
+    result = {
+        "fetcher": name,
+        "exit": rc,
+        "secs": secs,
+        "requests": stats.get("requests", 0),
+        "req_s": stats.get("requests", 0) / secs if secs > 0 else 0.0,
+        "species_min": len(names) / secs * 60 if secs > 0 else 0.0,
+        "rows": count_rows(work / output_csv),
+        "500s": stats.get("injected_500", 0),
+        "429s": stats.get("injected_429", 0),
+        "routes": {k.split(":", 1)[1]: v for k, v in stats.items() if k.startswith("requests:")},
+    }
+    if BENCH_KEEP or rc != 0:
+        print(f"[bench] {name}: output and run.log kept in {work}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+def print_table(results: List[Dict]) -> None:
+    print()
+    print(f"{'fetcher':<12} {'exit':>7} {'secs':>8} {'requests':>9} {'req/s':>7} "
+          f"{'species/min':>12} {'rows':>8} {'500s':>5} {'429s':>5}")
+    for r in results:
+        print(f"{r['fetcher']:<12} {str(r['exit']):>7} {r['secs']:8.1f} {r['requests']:9d} "
+              f"{r['req_s']:7.1f} {r['species_min']:12.1f} {r['rows']:8d} {r['500s']:5d} {r['429s']:5d}")
+    for r in results:
+        routes = ", ".join(f"{k}={v}" for k, v in sorted(r["routes"].items()))
+        print(f"  {r['fetcher']}: {routes}")
+
+def main():
+    port = free_port()
+    mock = start_mock(port)
+    base = f"http://127.0.0.1:{port}"
+    faults = {k: v for k, v in os.environ.items() if k.startswith("MOCK_")}
+    print(f"[bench] mock on {base} {faults or '(default latency, no faults)'}; "
+          f"{BENCH_SPECIES} species per fetcher")
+    results = []
+    try:
+        for name in BENCH_FETCHERS:
+            print(f"[bench] running {name} ...")
+            results.append(run_fetcher(name, base))
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+    print_table(results)
+
+if __name__ == "__main__":
+    main()
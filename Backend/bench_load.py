@@ -0,0 +1,127 @@
+# bench_load.py
+# Purpose: time load_to_pg.py's load modes on a synthetic occurrences file.
+# - Writes BENCH_ROWS synthetic occurrence rows (plus small relationship and
+#   species files) into a fresh temp directory
+# - Runs load_to_pg.py once per mode in BENCH_MODES as its own process, with
+#   REL_CSV / SPECIES_CSV / OBS_CSV pointed at the synthetic files, so it only
+#   touches bench_* tables (dropped at the end)
+# - Reports wall time, occurrence rows/s and the loader's peak RSS per mode
+# - The database comes from the DB_* env, as for load_to_pg.py
+#
+# Env:
+#   BENCH_MODES  comma list of insert, copy (default: both)
+#   BENCH_ROWS   occurrence rows (default 5000000; insert mode keeps them all in memory)
+#   COPY_CHUNK_ROWS, LOAD_WORKERS  passed through to load_to_pg.py
+#   BENCH_KEEP=1 keep the temp directory (inputs and logs)
+#
+# Run: python bench_load.py
+
+import csv
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import psycopg2
+
+from load_to_pg import DB_CONFIG, make_ident
+
+# ------------ Config ------------
+HERE = Path(__file__).resolve().parent
+MODES = ("insert", "copy")
+BENCH_MODES = [m.strip() for m in os.getenv("BENCH_MODES", ",".join(MODES)).split(",") if m.strip()]
+BENCH_ROWS = int(os.getenv("BENCH_ROWS", "5000000"))
+BENCH_KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+SPECIES = 2000
+
+FILES = {
+    "REL_CSV": "bench_relationship_dataset.csv",
+    "SPECIES_CSV": "bench_species_information_dataset.csv",
+    "OBS_CSV": "bench_species_occurrences_cleaned.csv",
+}
+
+unknown = [m for m in BENCH_MODES if m not in MODES]
+if unknown:
+    raise SystemExit(f"BENCH_MODES: unknown mode(s) {unknown}; choose from {list(MODES)}")
+
+# ------------ Inputs ------------
+def species_names(n: int) -> List[str]:
+    return [f"Benchgenus species{i:04d}" for i in range(n)]
+
+def write_inputs(work: Path, rows: int) -> None:
+    rnd = random.Random(1)
+    names = species_names(SPECIES)
+    with open(work / FILES["REL_CSV"], "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"])
+        for i, name in enumerate(names):
+            w.writerow([f"Benchplant alba{i % 50}", name, "visitsFlowersOf"])
+    with open(work / FILES["SPECIES_CSV"], "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["animal_taxon_name", "Kingdom", "Family", "Number of Records"])
+        for name in names:
+            w.writerow([name, "Animalia", "Apidae", rnd.randint(1, 10000)])
+    with open(work / FILES["OBS_CSV"], "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["animal_taxon_name", "decimalLatitude", "decimalLongitude", "eventDate", "year", "month"])
+        for i in range(rows):
+            w.writerow([names[i % SPECIES], f"{rnd.uniform(-44, -10):.6f}", f"{rnd.uniform(112, 154):.6f}",
+                        f"{rnd.randint(946684800, 1735689600) * 1000}.0", rnd.randint(2000, 2025), rnd.randint(1, 12)])
+
+def drop_tables() -> None:
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn, conn.cursor() as cur:
+            for path in FILES.values():
+                cur.execute(f"DROP TABLE IF EXISTS public.{make_ident(path)};")
+    finally:
+        conn.close()
+
+# ------------ Runs ------------
+def run_load(mode: str, work: Path) -> Dict:
+    env = {**os.environ, **FILES, "LOAD_MODE": mode, "PYTHONUNBUFFERED": "1"}
+    t0 = time.perf_counter()
+    with open(work / f"{mode}.log", "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, str(HERE / "load_to_pg.py")], cwd=work, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)   # rusage of this child only
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    secs = time.perf_counter() - t0
+    return {
+        "mode": mode,
+        "exit": proc.returncode,
+        "secs": secs,
+        "rows_s": BENCH_ROWS / secs if secs > 0 else 0.0,
+        "peak_mb": usage.ru_maxrss / 1024,
+    }
+
+def print_table(results: List[Dict]) -> None:
+    print()
+    print(f"{'mode':<8} {'exit':>5} {'secs':>8} {'rows/s':>10} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['exit']:>5} {r['secs']:8.1f} {r['rows_s']:10.0f} {r['peak_mb']:8.0f}")
+
+def main():
+    work = Path(tempfile.mkdtemp(prefix="bench_load_"))
+    print(f"[bench] writing {BENCH_ROWS} occurrence rows to {work} ...")
+    write_inputs(work, BENCH_ROWS)
+    results = []
+    try:
+        for mode in BENCH_MODES:
+            print(f"[bench] LOAD_MODE={mode} ...")
+            results.append(run_load(mode, work))
+    finally:
+        drop_tables()
+        if BENCH_KEEP or any(r["exit"] != 0 for r in results):
+            print(f"[bench] inputs and logs kept in {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    print_table(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# bench_pipeline.py
+# Purpose: time the cleaning chain (ala.py -> aladatacleaning.py ->
+# clean_observations.py -> alacleanspieces.py) per PIPELINE_FORMAT.
+# - Writes synthetic source files (GloBI interactions, ALA checklist, images,
+#   BENCH_OBS_ROWS occurrences) into a fresh temp directory, generated in
+#   chunks so the generator itself stays small
+# - Runs every stage in BENCH_STAGES as its own process, once per format in
+#   BENCH_FORMATS, each format in its own copy of the sources
+# - Stages left out of BENCH_STAGES are not run: the tables alacleanspieces
+#   reads are then written directly in the benchmarked format
+#   (BENCH_STAGES=alacleanspieces checks the streamed export on its own)
+# - Reports wall time and peak RSS per stage, and the size of the
+#   intermediate tables on disk
+#
+# Env:
+#   BENCH_FORMATS    comma list of csv, parquet (default: both)
+#   BENCH_STAGES     comma list of ala, aladatacleaning, clean_observations,
+#                    alacleanspieces (default: all)
+#   BENCH_ROWS       interaction rows (default 1000000)
+#   BENCH_OBS_ROWS   occurrence rows (default 5000000)
+#   BENCH_SPECIES    distinct animal names (default 20000)
+#   ALA_CHUNK_ROWS, OBS_CHUNK_ROWS  passed through to the stages
+#   BENCH_KEEP=1     keep the temp directory (inputs, outputs and logs)
+#
+# Run: python bench_pipeline.py
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+# ------------ Config ------------
+HERE = Path(__file__).resolve().parent
+FORMATS = ("csv", "parquet")
+STAGES = {
+    # name: (script, table_store outputs)
+    "ala": ("ala.py", ["filtered_merged"]),
+    "aladatacleaning": ("aladatacleaning.py", ["relationship_dataset", "species_information_dataset"]),
+    "clean_observations": ("clean_observations.py", ["species_occurrences_cleaned"]),
+    "alacleanspieces": ("alacleanspieces.py", []),
+}
+BENCH_FORMATS = [f.strip() for f in os.getenv("BENCH_FORMATS", ",".join(FORMATS)).split(",") if f.strip()]
+BENCH_STAGES = [s.strip() for s in os.getenv("BENCH_STAGES", ",".join(STAGES)).split(",") if s.strip()]
+BENCH_ROWS = int(os.getenv("BENCH_ROWS", "1000000"))
+BENCH_OBS_ROWS = int(os.getenv("BENCH_OBS_ROWS", "5000000"))
+BENCH_SPECIES = int(os.getenv("BENCH_SPECIES", "20000"))
+BENCH_KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+GEN_CHUNK = 500000
+
+unknown = [f for f in BENCH_FORMATS if f not in FORMATS] + [s for s in BENCH_STAGES if s not in STAGES]
+if unknown:
+    raise SystemExit(f"BENCH_FORMATS / BENCH_STAGES: unknown value(s) {unknown}")
+if "aladatacleaning" in BENCH_STAGES and "ala" not in BENCH_STAGES:
+    raise SystemExit("BENCH_STAGES: aladatacleaning needs ala (filtered_merged is not generated)")
+
+KINGDOMS = ["Animalia"] * 8 + ["Plantae", "Fungi"]
+INTERACTIONS = ["visitsFlowersOf", "pollinates", "eatenBy", "hostOf", "hasHost", "visits"]
+
+# ------------ Inputs ------------
+def animal_names(n: int) -> np.ndarray:
+    # every 7th name carries an authorship, as ALA / GloBI names often do
+    return np.array([f"Benchgenus{i % 997} species{i:06d}" + (" Smith, 1901" if i % 7 == 0 else "")
+                     for i in range(n)], dtype=object)
+
+def chunks(rows: int) -> Iterator[int]:
+    for start in range(0, rows, GEN_CHUNK):
+        yield min(GEN_CHUNK, rows - start)
+
+def write_csv(path: Path, frames: Iterator[pd.DataFrame]) -> None:
+    header = True
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for df in frames:
+            df.to_csv(f, index=False, header=header)
+            header = False
+
+def checklist(names: np.ndarray) -> pd.DataFrame:
+    n = len(names)
+    kingdom = np.array(KINGDOMS, dtype=object)[np.arange(n) % len(KINGDOMS)]
+    blank = np.full(n, "", dtype=object)
+    return pd.DataFrame({
+        "Species": [f"https://biodiversity.org.au/afd/taxa/{i}" for i in range(n)],
+        "Species Name": names,
+        "Scientific Name Authorship": blank,
+        "Taxon Rank": "species",
+        "Kingdom": kingdom,
+        "Phylum": "Arthropoda", "Class": "Insecta", "Order": "Hymenoptera", "Family": "Apidae",
+        "Genus": [s.split(" ")[0] for s in names],
+        "Vernacular Name": [f"Bench bee {i}" for i in range(n)],
+        "Number of records": np.arange(n) % 5000,
+        "Victoria : Conservation Status": np.where(np.arange(n) % 500 == 0, "Extinct", ""),
+        "EPBC Act Threatened Species": blank,
+        "Weeds of National Significance (WoNS) as at Feb. 2013": np.where(np.arange(n) % 20 == 8, "Yes", ""),
+        "VIC State Notifiable Pests": blank,
+    })
+
+def interactions(rows: int, names: np.ndarray) -> Iterator[pd.DataFrame]:
+    rnd = np.random.default_rng(1)
+    for n in chunks(rows):
+        yield pd.DataFrame({
+            "plant_scientific_name": np.char.add("Benchplant alba", rnd.integers(0, 3000, n).astype(str)),
+            "animal_taxon_name": names[rnd.integers(0, len(names), n)],
+            "interaction_type_raw": np.array(INTERACTIONS, dtype=object)[rnd.integers(0, len(INTERACTIONS), n)],
+        })
+
+def occurrences(rows: int, names: np.ndarray, dropped_cols: bool) -> Iterator[pd.DataFrame]:
+    rnd = np.random.default_rng(2)
+    for n in chunks(rows):
+        df = pd.DataFrame({
+            "animal_taxon_name": names[rnd.integers(0, len(names), n)],
+            "decimalLatitude": rnd.uniform(-44, -10, n).round(6),
+            "decimalLongitude": rnd.uniform(112, 154, n).round(6),
+            "eventDate": rnd.integers(946684800, 1735689600, n) * 1000.0,
+            "year": rnd.integers(2000, 2026, n),
+            "month": rnd.integers(1, 13, n),
+        })
+        if dropped_cols:
+            for col in ("occurrenceID", "recordedBy", "locality", "stateProvince", "country",
+                        "dataResourceName", "basisOfRecord"):
+                df[col] = "bench"
+        yield df
+
+def write_sources(work: Path) -> None:
+    names = animal_names(BENCH_SPECIES)
+    checklist(names).to_csv(work / "checklist-2025-09-13.csv", index=False)
+    pd.DataFrame({"animal_taxon_name": names,
+                  "image_url": [f"https://example.org/{i}.jpg" if i % 10 else "" for i in range(len(names))],
+                  "summary": "bench"}).to_csv(work / "ala_animal_images.csv", index=False)
+    if "ala" in BENCH_STAGES:
+        write_csv(work / "plant_animal_interactions.csv", interactions(BENCH_ROWS, names))
+    if "clean_observations" in BENCH_STAGES:
+        write_csv(work / "species_occurrences.csv", occurrences(BENCH_OBS_ROWS, names, True))
+
+def write_intermediates(work: Path, fmt: str) -> None:
+    """The tables alacleanspieces reads, for stages that are not run."""
+    sys.path.insert(0, str(HERE))
+    os.environ["PIPELINE_FORMAT"] = fmt
+    from table_store import FrameWriter   # PIPELINE_FORMAT is read at import
+    names = animal_names(BENCH_SPECIES)
+    if "aladatacleaning" not in BENCH_STAGES:
+        ck = checklist(names)
+        species = ck.drop(columns=["Species Name", "Scientific Name Authorship", "Taxon Rank"])
+        species.insert(0, "animal_taxon_name", names)
+        species = species.rename(columns={"Number of records": "Number of Records"})
+        species["image_url"], species["summary"] = "https://example.org/x.jpg", "bench"
+        with FrameWriter(str(work / f"species_information_dataset.{fmt}"),
+                         table="species_information_dataset") as out:
+            out.write(species)
+        with FrameWriter(str(work / f"relationship_dataset.{fmt}"), table="relationship_dataset") as out:
+            for df in interactions(BENCH_ROWS, names):
+                out.write(df.drop_duplicates())
+    if "clean_observations" not in BENCH_STAGES:
+        with FrameWriter(str(work / f"species_occurrences_cleaned.{fmt}"),
+                         table="species_occurrences_cleaned") as out:
+            for df in occurrences(BENCH_OBS_ROWS, names, False):
+                out.write(df)
+
+# ------------ Runs ------------
+def run_stage(stage: str, fmt: str, work: Path) -> Dict:
+    script, outputs = STAGES[stage]
+    env = {**os.environ, "PIPELINE_FORMAT": fmt, "PYTHONPATH": str(HERE), "PYTHONUNBUFFERED": "1",
+           "TAXON_CACHE_PATH": str(work / "taxon_names.sqlite")}
+    t0 = time.perf_counter()
+    with open(work / f"{stage}.log", "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, str(HERE / script)], cwd=work, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)   # rusage of this child only
+    sizes = [(work / f"{t}.{fmt}").stat().st_size for t in outputs if (work / f"{t}.{fmt}").exists()]
+    return {
+        "format": fmt,
+        "stage": stage,
+        "exit": os.waitstatus_to_exitcode(status),
+        "secs": time.perf_counter() - t0,
+        "peak_mb": usage.ru_maxrss / 1024,
+        "out_mb": sum(sizes) / 2**20,
+    }
+
+def print_table(results: List[Dict]) -> None:
+    print()
+    print(f"{'format':<8} {'stage':<19} {'exit':>5} {'secs':>8} {'peak MB':>8} {'out MB':>8}")
+    for r in results:
+        print(f"{r['format']:<8} {r['stage']:<19} {r['exit']:>5} {r['secs']:8.1f} "
+              f"{r['peak_mb']:8.0f} {r['out_mb']:8.1f}")
+    for fmt in BENCH_FORMATS:
+        rs = [r for r in results if r["format"] == fmt]
+        if rs:
+            print(f"{fmt:<8} {'total':<19} {'':>5} {sum(r['secs'] for r in rs):8.1f} "
+                  f"{max(r['peak_mb'] for r in rs):8.0f}")
+
+def main():
+    base = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    print(f"[bench] writing sources ({BENCH_ROWS} interactions, {BENCH_OBS_ROWS} occurrences) to {base} ...")
+    (base / "src").mkdir()
+    write_sources(base / "src")
+    results = []
+    try:
+        for fmt in BENCH_FORMATS:
+            work = base / fmt
+            shutil.copytree(base / "src", work)
+            if "alacleanspieces" in BENCH_STAGES:
+                print(f"[bench] {fmt}: writing the intermediates of skipped stages ...")
+                subprocess.run([sys.executable, __file__, "--intermediates", fmt, str(work)], check=True)
+            for stage in (s for s in STAGES if s in BENCH_STAGES):
+                print(f"[bench] {fmt}: {stage} ...")
+                results.append(run_stage(stage, fmt, work))
+                if results[-1]["exit"] != 0:
+                    break
+            if not BENCH_KEEP and all(r["exit"] == 0 for r in results):
+                shutil.rmtree(work, ignore_errors=True)   # one format's outputs on disk at a time
+    finally:
+        if BENCH_KEEP or any(r["exit"] != 0 for r in results):
+            print(f"[bench] inputs, outputs and logs kept in {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+    print_table(results)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--intermediates"]:
+        write_intermediates(Path(sys.argv[3]), sys.argv[2])
+    else:
+        main()
@@ -1,10 +1,22 @@
 # clean_observations.py
 # Remove unwanted columns from species_occurrences.csv
+# Output is the table_store intermediate "species_occurrences_cleaned"
+# (exported to CSV for load_to_pg.py by alacleanspieces.py).
+# The CSV is streamed in OBS_CHUNK_ROWS chunks, so memory stays flat however
+# many rows there are (BENCH_STAGES=clean_observations python bench_pipeline.py).
+# Each chunk is typed by table_store's schema (float columns parsed as numbers,
+# everything else read as text), so a column cannot come out int in one chunk
+# and float in the next.
+
+import os
 
 import pandas as pd
 
+from table_store import SCHEMAS, FrameWriter, frame_path
+
 INPUT = "species_occurrences.csv"
-OUTPUT = "species_occurrences_cleaned.csv"
+OUTPUT = "species_occurrences_cleaned"   # table_store name
+OBS_CHUNK_ROWS = int(os.getenv("OBS_CHUNK_ROWS", "500000"))
 
 DROP_COLS = [
     "occurrenceID",
@@ -17,14 +29,14 @@ DROP_COLS = [
 ]
 
 def clean_observations(in_path=INPUT, out_path=OUTPUT):
-    df = pd.read_csv(in_path)
-
-    # drop only those columns that exist
-    drop_actual = [c for c in DROP_COLS if c in df.columns]
-    df = df.drop(columns=drop_actual)
-
-    df.to_csv(out_path, index=False, encoding="utf-8")
-    print(f"[OK] Saved cleaned observations to {out_path}, {df.shape[0]} rows, {df.shape[1]} cols.")
+    keep = [c for c in pd.read_csv(in_path, nrows=0).columns if c not in DROP_COLS]
+    text = {c: str for c in keep if SCHEMAS.get(out_path, {}).get(c) != "float"}
+    path = frame_path(out_path)
+    # dropped columns are never parsed
+    with FrameWriter(path, columns=keep, table=out_path) as out:
+        for chunk in pd.read_csv(in_path, usecols=keep, dtype=text, chunksize=OBS_CHUNK_ROWS):
+            out.write(chunk[keep])
+    print(f"[OK] Saved cleaned observations to {path}, {out.rows} rows, {len(keep)} cols.")
 
 if __name__ == "__main__":
     clean_observations()
@@ -1,10 +1,29 @@
+# clean_pollinators_data.py
+# Purpose: drop noise, higher taxa and plant names from the per-plant pollinator
+# lists (pollinators_by_plant.csv -> pollinators_by_plant_clean.csv + qa_report.txt).
+# - Pass 1 reads only the plant column (all_plants); pass 2 streams the rows in
+#   CHUNK_ROWS chunks, so memory does not grow with the file
+# - Per chunk the comma lists are exploded into one long name column; each
+#   distinct name is normalized and classified ONCE per run (vectorized regex /
+#   set-membership over the chunk's new unique names, results cached), since
+#   names repeat heavily
+# - Output rows, their order and qa_report.txt are the same as the row-by-row
+#   version produced
+
 import csv
+import os
 import re
+from itertools import chain, islice
 from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
 
 INPUT = "pollinators_by_plant.csv"
 OUTPUT = "pollinators_by_plant_clean.csv"
 REPORT = "qa_report.txt"
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "20000"))   # rows per chunk (memory vs. per-chunk overhead)
 
 # Terms that are higher taxonomic ranks or obvious noise; compared in lowercase.
 HIGHER_TAXA_OR_NOISE = {
@@ -34,119 +53,190 @@ GENUS_WHITELIST = {
 # Accepts Genus species [subspecies], e.g., "Apis mellifera", "Bombus terrestris dalmatinus"
 BINOMIAL_RE = re.compile(r"^[A-Z][a-z]+(?:\s+[a-z\-]+){1,2}$")
 
-def split_list(cell: str):
-    """Split a comma-separated pollinator string into a list, trimming whitespace."""
-    if not cell:
-        return []
-    parts = [p.strip() for p in cell.split(",")]
-    return [p for p in parts if p]
+def noise_mask(lower: pd.Series) -> pd.Series:
+    """True where the (lowercased) name is clearly noise (unknown/unidentified/etc.)."""
+    return (
+        lower.isin(HIGHER_TAXA_OR_NOISE)
+        | lower.str.contains(" unknown", regex=False)
+        | lower.str.contains(" unidentified", regex=False)
+    )
 
-def is_noise(name: str) -> bool:
-    """Return True if the name is clearly noise (unknown/unidentified/etc.)."""
-    n = name.strip().lower()
-    return n in HIGHER_TAXA_OR_NOISE or " unknown" in n or " unidentified" in n
-
-def is_higher_taxon(name: str) -> bool:
+def higher_taxon_mask(names: pd.Series, lower: pd.Series) -> pd.Series:
     """
     Heuristic for higher taxonomic ranks (to be discarded):
       - single lowercase word (often family/order/common “bucket”)
       - endings typical of higher ranks: -idae (family), -oidea (superfamily), -inae (subfamily)
       - explicitly listed in HIGHER_TAXA_OR_NOISE
     """
-    n = name.strip()
-    ln = n.lower()
-    if ln in HIGHER_TAXA_OR_NOISE:
-        return True
-    if " " not in n and n.islower():
-        return True
-    if ln.endswith(("idae","oidea","inae")):
-        return True
-    return False
-
-def clean_for_row(plant: str, pollis: list, all_plants: set):
-    """Clean one row’s pollinator list with the rules described above."""
-    cleaned = []
-    seen = set()
-    for raw in pollis:
-        name = " ".join(raw.split())  # normalize spaces
-        if not name:
-            continue
-        # Drop the plant itself, and drop any other plant names from the first column
-        if name == plant or name in all_plants:
-            continue
-        # Remove obvious noise
-        if is_noise(name):
-            continue
-        # Keep binomials/trinomials
-        if BINOMIAL_RE.match(name):
-            pass
-        else:
-            # Or allow common pollinator genera
-            if name in GENUS_WHITELIST:
-                pass
-            else:
-                # Otherwise discard if it looks like a higher taxon/general bucket
-                if is_higher_taxon(name):
-                    continue
-        # Deduplicate while preserving order
-        if name not in seen:
-            seen.add(name)
-            cleaned.append(name)
-    return cleaned
+    return (
+        lower.isin(HIGHER_TAXA_OR_NOISE)
+        | (~names.str.contains(" ", regex=False) & names.str.islower())
+        | lower.str.endswith(("idae", "oidea", "inae"))
+    )
+
+def keep_mask(names: pd.Series, all_plants: Set[str]) -> pd.Series:
+    """
+    Which space-normalized names survive cleaning:
+      - not a plant name from the first column (this also drops the row's own plant)
+      - not noise
+      - binomial/trinomial, or a whitelisted genus, or at least not a higher taxon
+    """
+    lower = names.str.lower()
+    wanted = (
+        names.str.match(BINOMIAL_RE)
+        | names.isin(GENUS_WHITELIST)
+        | ~higher_taxon_mask(names, lower)
+    )
+    return ~names.isin(all_plants) & ~noise_mask(lower) & wanted
+
+class NameCache:
+    """
+    Per-run name table, filled chunk by chunk with only the values not seen yet:
+    raw list item -> id of its space-normalized name (-1 if empty), and per
+    name id its keep verdict. Classification runs on plain Python strings
+    (object dtype), so it follows exactly the str/re semantics of the rules above.
+    """
+
+    def __init__(self, all_plants: Set[str]):
+        self.all_plants = all_plants
+        self.raw_id: Dict[str, int] = {}
+        self.name_id: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.keep = np.zeros(0, dtype=bool)
+        self._names_arr = np.zeros(0, dtype=object)
+
+    def ids(self, raws: Sequence[str]) -> np.ndarray:
+        """Name id per raw item (ids of new names are classified on the way)."""
+        new_names: List[str] = []
+        for raw in raws:
+            if raw in self.raw_id:
+                continue
+            name = " ".join(raw.split())   # strip + normalize spaces
+            if not name:
+                self.raw_id[raw] = -1
+                continue
+            nid = self.name_id.get(name)
+            if nid is None:
+                nid = self.name_id[name] = len(self.names)
+                self.names.append(name)
+                new_names.append(name)
+            self.raw_id[raw] = nid
+        if new_names:
+            verdict = keep_mask(pd.Series(new_names, dtype=object), self.all_plants).to_numpy(dtype=bool)
+            self.keep = np.concatenate([self.keep, verdict])
+        return np.fromiter((self.raw_id[r] for r in raws), dtype=np.int64, count=len(raws))
+
+    def names_array(self) -> np.ndarray:
+        """self.names as an object array (for fancy indexing by id)."""
+        if len(self._names_arr) < len(self.names):
+            grown = np.empty(len(self.names), dtype=object)
+            grown[:len(self._names_arr)] = self._names_arr
+            grown[len(self._names_arr):] = self.names[len(self._names_arr):]
+            self._names_arr = grown
+        return self._names_arr
+
+def _open_rows(path: str):
+    """(file, csv reader positioned after the header, plant column, pollinators column)."""
+    f = open(path, "r", encoding="utf-8", newline="")
+    r = csv.reader(f)
+    header = next(r, None) or []
+    if "plant_scientific_name" not in header or "pollinators" not in header:
+        f.close()
+        raise SystemExit("CSV must contain columns: plant_scientific_name and pollinators")
+    return f, r, header.index("plant_scientific_name"), header.index("pollinators")
+
+def read_plants(path: str) -> Set[str]:
+    """All non-empty (stripped) plant names of the file."""
+    f, r, ip, _ = _open_rows(path)
+    with f:
+        plants = {row[ip].strip() for row in r if len(row) > ip}
+    plants.discard("")
+    return plants
+
+def read_chunks(path: str, size: int) -> Iterator[Tuple[List[str], List[str]]]:
+    """
+    (plants, pollinator cells) per chunk of up to `size` data rows; plants
+    stripped, missing cells as "", blank lines skipped (as csv.DictReader does).
+    """
+    f, r, ip, iq = _open_rows(path)
+    with f:
+        while True:
+            batch = list(islice(r, size))
+            if not batch:
+                return
+            rows = [row for row in batch if row]
+            if not rows:
+                continue
+            yield ([row[ip].strip() if ip < len(row) else "" for row in rows],
+                   [row[iq] if iq < len(row) else "" for row in rows])
+
+def clean_chunk(cells: List[str], cache: NameCache) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Cleaned ", "-joined list per pollinators cell, plus the per-row counts of
+    names before and after cleaning.
+    """
+    n = len(cells)
+    lists = [cell.split(",") for cell in cells]
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=n)
+    # long format: one entry per mention, factorized (the same raw item repeats a lot)
+    codes, uniques = pd.factorize(pd.Series(list(chain.from_iterable(lists)), dtype=object))
+    mention = cache.ids(uniques)[codes]
+    row = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+    named = mention >= 0
+    before = np.bincount(row[named], minlength=n)
+
+    keep = named & cache.keep[np.maximum(mention, 0)]
+    row, mention = row[keep], mention[keep]
+    first = ~pd.Series(row * len(cache.names) + mention).duplicated().to_numpy()  # per-row dedupe
+    row, mention = row[first], mention[first]
+    after = np.bincount(row, minlength=n)
+
+    names = cache.names_array()[mention].tolist()
+    ends = np.cumsum(after).tolist()
+    starts = [0] + ends[:-1]
+    return [", ".join(names[a:b]) for a, b in zip(starts, ends)], before, after
 
 def main():
     src = Path(INPUT)
     if not src.exists():
         raise SystemExit(f"Input file not found: {INPUT}")
 
-    rows = []
-    all_plants = set()
-
-    # Load entire CSV first and collect the set of all plant names
-    with open(INPUT, "r", encoding="utf-8", newline="") as f:
-        r = csv.DictReader(f)
-        if "plant_scientific_name" not in r.fieldnames or "pollinators" not in r.fieldnames:
-            raise SystemExit("CSV must contain columns: plant_scientific_name and pollinators")
-        for row in r:
-            plant = (row["plant_scientific_name"] or "").strip()
-            polli = row.get("pollinators","")
-            rows.append((plant, polli))
-            if plant:
-                all_plants.add(plant)
-
-    total = len(rows)
+    # Pass 1: the set of all plant names (rules drop any of them from every list)
+    cache = NameCache(read_plants(INPUT))
+
+    total = 0
     empty_before = 0
     empty_after = 0
-    kept_counts = []
+    kept_total = 0
+    nonzero_rows = 0
 
-    # Write cleaned CSV
+    # Pass 2: stream chunks into the cleaned CSV
     with open(OUTPUT, "w", encoding="utf-8", newline="") as f:
         w = csv.writer(f)
         w.writerow(["plant_scientific_name","pollinators"])
-        for plant, polli_cell in rows:
-            original = split_list(polli_cell)
-            if not original:
-                empty_before += 1
-            cleaned = clean_for_row(plant, original, all_plants)
-            if not cleaned:
-                empty_after += 1
-            kept_counts.append(len(cleaned))
-            w.writerow([plant, ", ".join(cleaned)])
+        for plants, cells in read_chunks(INPUT, CHUNK_ROWS):
+            cleaned, before, after = clean_chunk(cells, cache)
+            w.writerows(zip(plants, cleaned))
+            total += len(plants)
+            empty_before += int((before == 0).sum())
+            empty_after += int((after == 0).sum())
+            kept_total += int(after.sum())
+            nonzero_rows += int((after > 0).sum())
 
     # Simple QA report
     with open(REPORT, "w", encoding="utf-8") as f:
         f.write(f"Total rows: {total}\n")
         f.write(f"Original empty pollinator rows: {empty_before}\n")
         f.write(f"Empty rows after cleaning: {empty_after}\n")
-        if kept_counts:
-            nonzero = [c for c in kept_counts if c > 0]
-            avg_all = sum(kept_counts)/len(kept_counts)
-            avg_nonzero = (sum(nonzero)/len(nonzero)) if nonzero else 0.0
+        if total:
+            avg_all = kept_total/total
+            avg_nonzero = (kept_total/nonzero_rows) if nonzero_rows else 0.0
             f.write(f"Avg pollinators per plant (all rows): {avg_all:.2f}\n")
             f.write(f"Avg pollinators per plant (non-empty rows): {avg_nonzero:.2f}\n")
 
-    print(f"Done ✅  Wrote: {OUTPUT}")
+    print(f"Done ✅  Wrote: {OUTPUT} ({total} rows, {len(cache.names)} distinct names classified)")
     print(f"QA report: {REPORT}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,6 @@
 # community_map_data.py
 # Purpose: load community garden CSV and write into PostgreSQL on EC2.
-# - Drops and recreates table community_gardens
+# - Rebuilds table community_gardens (staging + atomic swap)
 # - Loads id, name, address, lat, lng (with dedup + safe insert)
 
 import os
@@ -8,6 +8,8 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_batch
 
+from pg_loader import staging_name, drop_staging, analyze_staging, swap_in
+
 # ---------- Configuration ----------
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -20,12 +22,11 @@ DB_CONFIG = {
 CSV_PATH = os.getenv("COMMUNITY_CSV", "community map data.csv")
 
 # ---------- DDL ----------
-DROP_SQL = """
-DROP TABLE IF EXISTS public.community_gardens CASCADE;
-"""
+TABLE = "community_gardens"
 
+# {table} is filled with the staging table name
 CREATE_SQL = """
-CREATE TABLE public.community_gardens (
+CREATE TABLE public.{table} (
     id BIGINT PRIMARY KEY,
     name TEXT NOT NULL,
     address TEXT,
@@ -35,7 +36,7 @@ CREATE TABLE public.community_gardens (
 """
 
 INSERT_SQL = """
-INSERT INTO public.community_gardens (id, name, address, lat, lng)
+INSERT INTO public.{table} (id, name, address, lat, lng)
 VALUES (%(id)s, %(name)s, %(address)s, %(lat)s, %(lng)s)
 ON CONFLICT (id) DO NOTHING;
 """
@@ -67,11 +68,15 @@ def write_to_db(df: pd.DataFrame) -> int:
     try:
         with conn:
             with conn.cursor() as cur:
-                print(">>> Dropping & creating table community_gardens")
-                cur.execute(DROP_SQL)
-                cur.execute(CREATE_SQL)
+                stage = staging_name(TABLE)
+                print(f">>> Creating staging table {stage}")
+                drop_staging(cur, TABLE)
+                cur.execute(CREATE_SQL.format(table=stage))
                 print(f">>> Inserting {len(df)} rows ...")
-                execute_batch(cur, INSERT_SQL, df.to_dict("records"), page_size=300)
+                execute_batch(cur, INSERT_SQL.format(table=stage), df.to_dict("records"), page_size=300)
+                analyze_staging(cur, TABLE)
+        print(">>> Swapping staging table into community_gardens")
+        swap_in(conn, [TABLE])
         return len(df)
     finally:
         conn.close()
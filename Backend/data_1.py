@@ -1,18 +1,31 @@
 # data_1.py
 # Purpose: load + clean two CSVs and write into PostgreSQL on EC2.
-# - Drops and recreates two tables: sowing_plants, variety_details
+# - Rebuilds two tables: sowing_plants, variety_details (staging + atomic swap)
 # - Cleans Plant names (strip suffixes), normalizes categories, removes
 #   "learn more about ... ." sentences from long text fields
 # - Links variety_details to sowing_plants via plant_name (from Category in variety CSV)
-
+# - Text cleaning is vectorized (pandas .str ops); the variety CSV is read in
+#   chunks as plain text (dtype=str like table_store.py, keep_default_na=False)
+#   so the output does not depend on the chunk size, and each chunk is
+#   streamed into the staging table with COPY
+# - Because of the text read, variety_details differs from the old
+#   pd.read_csv load in three ways: NA-like cells ("NA", "N/A", ...) are kept
+#   as written instead of becoming '', numbers are kept as written ("60", not
+#   "60.0" from a float column), and an empty Category gives plant_name ''
+#   instead of 'nan'
+# - bench_data_1.py times this against the old per-cell path
+
+import csv
+import io
 import os
-import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_batch
 
+from pg_loader import staging_name, drop_staging, analyze_staging, swap_in
+
 # ---------- Configuration ----------
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -25,16 +38,20 @@ DB_CONFIG = {
 # CSV paths (assumed to be in the same folder as this script)
 SOWING_CSV = os.getenv("SOWING_CSV", "sowing_chart_wide_with_links_and_category.csv")
 VARIETY_CSV = os.getenv("VARIETY_CSV", "variety_details.csv")
+VARIETY_CHUNK_ROWS = int(os.getenv("VARIETY_CHUNK_ROWS", "20000"))
+
+# The patterns are handed to pandas as strings with inline flags: on pyarrow
+# strings .str.replace / .str.contains then run in pyarrow (RE2) over the whole
+# column instead of calling Python's re per cell. RE2's \s is ASCII whitespace.
 
 # Suffixes to remove from Plant (case-insensitive, optional trailing '?', whitespace-safe)
-PLANT_SUFFIX_RE = re.compile(
-    r"\s+(Seeds?|Crowns?|Canes?|Cuttings?|Bulbs?|Tubers?)\s*$",
-    flags=re.IGNORECASE,
-)
+# One pass strips a whole run of trailing suffixes ("X Seeds Crowns" -> "X").
+PLANT_SUFFIX_PATTERN = r"(?i)(?:\s+(?:Seeds?|Crowns?|Canes?|Cuttings?|Bulbs?|Tubers?))+\s*$"
 
 # Pattern to remove any sentence that starts with "learn more about" (case-insensitive)
-# and goes until the next period. Applied repeatedly until none left.
-LEARN_MORE_SENTENCE_RE = re.compile(r"(?i)learn\s+more\s+about[^.]*\.")
+# and goes until the next period. Re-applied only to cells that still match.
+LEARN_MORE_PATTERN = r"(?i)learn\s+more\s+about[^.]*\."
+MULTI_SPACE_PATTERN = r"[ \t]{2,}"
 
 # Long-text columns in the variety CSV where we need to strip "learn more about ..." sentences
 VARIETY_TEXT_COLS = [
@@ -42,17 +59,18 @@ VARIETY_TEXT_COLS = [
 ]
 
 # ---------- Helpers ----------
-def clean_plant_name(name: str) -> str:
-    """Strip trailing suffixes like 'Seeds', 'Crowns', etc. Return stripped name."""
-    if not isinstance(name, str):
-        return ""
-    out = name.strip()
-    # Remove suffix repeatedly in case there are multiple tokens
-    prev = None
-    while prev != out:
-        prev = out
-        out = PLANT_SUFFIX_RE.sub("", out).strip()
-    return out
+def _text_only(s: pd.Series) -> pd.Series:
+    """Keep string cells; anything else (NaN, numbers) becomes ''."""
+    if isinstance(s.dtype, pd.StringDtype):
+        return s.fillna("")   # stays a string column (pyarrow-backed when available)
+    if not pd.api.types.is_string_dtype(s.dtype):
+        return pd.Series("", index=s.index, dtype=object)  # all-numeric column
+    # .str.len() is NaN for every non-string cell of an object column
+    return s.where(s.str.len().notna(), "").astype(object)
+
+def clean_plant_names(s: pd.Series) -> pd.Series:
+    """Strip trailing suffixes like 'Seeds', 'Crowns', etc. from every name."""
+    return _text_only(s).str.strip().str.replace(PLANT_SUFFIX_PATTERN, "", regex=True).str.strip()
 
 def split_categories(raw: str) -> List[str]:
     """Split semicolon-separated categories to a normalized lowercase list."""
@@ -61,18 +79,18 @@ def split_categories(raw: str) -> List[str]:
     parts = [p.strip().lower() for p in raw.split(";")]
     return [p for p in parts if p]
 
-def strip_learn_more(text: Any) -> str:
-    """Remove any 'learn more about ... .' sentence(s) from the text."""
-    if not isinstance(text, str) or not text:
-        return ""
-    s = text
-    # Apply repeatedly until no more matches
-    prev = None
-    while prev != s:
-        prev = s
-        s = LEARN_MORE_SENTENCE_RE.sub("", s)
+def strip_learn_more(s: pd.Series) -> pd.Series:
+    """Remove any 'learn more about ... .' sentence(s) from every cell."""
+    out = _text_only(s)
+    # Removing a sentence can expose a new match; repeat on those cells only
+    todo = out.str.contains(LEARN_MORE_PATTERN, regex=True)
+    while todo.any():
+        fixed = out[todo].str.replace(LEARN_MORE_PATTERN, "", regex=True)
+        out[todo] = fixed
+        todo = pd.Series(False, index=out.index)
+        todo[fixed.index] = fixed.str.contains(LEARN_MORE_PATTERN, regex=True)
     # Normalize double spaces and strip
-    return re.sub(r"[ \t]{2,}", " ", s).strip()
+    return out.str.replace(MULTI_SPACE_PATTERN, " ", regex=True).str.strip()
 
 def to_int01(v: Any) -> int:
     """Coerce to 0/1 integer; non-numeric becomes 0."""
@@ -82,8 +100,9 @@ def to_int01(v: Any) -> int:
         return 0
 
 # ---------- DDL ----------
+# {sowing}/{variety} are filled with the staging table names
 CREATE_SOWING_SQL = """
-CREATE TABLE public.sowing_plants (
+CREATE TABLE public.{sowing} (
   plant_name TEXT PRIMARY KEY,
   plant_url  TEXT,
   jan SMALLINT, feb SMALLINT, mar SMALLINT, apr SMALLINT, may SMALLINT, jun SMALLINT,
@@ -94,9 +113,9 @@ CREATE TABLE public.sowing_plants (
 """
 
 CREATE_VARIETY_SQL = """
-CREATE TABLE public.variety_details (
+CREATE TABLE public.{variety} (
   id BIGSERIAL PRIMARY KEY,
-  plant_name TEXT REFERENCES public.sowing_plants(plant_name) ON DELETE SET NULL,
+  plant_name TEXT REFERENCES public.{sowing}(plant_name) ON DELETE SET NULL,
   variety TEXT,
   overview TEXT,
   quick_method TEXT,
@@ -118,16 +137,17 @@ CREATE TABLE public.variety_details (
 );
 """
 
-DROP_TABLES_SQL = """
-DROP TABLE IF EXISTS public.variety_details CASCADE;
-DROP TABLE IF EXISTS public.sowing_plants CASCADE;
+INDEX_VARIETY_SQL = """
+CREATE INDEX ON public.{variety} (lower(plant_name));
 """
 
+SOWING_TABLE = "sowing_plants"
+VARIETY_TABLE = "variety_details"
+
 # ---------- Load & Transform ----------
 def load_and_transform() -> Dict[str, Any]:
-    # Load CSVs (UTF-8 assumed)
+    # Load CSVs (UTF-8 assumed); the variety CSV is only opened here and read in chunks
     sow = pd.read_csv(SOWING_CSV)
-    var = pd.read_csv(VARIETY_CSV)
 
     # --- Clean sowing ---
     month_cols = ["JAN","FEB","MAR","APR","MAY","JUN","JUL","AUG","SEP","OCT","NOV","DEC"]
@@ -135,7 +155,7 @@ def load_and_transform() -> Dict[str, Any]:
         if m not in sow.columns:
             raise ValueError(f"Missing month column in sowing CSV: {m}")
 
-    sow["plant_name"] = sow["Plant"].apply(clean_plant_name)
+    sow["plant_name"] = clean_plant_names(sow["Plant"])
     sow["plant_url"]  = sow.get("PlantURL", "")
 
     # Normalize categories
@@ -188,16 +208,22 @@ def load_and_transform() -> Dict[str, Any]:
         "category_raw","categories"
     ]].copy()
 
-    # --- Clean variety ---
+    variety = (transform_variety(chunk)
+               for chunk in pd.read_csv(VARIETY_CSV, dtype=str, keep_default_na=False,
+                                        chunksize=VARIETY_CHUNK_ROWS))
+    return {"sowing": sow_db, "variety": variety}
+
+def transform_variety(var: pd.DataFrame) -> pd.DataFrame:
+    """Clean one chunk of the variety CSV into variety_details columns."""
     # Derive plant_name from Category column
     if "Category" not in var.columns:
         raise ValueError("Missing 'Category' column in variety CSV")
-    var["plant_name"] = var["Category"].apply(lambda x: clean_plant_name(str(x)))
+    var["plant_name"] = clean_plant_names(var["Category"])
 
     # Drop Learn-more sentences from long text fields
     for col in VARIETY_TEXT_COLS:
         if col in var.columns:
-            var[col] = var[col].apply(strip_learn_more)
+            var[col] = strip_learn_more(var[col])
         else:
             var[col] = ""  # ensure column exists
 
@@ -236,26 +262,36 @@ def load_and_transform() -> Dict[str, Any]:
         "source_url": var["SourceURL"].fillna(""),
         "image_url": var["ImageURL"].fillna(""),
     })
-
-    return {"sowing": sow_db, "variety": var_db}
+    return var_db
 
 # ---------- Write to PostgreSQL ----------
-def write_to_db(payload: Dict[str, pd.DataFrame]) -> Dict[str, int]:
+def copy_text_frame(cur, table: str, df: pd.DataFrame) -> None:
+    """COPY a frame whose columns are all TEXT and NaN-free; QUOTE_ALL keeps '' as '' (not NULL)."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_ALL)
+    buf.seek(0)
+    cols = ", ".join(df.columns)
+    cur.copy_expert(f"COPY public.{table} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def write_to_db(payload: Dict[str, Any]) -> Dict[str, int]:
     sow_df: pd.DataFrame = payload["sowing"]
-    var_df: pd.DataFrame = payload["variety"]
+    var_chunks: Iterator[pd.DataFrame] = payload["variety"]
+
+    names = {"sowing": staging_name(SOWING_TABLE), "variety": staging_name(VARIETY_TABLE)}
 
     conn = psycopg2.connect(**DB_CONFIG)
     try:
         with conn:
             with conn.cursor() as cur:
-                # Drop & create tables
-                cur.execute(DROP_TABLES_SQL)
-                cur.execute(CREATE_SOWING_SQL)
-                cur.execute(CREATE_VARIETY_SQL)
+                # Build staging tables (live tables stay readable meanwhile)
+                drop_staging(cur, VARIETY_TABLE)
+                drop_staging(cur, SOWING_TABLE)
+                cur.execute(CREATE_SOWING_SQL.format(**names))
+                cur.execute(CREATE_VARIETY_SQL.format(**names))
 
                 # Insert sowing_plants
-                sow_sql = """
-                    INSERT INTO public.sowing_plants (
+                sow_sql = f"""
+                    INSERT INTO public.{names['sowing']} (
                         plant_name, plant_url,
                         jan,feb,mar,apr,may,jun,jul,aug,sep,oct,nov,dec,
                         category_raw, categories
@@ -268,25 +304,19 @@ def write_to_db(payload: Dict[str, pd.DataFrame]) -> Dict[str, int]:
                 # psycopg2 will map Python list -> PostgreSQL text[] automatically
                 execute_batch(cur, sow_sql, sow_df.to_dict("records"), page_size=500)
 
-                # Insert variety_details
-                var_sql = """
-                    INSERT INTO public.variety_details (
-                        plant_name, variety, overview, quick_method, quick_sowing_depth,
-                        quick_season, quick_germination, quick_hardiness_lifecycle,
-                        quick_plant_spacing, quick_plant_height, quick_position,
-                        quick_days_until_maturity, notes, preparation, how_to_sow,
-                        how_to_grow, how_to_harvest, source_url, image_url
-                    ) VALUES (
-                        %(plant_name)s, %(variety)s, %(overview)s, %(quick_method)s, %(quick_sowing_depth)s,
-                        %(quick_season)s, %(quick_germination)s, %(quick_hardiness_lifecycle)s,
-                        %(quick_plant_spacing)s, %(quick_plant_height)s, %(quick_position)s,
-                        %(quick_days_until_maturity)s, %(notes)s, %(preparation)s, %(how_to_sow)s,
-                        %(how_to_grow)s, %(how_to_harvest)s, %(source_url)s, %(image_url)s
-                    )
-                """
-                execute_batch(cur, var_sql, var_df.to_dict("records"), page_size=300)
+                # Stream variety_details chunk by chunk
+                var_rows = 0
+                for var_df in var_chunks:
+                    copy_text_frame(cur, names["variety"], var_df)
+                    var_rows += len(var_df)
+
+                cur.execute(INDEX_VARIETY_SQL.format(**names))
+                analyze_staging(cur, SOWING_TABLE)
+                analyze_staging(cur, VARIETY_TABLE)
 
-        return {"sowing_rows": len(sow_df), "variety_rows": len(var_df)}
+        # Swap both in together so the foreign key never points at a missing table
+        swap_in(conn, [VARIETY_TABLE, SOWING_TABLE])
+        return {"sowing_rows": len(sow_df), "variety_rows": var_rows}
     finally:
         conn.close()
 
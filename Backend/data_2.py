@@ -5,6 +5,8 @@ from typing import List, Dict
 import psycopg2
 from psycopg2.extras import execute_batch
 
+from pg_loader import staging_name, drop_staging, analyze_staging, swap_in
+
 # ---------- Configuration ----------
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -18,12 +20,11 @@ DB_CONFIG = {
 POLLINATORS_CSV = os.getenv("POLLINATORS_CSV", "pollinators_by_plant_clean.csv")
 
 # ---------- DDL for new table ----------
-DROP_POLLINATORS_SQL = """
-DROP TABLE IF EXISTS public.pollinators_by_plant CASCADE;
-"""
+POLLINATORS_TABLE = "pollinators_by_plant"
 
+# {table} is filled with the staging table name
 CREATE_POLLINATORS_SQL = """
-CREATE TABLE public.pollinators_by_plant (
+CREATE TABLE public.{table} (
   plant_scientific_name TEXT PRIMARY KEY,
   pollinators TEXT[]  -- cleaned list (comma-split, trimmed, unique)
 );
@@ -91,20 +92,24 @@ def main():
                 # 1) Clean up old Babiana rows in yesterday's tables
                 cur.execute(DELETE_BABIANA_SQL)
 
-                # 2) (Re)create the new pollinators table
-                cur.execute(DROP_POLLINATORS_SQL)
-                cur.execute(CREATE_POLLINATORS_SQL)
+                # 2) Build the pollinators table in staging
+                stage = staging_name(POLLINATORS_TABLE)
+                drop_staging(cur, POLLINATORS_TABLE)
+                cur.execute(CREATE_POLLINATORS_SQL.format(table=stage))
 
                 # 3) Insert all pollinator rows
-                insert_sql = """
-                    INSERT INTO public.pollinators_by_plant (
+                insert_sql = f"""
+                    INSERT INTO public.{stage} (
                         plant_scientific_name, pollinators
                     ) VALUES (
                         %(plant_scientific_name)s, %(pollinators)s
                     )
                 """
                 execute_batch(cur, insert_sql, rows, page_size=500)
+                analyze_staging(cur, POLLINATORS_TABLE)
 
+        # 4) Swap the staging table in
+        swap_in(conn, [POLLINATORS_TABLE])
         print(f"Done ✅ Inserted rows -> pollinators_by_plant: {len(rows)}")
         print("Cleaned up 'Babiana Corms' from sowing_plants and variety_details.")
     finally:
@@ -6,6 +6,8 @@ from typing import List, Dict
 import psycopg2
 from psycopg2.extras import execute_batch
 
+from pg_loader import staging_name, drop_staging, analyze_staging, swap_in
+
 # ---------- Configuration ----------
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -113,10 +115,10 @@ def main():
     rows = load_csv(COMPANIONS_CSV)
     print(f"[info] Loaded rows: {len(rows)}")
 
-    # Build DDL/DML with sanitized identifier
-    drop_sql = f'DROP TABLE IF EXISTS public.{table_name} CASCADE;'
+    # Build DDL/DML with sanitized identifier (written against the staging table)
+    stage = staging_name(table_name)
     create_sql = f"""
-    CREATE TABLE public.{table_name} (
+    CREATE TABLE public.{stage} (
       plant        TEXT NOT NULL,
       neighbour    TEXT NOT NULL,
       good_or_bad  TEXT NOT NULL CHECK (good_or_bad IN ('good','bad')),
@@ -125,7 +127,7 @@ def main():
     );
     """
     insert_sql = f"""
-        INSERT INTO public.{table_name} (
+        INSERT INTO public.{stage} (
             plant, neighbour, good_or_bad, why
         ) VALUES (
             %(plant)s, %(neighbour)s, %(good_or_bad)s, %(why)s
@@ -136,9 +138,12 @@ def main():
     try:
         with conn:
             with conn.cursor() as cur:
-                cur.execute(drop_sql)
+                drop_staging(cur, table_name)
                 cur.execute(create_sql)
                 execute_batch(cur, insert_sql, rows, page_size=BATCH_SIZE)
+                cur.execute(f"CREATE INDEX ON public.{stage} (lower(neighbour));")
+                analyze_staging(cur, table_name)
+        swap_in(conn, [table_name])
         print(f"[done] Inserted rows -> {table_name}: {len(rows)}")
     finally:
         conn.close()
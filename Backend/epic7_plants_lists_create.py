@@ -4,13 +4,15 @@
 # - epic3_companion_planting (unique plant list from plant ∪ neighbour, excluding 'All')
 # - sowing_plants (categories -> Type; months -> Seasons)
 # - variety_details (quick_position -> Sunshine; quick_plant_spacing -> Plant Spacing; quick_hardiness_lifecycle -> Hardiness)
+# Built in one pass: one bulk fetch per source table, grouped in Python by LOWER(plant_name).
 
 import os
 import re
 import random
 import math
-from collections import Counter
-from typing import List, Optional, Tuple
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extras import execute_batch
@@ -24,6 +26,11 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", "netzeroTP08"),
 }
 
+# Tie-break for the most common sunshine/hardiness value:
+#   random (original behaviour) | alpha (deterministic, alphabetically first)
+TIE_BREAKS = ("random", "alpha")
+TIE_BREAK = os.getenv("TIE_BREAK", "random").lower()
+
 ALLOWED_TYPES = {"vegetable": "Vegetable", "herb": "Herb", "flower": "Flower"}
 
 SEASON_MAP = {
@@ -43,6 +50,8 @@ def mode_with_random_tie(values: List[str]) -> Optional[str]:
     c = Counter(values)
     max_count = max(c.values())
     candidates = [k for k, v in c.items() if v == max_count]
+    if TIE_BREAK == "alpha":
+        return min(candidates)
     return random.choice(candidates)
 
 def extract_cm_number(s: str) -> Optional[int]:
@@ -79,6 +88,10 @@ def pick_type_from_categories(categories, category_raw: Optional[str]) -> Option
                 return ALLOWED_TYPES[token]
     return None
 
+def has_text(v: Optional[str]) -> bool:
+    """Python twin of `v IS NOT NULL AND TRIM(v) <> ''`."""
+    return v is not None and v.strip(" ") != ""
+
 def months_to_seasons(months: List[int]) -> List[str]:
     """Convert list of month numbers with value=1 to seasons."""
     result = []
@@ -87,8 +100,63 @@ def months_to_seasons(months: List[int]) -> List[str]:
             result.append(season)
     return result
 
+# ---------- Bulk fetch ----------
+def fetch_sowing(cur, keys: List[str]) -> Dict[str, tuple]:
+    """First sowing_plants row per LOWER(plant_name), for all plants at once."""
+    cur.execute("""
+        SELECT LOWER(plant_name), categories, category_raw,
+               jan,feb,mar,apr,may,jun,jul,aug,sep,oct,nov,dec
+        FROM sowing_plants
+        WHERE LOWER(plant_name) = ANY(%s);
+    """, (keys,))
+    out: Dict[str, tuple] = {}
+    for row in cur.fetchall():
+        out.setdefault(row[0], row[1:])
+    return out
+
+def fetch_varieties(cur, keys: List[str]) -> Dict[str, List[tuple]]:
+    """All (position, spacing, hardiness) triples grouped by LOWER(plant_name)."""
+    cur.execute("""
+        SELECT LOWER(plant_name), quick_position, quick_plant_spacing, quick_hardiness_lifecycle
+        FROM variety_details
+        WHERE LOWER(plant_name) = ANY(%s)
+        ORDER BY id;
+    """, (keys,))
+    out: Dict[str, List[tuple]] = defaultdict(list)
+    for row in cur.fetchall():
+        out[row[0]].append(row[1:])
+    return out
+
+def build_overview_row(pname: str, sp_row: Optional[tuple], var_rows: List[tuple]):
+    # --- Type + Seasons ---
+    type_val, seasons_val = None, []
+    if sp_row:
+        categories, category_raw = sp_row[0], sp_row[1]
+        months_raw = sp_row[2:]
+        type_val = pick_type_from_categories(categories, category_raw)
+        months_active = [i+1 for i, v in enumerate(months_raw) if v == 1]
+        seasons_val = months_to_seasons(months_active)
+
+    # --- Sunshine ---
+    qpos = [first_token_before_comma(pos) for pos, _, _ in var_rows if has_text(pos)]
+    sunshine = mode_with_random_tie(qpos)
+
+    # --- Plant Spacing ---
+    spacing_nums = [extract_cm_number(sp) for _, sp, _ in var_rows if has_text(sp)]
+    spacing_nums = [n for n in spacing_nums if n is not None]
+    plant_spacing_cm = ceil_to_20(max(spacing_nums)) if spacing_nums else None
+
+    # --- Hardiness ---
+    hardiness_norm = [normalize_hardiness(h) for _, _, h in var_rows if has_text(h)]
+    hardiness = mode_with_random_tie([h for h in hardiness_norm if h])
+
+    return (pname, type_val, sunshine, plant_spacing_cm, hardiness, seasons_val)
+
 # ---------- Main ETL ----------
 def main():
+    if TIE_BREAK not in TIE_BREAKS:
+        raise SystemExit(f"Unknown TIE_BREAK: {TIE_BREAK} (expected random or alpha)")
+    t0 = time.perf_counter()
     conn = psycopg2.connect(**DB_CONFIG)
     conn.autocommit = False
     try:
@@ -121,70 +189,15 @@ def main():
             """)
             plants = [r[0] for r in cur.fetchall()]
 
-        rows_to_upsert: List[Tuple[str, Optional[str], Optional[str], Optional[int], Optional[str], List[str]]] = []
+            # 3) One bulk fetch per source table
+            keys = sorted({p.lower() for p in plants})
+            sowing = fetch_sowing(cur, keys)
+            varieties = fetch_varieties(cur, keys)
 
-        with conn.cursor() as cur:
-            for plant in plants:
-                pname = plant
-
-                # --- Type + Seasons ---
-                cur.execute("""
-                    SELECT categories, category_raw,
-                           jan,feb,mar,apr,may,jun,jul,aug,sep,oct,nov,dec
-                    FROM sowing_plants
-                    WHERE LOWER(plant_name) = LOWER(%s)
-                    LIMIT 1;
-                """, (pname,))
-                type_val, seasons_val = None, []
-                sp_row = cur.fetchone()
-                if sp_row:
-                    categories, category_raw = sp_row[0], sp_row[1]
-                    months_raw = sp_row[2:]
-                    # type
-                    type_val = pick_type_from_categories(categories, category_raw)
-                    # seasons
-                    months_active = [i+1 for i, v in enumerate(months_raw) if v == 1]
-                    seasons_val = months_to_seasons(months_active)
-
-                # --- Sunshine ---
-                cur.execute("""
-                    SELECT quick_position
-                    FROM variety_details
-                    WHERE LOWER(plant_name) = LOWER(%s)
-                      AND quick_position IS NOT NULL
-                      AND TRIM(quick_position) <> ''
-                """, (pname,))
-                qpos = [first_token_before_comma(r[0]) for r in cur.fetchall() if r[0]]
-                sunshine = mode_with_random_tie(qpos)
-
-                # --- Plant Spacing ---
-                cur.execute("""
-                    SELECT quick_plant_spacing
-                    FROM variety_details
-                    WHERE LOWER(plant_name) = LOWER(%s)
-                      AND quick_plant_spacing IS NOT NULL
-                      AND TRIM(quick_plant_spacing) <> ''
-                """, (pname,))
-                spacings_raw = [r[0] for r in cur.fetchall()]
-                spacing_nums = [extract_cm_number(s) for s in spacings_raw if extract_cm_number(s) is not None]
-                plant_spacing_cm = None
-                if spacing_nums:
-                    plant_spacing_cm = ceil_to_20(max(spacing_nums))
-
-                # --- Hardiness ---
-                cur.execute("""
-                    SELECT quick_hardiness_lifecycle
-                    FROM variety_details
-                    WHERE LOWER(plant_name) = LOWER(%s)
-                      AND quick_hardiness_lifecycle IS NOT NULL
-                      AND TRIM(quick_hardiness_lifecycle) <> ''
-                """, (pname,))
-                hardiness_raw = [r[0] for r in cur.fetchall() if r[0]]
-                hardiness_norm = [normalize_hardiness(x) for x in hardiness_raw]
-                hardiness_norm = [h for h in hardiness_norm if h]
-                hardiness = mode_with_random_tie(hardiness_norm)
-
-                rows_to_upsert.append((pname, type_val, sunshine, plant_spacing_cm, hardiness, seasons_val))
+        rows_to_upsert: List[Tuple[str, Optional[str], Optional[str], Optional[int], Optional[str], List[str]]] = [
+            build_overview_row(p, sowing.get(p.lower()), varieties.get(p.lower(), []))
+            for p in plants
+        ]
 
         with conn.cursor() as cur:
             execute_batch(cur, """
@@ -199,7 +212,8 @@ def main():
             """, rows_to_upsert, page_size=500)
 
         conn.commit()
-        print(f"Upserted {len(rows_to_upsert)} rows into epic7_plants_overview")
+        print(f"Upserted {len(rows_to_upsert)} rows into epic7_plants_overview "
+              f"in {time.perf_counter() - t0:.2f}s (tie-break: {TIE_BREAK})")
     except Exception:
         conn.rollback()
         raise
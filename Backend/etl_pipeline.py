@@ -0,0 +1,311 @@
+# etl_pipeline.py
+# Purpose: run the Backend refresh scripts as one dependency-aware pipeline.
+# - Each stage declares its script, input files, output files, upstream stages
+#   and the DB tables it (re)builds
+# - A stage is skipped when its script and inputs hash the same as after its
+#   last successful run, its output files exist and no upstream stage ran
+# - Stages whose upstreams are finished run in parallel, each script in its
+#   own worker process (python <script>, cwd = this folder)
+# - Ends with a per-stage report: status, seconds, rows per output CSV/table
+#
+# Usage:
+#   python etl_pipeline.py                  # every stage
+#   python etl_pipeline.py epic7_plants     # these stages + their upstreams
+# Env: ETL_WORKERS (parallel stages), ETL_FORCE=1 (ignore hashes), ETL_STATE
+#
+# The fetchers (globiapi.py, alaimage.py, alalocation.py) are not stages: they
+# are slow, resumable network jobs. Their CSVs are treated as source inputs.
+
+import csv
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from table_store import frame_path
+
+# ---------- Configuration ----------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.getenv("ETL_STATE", os.path.join(BASE_DIR, ".etl_state.json"))
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", "4"))
+ETL_FORCE = os.getenv("ETL_FORCE", "0") == "1"
+HASH_BLOCK = 1 << 20
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", "5432")),
+    "database": os.getenv("DB_NAME", "5120netzeroDB"),
+    "user": os.getenv("DB_USER", "gardener"),
+    "password": os.getenv("DB_PASSWORD", "netzeroTP08"),
+}
+
+# ---------- Stages ----------
+# Paths follow the same env overrides as the scripts themselves. Intermediates
+# of the cleaning chain use the table_store format (PIPELINE_FORMAT); the CSVs
+# exported by alacleanspieces are what load_to_pg reads.
+CHECKLIST = "checklist-2025-09-13.csv"
+REL_CSV = os.getenv("REL_CSV", "relationship_dataset.csv")
+SPECIES_CSV = os.getenv("SPECIES_CSV", "species_information_dataset.csv")
+OBS_CSV = os.getenv("OBS_CSV", "species_occurrences_cleaned.csv")
+
+STAGES: List[Dict] = [
+    {"name": "ala", "script": "ala.py",
+     "inputs": ["plant_animal_interactions.csv", CHECKLIST, "table_store.py"],
+     "outputs": [frame_path("filtered_merged")], "deps": [], "tables": []},
+    {"name": "aladatacleaning", "script": "aladatacleaning.py",
+     "inputs": [frame_path("filtered_merged"), CHECKLIST, "ala_animal_images.csv", "table_store.py"],
+     "outputs": [frame_path("relationship_dataset"), frame_path("species_information_dataset")],
+     "deps": ["ala"], "tables": []},
+    {"name": "clean_observations", "script": "clean_observations.py",
+     "inputs": ["species_occurrences.csv", "table_store.py"],
+     "outputs": [frame_path("species_occurrences_cleaned")], "deps": [], "tables": []},
+    # with PIPELINE_FORMAT=csv this rewrites its three inputs in place
+    {"name": "alacleanspieces", "script": "alacleanspieces.py",
+     "inputs": [frame_path("species_information_dataset"), frame_path("relationship_dataset"),
+                frame_path("species_occurrences_cleaned"), "table_store.py"],
+     "outputs": ["species_information_dataset.csv", "relationship_dataset.csv",
+                 "species_occurrences_cleaned.csv"],
+     "deps": ["aladatacleaning", "clean_observations"], "tables": []},
+    {"name": "load_to_pg", "script": "load_to_pg.py",
+     "inputs": [REL_CSV, SPECIES_CSV, OBS_CSV, "pg_loader.py"],
+     "outputs": [], "deps": ["alacleanspieces"],
+     "tables": ["relationship_dataset", "species_information_dataset",
+                "species_occurrences_cleaned"]},
+    {"name": "data_1", "script": "data_1.py",
+     "inputs": [os.getenv("SOWING_CSV", "sowing_chart_wide_with_links_and_category.csv"),
+                os.getenv("VARIETY_CSV", "variety_details.csv"), "pg_loader.py"],
+     "outputs": [], "deps": [], "tables": ["sowing_plants", "variety_details"]},
+    # also deletes 'Babiana Corms' from the sowing_plants / variety_details that
+    # data_1 rebuilds: runs after it, and again every time it runs
+    {"name": "data_2", "script": "data_2.py",
+     "inputs": [os.getenv("POLLINATORS_CSV", "pollinators_by_plant_clean.csv"), "pg_loader.py"],
+     "outputs": [], "deps": ["data_1"], "tables": ["pollinators_by_plant"]},
+    {"name": "epic3_companion_planting", "script": "epic3_companion_planting.py",
+     "inputs": [os.getenv("COMPANIONS_CSV", "epic3_companion_planting.csv"), "pg_loader.py"],
+     "outputs": [], "deps": [], "tables": ["epic3_companion_planting"]},
+    # patches tables built by load_to_pg and epic3_companion_planting
+    {"name": "change_order", "script": "change_order.py",
+     "inputs": [os.getenv("ORDER_CSV", "order_dataset.csv")],
+     "outputs": [], "deps": ["load_to_pg", "epic3_companion_planting"], "tables": []},
+    {"name": "community_map_data", "script": "community_map_data.py",
+     "inputs": [os.getenv("COMMUNITY_CSV", "community map data.csv"), "pg_loader.py"],
+     "outputs": [], "deps": [], "tables": ["community_gardens"]},
+    {"name": "epic7_plants_lists_create", "script": "epic7_plants_lists_create.py",
+     "inputs": [], "outputs": [], "deps": ["data_1", "data_2", "change_order"],
+     "tables": ["epic7_plants_overview"]},
+]
+
+# ---------- State ----------
+def load_state() -> Dict:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"stages": {}, "files": {}}
+
+def save_state(state: Dict) -> None:
+    """Write via a temp file + rename so an interrupted run never corrupts it."""
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+# ---------- Hashing ----------
+def _abs(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+def _resolve(path: str) -> Optional[str]:
+    """
+    The file actually on disk for `path`. Like table_store's reads, a .parquet
+    or .csv table also resolves to the other format, if only that one exists.
+    """
+    root, ext = os.path.splitext(path)
+    alts = [path]
+    if ext in (".parquet", ".csv"):
+        alts.append(root + (".csv" if ext == ".parquet" else ".parquet"))
+    return next((p for p in alts if os.path.exists(_abs(p))), None)
+
+def file_hash(state: Dict, path: str) -> Optional[str]:
+    """
+    SHA-1 of a file's content, or None if missing. The digest is cached by
+    (size, mtime) so unchanged multi-GB CSVs are not re-read on every run.
+    """
+    full = _abs(path)
+    try:
+        st = os.stat(full)
+    except FileNotFoundError:
+        return None
+    cached = state["files"].get(path)
+    if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+        return cached["sha1"]
+    h = hashlib.sha1()
+    with open(full, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    state["files"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": h.hexdigest()}
+    return h.hexdigest()
+
+def fingerprint(state: Dict, stage: Dict) -> str:
+    """Hash of the stage's script + every input file (missing files hash as None)."""
+    h = hashlib.sha1()
+    for path in [stage["script"]] + sorted(set(stage["inputs"])):
+        real = _resolve(path)
+        h.update(f"{path}={real and file_hash(state, real)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+# ---------- Planning ----------
+def select_stages(targets: List[str]) -> List[Dict]:
+    """Stages named in `targets` plus all their upstreams, in declaration order."""
+    by_name = {s["name"]: s for s in STAGES}
+    if not targets:
+        return list(STAGES)
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {unknown}. Known: {list(by_name)}")
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name]["deps"])
+    return [s for s in STAGES if s["name"] in wanted]
+
+def skip_reason(state: Dict, stage: Dict, upstream_ran: bool) -> Optional[str]:
+    """Why the stage can be skipped, or None if it has to run."""
+    missing_in = [p for p in stage["inputs"] if _resolve(p) is None]
+    missing_out = [p for p in stage["outputs"] if _resolve(p) is None]
+    if missing_in:
+        # e.g. a fetcher CSV not present locally: keep using the existing results
+        return f"missing input {missing_in[0]}, keeping existing results"
+    if ETL_FORCE or upstream_ran or missing_out:
+        return None
+    prev = state["stages"].get(stage["name"])
+    if prev and prev["fingerprint"] == fingerprint(state, stage):
+        return "unchanged"
+    return None
+
+# ---------- Execution ----------
+def run_script(stage: Dict) -> Dict:
+    """Run one stage in its own Python process; returns exit code, output and time."""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, stage["script"]],
+        cwd=BASE_DIR, capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    return {"code": proc.returncode, "output": proc.stdout + proc.stderr,
+            "secs": time.perf_counter() - t0}
+
+def count_rows(path: str) -> int:
+    """Data rows in an output CSV, or from the footer of an output Parquet file."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(_abs(path)).metadata.num_rows
+    with open(_abs(path), "r", encoding="utf-8", errors="ignore", newline="") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+def count_table_rows(tables: List[str]) -> Dict[str, str]:
+    """Row counts for the reported tables; '?' if the DB is unreachable."""
+    counts = {t: "?" for t in tables}
+    if not tables:
+        return counts
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+    except psycopg2.Error:
+        return counts
+    try:
+        with conn.cursor() as cur:
+            for t in tables:
+                try:
+                    cur.execute(f'SELECT COUNT(*) FROM public."{t}"')
+                    counts[t] = str(cur.fetchone()[0])
+                except psycopg2.Error:
+                    conn.rollback()
+    finally:
+        conn.close()
+    return counts
+
+def run_pipeline(stages: List[Dict]) -> Dict[str, Dict]:
+    """Schedule stages as their upstreams finish; returns per-stage results."""
+    state = load_state()
+    names = {s["name"] for s in stages}
+    pending = {s["name"]: s for s in stages}
+    results: Dict[str, Dict] = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(ETL_WORKERS, 1)) as ex:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                deps = [d for d in stage["deps"] if d in names]
+                if any(d not in results for d in deps):
+                    continue
+                del pending[name]
+                if any(results[d]["status"] in ("failed", "blocked") for d in deps):
+                    results[name] = {"status": "blocked", "secs": 0.0}
+                    print(f"[{name}] blocked by a failed upstream")
+                    continue
+                missing = [p for p in stage["inputs"] + stage["outputs"] if _resolve(p) is None]
+                if any(p in missing for p in stage["inputs"]) and any(p in missing for p in stage["outputs"]):
+                    results[name] = {"status": "failed", "secs": 0.0}
+                    print(f"[{name}] FAILED: missing on disk: {missing}")
+                    continue
+                reason = skip_reason(state, stage, any(results[d]["status"] == "ran" for d in deps))
+                if reason:
+                    results[name] = {"status": "skipped", "secs": 0.0}
+                    print(f"[{name}] skip ({reason})")
+                    continue
+                print(f"[{name}] start")
+                running[ex.submit(run_script, stage)] = stage
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage = running.pop(fut)
+                name, res = stage["name"], fut.result()
+                for line in res["output"].rstrip().splitlines():
+                    print(f"[{name}] {line}")
+                if res["code"] != 0:
+                    results[name] = {"status": "failed", "secs": res["secs"]}
+                    print(f"[{name}] FAILED (exit {res['code']}) after {res['secs']:.2f}s")
+                    continue
+                results[name] = {"status": "ran", "secs": res["secs"]}
+                # hashed after the run, so stages that rewrite their inputs
+                # in place are recorded with the content they left behind
+                state["stages"][name] = {"fingerprint": fingerprint(state, stage),
+                                         "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+                save_state(state)
+                print(f"[{name}] done in {res['secs']:.2f}s")
+    return results
+
+def print_report(stages: List[Dict], results: Dict[str, Dict], wall: float) -> None:
+    tables = [t for s in stages if results[s["name"]]["status"] == "ran" for t in s["tables"]]
+    table_rows = count_table_rows(tables)
+    print("\n[report] stage                        status     secs  rows")
+    for s in stages:
+        r = results[s["name"]]
+        rows = ""
+        if r["status"] == "ran":
+            parts = [f"{os.path.basename(p)}={count_rows(p)}" for p in s["outputs"]]
+            parts += [f"{t}={table_rows[t]}" for t in s["tables"]]
+            rows = ", ".join(parts)
+        print(f"[report] {s['name']:<28} {r['status']:<8} {r['secs']:>6.2f}  {rows}")
+    serial = sum(r["secs"] for r in results.values())
+    print(f"[report] wall {wall:.2f}s | sum of stages {serial:.2f}s | workers={ETL_WORKERS}")
+
+# ---------- Main ----------
+def main():
+    stages = select_stages(sys.argv[1:])
+    t0 = time.perf_counter()
+    results = run_pipeline(stages)
+    print_report(stages, results, time.perf_counter() - t0)
+    if any(r["status"] in ("failed", "blocked") for r in results.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
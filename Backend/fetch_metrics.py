@@ -0,0 +1,300 @@
+# fetch_metrics.py
+# Purpose: one metrics surface for the fetchers (globiapi.py / globi_async.py,
+# alaimage.py, alalocation.py), so a slow run shows WHERE the time goes.
+# - Per-endpoint latency histograms (fixed buckets; count / mean / p50 / p95 / max)
+# - Event counters: retries, fallbacks (GloBI A2/A3/B1, ALA image and summary
+#   fallbacks), non-2xx answers by status (http_429, http_500, http_error for
+#   connection failures), cache hits
+# - Time spent sleeping, by reason (rate limit, 429 pause, backoff, our fixed
+#   sleeps between pages/species)
+# - Progress: species done / total, rows, rows/s, species/min and ETA
+# - JSON lines in FETCH_METRICS_FILE: one "progress" snapshot every
+#   FETCH_METRICS_EVERY seconds, one "species" line per committed species and
+#   a "summary" at exit (also printed as a table); the file stays open for
+#   the run and is flushed after every line
+# - FETCH_METRICS_PORT > 0: the same numbers on a Prometheus /metrics endpoint
+#   (needs prometheus_client; skipped with a warning if it is missing)
+#
+# Use: metrics.start("alaimage", total) once, then observe()/count()/sleep()
+# from any thread and species_done()/species_failed() from the main loop.
+
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Union
+
+try:
+    import prometheus_client
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+except ImportError:  # optional: only needed for FETCH_METRICS_PORT
+    prometheus_client = None
+
+# ---------------------------- Config ----------------------------
+FETCH_METRICS_FILE = os.getenv("FETCH_METRICS_FILE", "fetch_metrics.jsonl")  # "" = no JSON lines
+FETCH_METRICS_EVERY = float(os.getenv("FETCH_METRICS_EVERY", "10"))         # seconds between snapshots
+FETCH_METRICS_PORT = int(os.getenv("FETCH_METRICS_PORT", "0"))              # 0 = no Prometheus endpoint
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)  # seconds (upper bounds)
+
+# ---------------------------- Histogram ----------------------------
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, secs: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if secs <= bound:
+                self.counts[i] += 1
+                break
+        self.n += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for the last bucket)."""
+        if not self.n:
+            return 0.0
+        rank, acc = q * self.n, 0
+        for bound, c in zip(BUCKETS, self.counts):
+            acc += c
+            if acc >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "n": self.n,
+            "mean_ms": round(self.total / self.n * 1000, 1) if self.n else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 1),
+            "p95_ms": round(self.quantile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+# ---------------------------- Metrics ----------------------------
+class FetchMetrics:
+    """Run-wide metrics of one fetcher process; safe to update from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()   # serializes JSON lines without blocking the counters
+        self._file = None                    # FETCH_METRICS_FILE, open from the first line to summary()
+        self.fetcher = os.path.splitext(os.path.basename(sys.argv[0] or "fetch"))[0]
+        self.total = 0
+        self.t0 = time.monotonic()
+        self.started_at = time.time()
+        self.endpoints: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.sleep_s: Dict[str, float] = {}
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self._last_emit = 0.0
+        self._started = False
+        self._finished = False
+
+    def start(self, fetcher: str, total: int) -> None:
+        """Begin the run: `total` species to fetch. Registers the exit summary."""
+        with self._lock:
+            self.fetcher, self.total = fetcher, total
+            self.t0, self.started_at = time.monotonic(), time.time()
+            self._last_emit = self.t0
+            if self._started:
+                return
+            self._started = True
+        if FETCH_METRICS_PORT > 0:
+            self._serve_prometheus()
+        atexit.register(self.summary)
+        self._emit("start", {"total": total})
+
+    # ----- recording -----
+    def observe(self, endpoint: str, secs: float, status: Union[int, str]) -> None:
+        """One HTTP call: latency into the endpoint's histogram; non-2xx counted as http_<status>."""
+        with self._lock:
+            self.endpoints.setdefault(endpoint, Histogram()).observe(secs)
+            if status == "error" or (isinstance(status, int) and status >= 300):
+                key = f"http_{status}"
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def count(self, event: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def slept(self, reason: str, secs: float) -> None:
+        """Record `secs` of waiting for `reason` (the caller sleeps; async code uses this)."""
+        if secs <= 0:
+            return
+        with self._lock:
+            self.sleep_s[reason] = self.sleep_s.get(reason, 0.0) + secs
+
+    def sleep(self, secs: float, reason: str) -> None:
+        """time.sleep() that is accounted under `reason`."""
+        self.slept(reason, secs)
+        if secs > 0:
+            time.sleep(secs)
+
+    def species_done(self, name: str, rows: int) -> None:
+        with self._lock:
+            self.done += 1
+            self.rows += rows
+        self._emit("species", {"species": name, "rows": rows})
+        self._maybe_progress()
+
+    def species_failed(self, name: str, error: object = None) -> None:
+        with self._lock:
+            self.failed += 1
+        self._emit("species", {"species": name, "error": str(error) if error is not None else "failed"})
+        self._maybe_progress()
+
+    # ----- reading -----
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.t0
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            left = max(self.total - self.done - self.failed, 0)
+            return {
+                "elapsed_s": round(elapsed, 1),
+                "species_done": self.done,
+                "species_failed": self.failed,
+                "species_total": self.total,
+                "rows": self.rows,
+                "rows_per_s": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+                "species_per_min": round(rate * 60, 1),
+                "eta_s": round(left / rate, 0) if rate > 0 else None,
+                "counters": dict(sorted(self.counters.items())),
+                "sleep_s": {k: round(v, 1) for k, v in sorted(self.sleep_s.items())},
+                "endpoints": {k: h.summary() for k, h in sorted(self.endpoints.items())},
+            }
+
+    def _maybe_progress(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_emit < FETCH_METRICS_EVERY:
+                return
+            self._last_emit = now
+        snap = self.snapshot()
+        self._emit("progress", snap)
+        eta = snap["eta_s"]
+        print(f"[metrics] {snap['species_done']}/{snap['species_total']} species | "
+              f"{snap['rows_per_s']} rows/s | {snap['species_per_min']} species/min | "
+              f"ETA {_fmt_secs(eta) if eta is not None else '?'}")
+
+    def _emit(self, event: str, data: Dict) -> None:
+        if not FETCH_METRICS_FILE:
+            return
+        line = {"ts": round(time.time(), 3), "run": int(self.started_at),
+                "fetcher": self.fetcher, "event": event, **data}
+        text = json.dumps(line, ensure_ascii=False) + "\n"
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(FETCH_METRICS_FILE, "a", encoding="utf-8")
+            self._file.write(text)
+            self._file.flush()   # a killed run keeps every line written so far
+
+    def _close(self) -> None:
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self) -> None:
+        """Summary line + table; runs once, at exit at the latest."""
+        with self._lock:
+            if self._finished or not self._started:
+                return
+            self._finished = True
+        snap = self.snapshot()
+        self._emit("summary", snap)
+        self._close()
+        print(f"\n[metrics] {self.fetcher}: {snap['species_done']}/{snap['species_total']} species "
+              f"({snap['species_failed']} failed), {snap['rows']} rows in {_fmt_secs(snap['elapsed_s'])} | "
+              f"{snap['rows_per_s']} rows/s | {snap['species_per_min']} species/min")
+        print(f"  {'endpoint':<36} {'calls':>7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, h in snap["endpoints"].items():
+            print(f"  {name:<36} {h['n']:7d} {h['mean_ms']:8.0f} {h['p50_ms']:8.0f} "
+                  f"{h['p95_ms']:8.0f} {h['max_ms']:8.0f}")
+        if snap["counters"]:
+            print("  events: " + ", ".join(f"{k}={v}" for k, v in snap["counters"].items()))
+        if snap["sleep_s"]:
+            print("  slept:  " + ", ".join(f"{k}={v}s" for k, v in snap["sleep_s"].items()))
+
+    # ----- Prometheus -----
+    def _serve_prometheus(self) -> None:
+        if prometheus_client is None:
+            print("[metrics] prometheus_client not installed; FETCH_METRICS_PORT ignored")
+            return
+        prometheus_client.REGISTRY.register(_Collector(self))
+        prometheus_client.start_http_server(FETCH_METRICS_PORT, addr="127.0.0.1")
+        print(f"[metrics] Prometheus metrics on http://127.0.0.1:{FETCH_METRICS_PORT}/metrics")
+
+
+class _Collector:
+    """Exports FetchMetrics as Prometheus metric families at scrape time."""
+
+    def __init__(self, m: FetchMetrics):
+        self.m = m
+
+    def collect(self):
+        m = self.m
+        with m._lock:
+            hists = {k: (list(h.counts), h.total) for k, h in m.endpoints.items()}
+            counters = dict(m.counters)
+            sleeps = dict(m.sleep_s)
+        snap = m.snapshot()
+
+        lat = HistogramMetricFamily("fetch_request_seconds", "HTTP latency per endpoint",
+                                    labels=["fetcher", "endpoint"])
+        for endpoint, (counts, total) in hists.items():
+            acc, buckets = 0, []
+            for bound, c in zip(BUCKETS, counts):
+                acc += c
+                buckets.append(("+Inf" if bound == math.inf else str(bound), acc))
+            lat.add_metric([m.fetcher, endpoint], buckets, total)
+        yield lat
+
+        events = CounterMetricFamily("fetch_events", "Retries, 429s, fallbacks, errors",
+                                     labels=["fetcher", "event"])
+        for k, v in counters.items():
+            events.add_metric([m.fetcher, k], v)
+        yield events
+
+        slept = CounterMetricFamily("fetch_sleep_seconds", "Time spent waiting, by reason",
+                                    labels=["fetcher", "reason"])
+        for k, v in sleeps.items():
+            slept.add_metric([m.fetcher, k], v)
+        yield slept
+
+        for name, key, doc in (("fetch_species_done", "species_done", "Species committed"),
+                               ("fetch_species_failed", "species_failed", "Species failed"),
+                               ("fetch_species_total", "species_total", "Species to fetch"),
+                               ("fetch_rows", "rows", "Rows committed"),
+                               ("fetch_rows_per_second", "rows_per_s", "Rows per second"),
+                               ("fetch_eta_seconds", "eta_s", "Estimated seconds left")):
+            g = GaugeMetricFamily(name, doc, labels=["fetcher"])
+            g.add_metric([m.fetcher], snap[key] if snap[key] is not None else math.nan)
+            yield g
+
+
+def _fmt_secs(secs: Optional[float]) -> str:
+    secs = int(secs or 0)
+    h, rem = divmod(secs, 3600)
+    return f"{h}h{rem // 60:02d}m" if h else f"{rem // 60}m{rem % 60:02d}s"
+
+
+METRICS = FetchMetrics()
+
+# module-level shortcuts: `import fetch_metrics as metrics; metrics.count("retry")`
+start = METRICS.start
+observe = METRICS.observe
+count = METRICS.count
+slept = METRICS.slept
+sleep = METRICS.sleep
+species_done = METRICS.species_done
+species_failed = METRICS.species_failed
+summary = METRICS.summary
@@ -0,0 +1,210 @@
+# fetch_output.py
+# Purpose: crash-safe, resumable CSV output shared by the fetchers
+# (globiapi.py / globi_async.py, alaimage.py, alalocation.py).
+# - Rows of one species are buffered and written with ONE write + fsync
+# - Only then is the species recorded in the done-log "<output>.done"
+#   (one JSON line per species: [key, byte offset of the output after it])
+# - On open the output is truncated back to the last recorded offset, so rows
+#   of a species that was interrupted mid-write never survive a crash
+# - Resume reads the small done-log instead of re-scanning the whole output;
+#   an output without a done-log (older runs) is scanned once to build it
+# - PageSpool keeps the pages of keys still being fetched (alalocation.py), so
+#   an interrupted species resumes at its next page instead of starting over
+
+import csv
+import hashlib
+import io
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+class CheckpointWriter:
+    def __init__(self, path: str, header: Sequence[str], key_col: int = 0):
+        self.path = path
+        self.done_path = f"{path}.done"
+        self.header = list(header)
+        self.key_col = key_col  # output column holding the key (legacy scan only)
+        self.done: Set[str] = set()
+        self._buf: List[Sequence] = []
+        self._open()
+
+    # ---------- Open / recover ----------
+    def _open(self) -> None:
+        if not os.path.exists(self.path):
+            self._write_fresh()
+        elif not os.path.exists(self.done_path):
+            self._build_done_log()
+        offset = self._load_done_log()
+
+        size = os.path.getsize(self.path)
+        if size > offset:
+            print(f"[checkpoint] {self.path}: dropping {size - offset} bytes of an unfinished species")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self._out = open(self.path, "ab")
+        self._log = open(self.done_path, "a", encoding="utf-8")
+
+    def _write_fresh(self) -> None:
+        with open(self.path, "wb") as f:
+            f.write(self._encode([self.header]))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.done_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps([None, os.path.getsize(self.path)]) + "\n")
+
+    def _build_done_log(self) -> None:
+        """One-time scan of an output written before the done-log existed."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a torn last line is dropped
+        keys = set()
+        reader = csv.reader(io.StringIO(data[:end].decode("utf-8", errors="ignore"), newline=""))
+        next(reader, None)
+        for row in reader:
+            if len(row) > self.key_col and row[self.key_col].strip():
+                keys.add(row[self.key_col].strip())
+        tmp = f"{self.done_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps([None, end]) + "\n")
+            for k in sorted(keys):
+                f.write(json.dumps([k, end]) + "\n")
+        os.replace(tmp, self.done_path)
+        print(f"[checkpoint] built {self.done_path} from {len(keys)} species already in {self.path}")
+
+    def _load_done_log(self) -> int:
+        """Read the done-log; returns the last committed output offset."""
+        offset, valid, torn = 0, [], False
+        with open(self.done_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    key, off = json.loads(line)
+                except ValueError:
+                    torn = True  # crash while appending: the species was not committed
+                    break
+                valid.append(line)
+                offset = off
+                if key is not None:
+                    self.done.add(key)
+        if torn:
+            tmp = f"{self.done_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(valid)
+            os.replace(tmp, self.done_path)
+        return offset
+
+    # ---------- Write ----------
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, rows: Iterable[Sequence]) -> None:
+        """Buffer rows of the species being fetched."""
+        self._buf.extend(rows)
+
+    def discard(self) -> None:
+        """Drop the buffered rows (species failed; it will be fetched again)."""
+        self._buf = []
+
+    def commit(self, key: str, rows: Optional[Iterable[Sequence]] = None) -> int:
+        """Write the buffered (+ given) rows in one write, fsync, then mark `key` done."""
+        if rows is not None:
+            self.add(rows)
+        n = len(self._buf)
+        if n:
+            self._out.write(self._encode(self._buf))
+            self._out.flush()
+            os.fsync(self._out.fileno())
+        self._buf = []
+        self._log.write(json.dumps([key, self._out.tell()]) + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self.done.add(key)
+        return n
+
+    def close(self) -> None:
+        self._out.close()
+        self._log.close()
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _encode(rows: Iterable[Sequence]) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+
+class PageSpool:
+    """
+    Pages of keys that are still being fetched, one pair of files per key in
+    `directory`: <id>.rows (CSV rows appended page by page) and <id>.json (the
+    caller's cursor plus the size of .rows it covers). A page is appended and
+    fsynced BEFORE the cursor is replaced (temp file + rename), so after a crash
+    .rows is cut back to what the cursor covers and the page is fetched again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20])
+        return f"{base}.rows", f"{base}.json"
+
+    def load(self, key: str) -> Optional[Dict]:
+        """Cursor saved with the last complete page of `key`, or None (start over)."""
+        rows_path, cur_path = self._paths(key)
+        if not os.path.exists(cur_path):
+            if os.path.exists(rows_path):
+                os.remove(rows_path)  # first page never completed
+            return None
+        with open(cur_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        size = os.path.getsize(rows_path) if os.path.exists(rows_path) else -1
+        if size < saved["rows_bytes"]:
+            print(f"[spool] {key}: saved pages missing, starting over")
+            self.remove(key)
+            return None
+        with open(rows_path, "r+b") as f:
+            f.truncate(saved["rows_bytes"])  # page appended after the last cursor
+        return saved["cursor"]
+
+    def append(self, key: str, rows: Sequence[Sequence], cursor: Dict) -> None:
+        """Persist one page: rows first, then the cursor that covers them."""
+        rows_path, cur_path = self._paths(key)
+        with open(rows_path, "ab") as f:
+            f.write(CheckpointWriter._encode(rows))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        tmp = f"{cur_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "rows_bytes": size, "cursor": cursor}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, cur_path)
+
+    def rows(self, key: str) -> List[List[str]]:
+        rows_path, _ = self._paths(key)
+        if not os.path.exists(rows_path):
+            return []
+        with open(rows_path, "r", encoding="utf-8", newline="") as f:
+            return list(csv.reader(f))
+
+    def remove(self, key: str) -> None:
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def keys(self) -> List[str]:
+        """Keys with a saved cursor."""
+        out = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    out.append(json.load(f)["key"])
+        return out
@@ -0,0 +1,299 @@
+# globi_async.py
+# Purpose: concurrent version of globiapi.py's fetch loop (same input, output
+# and checkpoint file; run it instead of globiapi.py).
+# - asyncio + httpx: several species in flight, and for each species all
+#   interaction types are fetched concurrently (pages of one type stay in order)
+# - One token bucket shared by every request (GLOBI_RATE req/s, GLOBI_BURST);
+#   a 429 pauses the whole bucket for Retry-After instead of hammering on
+# - At most GLOBI_HOST_CONCURRENCY requests open per host
+# - Same on-disk response cache as globiapi.py (http_cache.py); cache hits
+#   skip the bucket entirely
+# - Same adaptive A1/A2/A3/B1 selection as globiapi.py (g.VARIANTS)
+# - Same metrics as globiapi.py (fetch_metrics.py), bucket waits included
+# - Rows are built by globiapi's own parse/collect helpers, type by type in
+#   INTERACTION_TYPES order, so each species yields exactly the rows
+#   fetch_interactions_for_one() would; species are committed in input order
+#   through the same CheckpointWriter as globiapi.py, with at most
+#   2 * GLOBI_SPECIES_CONCURRENCY species started ahead of the oldest uncommitted one
+
+import asyncio
+import os
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+import pandas as pd
+
+import fetch_metrics as metrics
+import globiapi as g
+import http_cache
+import taxon_names
+from fetch_output import CheckpointWriter
+
+# ===== Configuration =====
+GLOBI_RATE = float(os.getenv("GLOBI_RATE", "10"))          # requests / second, all hosts
+GLOBI_BURST = int(os.getenv("GLOBI_BURST", "10"))
+GLOBI_HOST_CONCURRENCY = int(os.getenv("GLOBI_HOST_CONCURRENCY", "8"))
+GLOBI_SPECIES_CONCURRENCY = int(os.getenv("GLOBI_SPECIES_CONCURRENCY", "4"))
+MAX_429_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1.0
+
+
+# ===== Rate limiting =====
+def retry_after_seconds(value: Optional[str]) -> float:
+    """Retry-After as seconds (delta-seconds or HTTP-date); default if absent/invalid."""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class TokenBucket:
+    """Shared request budget: `rate` tokens/second, up to `burst` saved up."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        while True:
+            # the lock only covers the bookkeeping: waiting happens outside it,
+            # so one sleeper never holds up the others (or a pause() taking effect)
+            async with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    reason, wait = "429_pause", self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    reason, wait = "rate_limit", (1 - self._tokens) / self.rate
+            metrics.slept(reason, wait)
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (server asked us to back off)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+# ===== HTTP =====
+class GlobiClient:
+    def __init__(self, client: httpx.AsyncClient, bucket: TokenBucket):
+        self.client = client
+        self.bucket = bucket
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {"requests": 0, "429": 0, "cache_hits": 0}
+
+    def _cached_response(self, url: str, params: dict, cached) -> httpx.Response:
+        self.stats["cache_hits"] += 1
+        metrics.count("cache_hit")
+        status, headers, body, _ = cached
+        return httpx.Response(status, headers=headers, content=body,
+                              request=httpx.Request("GET", url, params=params))
+
+    async def get(self, url: str, params: dict) -> httpx.Response:
+        """GET through the HTTP cache, the bucket and the per-host limit; waits out 429s."""
+        mode = http_cache.HTTP_CACHE_MODE
+        cached = http_cache.lookup(url, params) if mode != "off" else None
+        if mode == "replay":
+            if cached is None:
+                raise http_cache.CacheMiss(f"not in cache: {http_cache.cache_key(url, params)}")
+            return self._cached_response(url, params, cached)
+        if cached is not None and cached[3]:
+            return self._cached_response(url, params, cached)
+        headers = http_cache.conditional_headers(cached[1]) if cached is not None else {}
+
+        host = httpx.URL(url).host
+        sem = self._host_sems.setdefault(host, asyncio.Semaphore(GLOBI_HOST_CONCURRENCY))
+        for _ in range(MAX_429_RETRIES + 1):
+            await self.bucket.acquire()
+            t0 = time.perf_counter()
+            async with sem:
+                try:
+                    r = await self.client.get(url, params=params, headers=headers, timeout=g.HTTP_TIMEOUT)
+                except httpx.HTTPError:
+                    metrics.observe(g.endpoint_of(url), time.perf_counter() - t0, "error")
+                    raise
+            metrics.observe(g.endpoint_of(url), time.perf_counter() - t0, r.status_code)
+            self.stats["requests"] += 1
+            if r.status_code != 429:
+                break
+            self.stats["429"] += 1
+            metrics.count("retry")
+            self.bucket.pause(retry_after_seconds(r.headers.get("Retry-After")))
+        if r.status_code == 304 and cached is not None:
+            http_cache.touch(url, params)
+            return self._cached_response(url, params, cached)
+        r.raise_for_status()
+        if r.status_code == 200 and mode == "on":
+            http_cache.store(url, params, r.status_code, r.headers, r.content)
+        return r
+
+    async def resolve_name(self, name: str) -> str:
+        cached = taxon_names.lookup("globi", name)
+        if cached is not None:
+            return cached
+        try:
+            r = await self.get(f"{g.API_BASE}/find", {"name": name})
+            resolved = g.preferred_name(r.json(), name)
+        except Exception:
+            return name
+        taxon_names.remember("globi", name, resolved)
+        return resolved
+
+    async def attempt(self, tag: str, params: dict) -> Optional[pd.DataFrame]:
+        if tag == "A3":
+            r = await self.get(f"{g.API_BASE}/interaction", {**params, "type": "json.v2"})
+            return g.parse_json_interaction(r.json())
+        r = await self.get(f"{g.API_BASE}/interaction", params)
+        return g.parse_csv_text(r.text)
+
+    async def run_variant(self, tag: str, request) -> Tuple[Optional[pd.DataFrame], bool]:
+        """Async g.run_variant(): `request` is a coroutine function."""
+        df = None
+        for _ in range(g.RETRY_EACH_STEP + 1):
+            t0 = time.perf_counter()
+            try:
+                df = await request()
+            except Exception:
+                g.VARIANTS.record(tag, "fail", time.perf_counter() - t0)
+                metrics.count("retry")
+                metrics.slept("retry", 0.2)
+                await asyncio.sleep(0.2)
+                continue
+            got = df is not None and not df.empty
+            g.VARIANTS.record(tag, "ok" if got else "empty", time.perf_counter() - t0)
+            return df, got or g.VARIANTS.proven(tag)
+        return df, False
+
+    async def fetch_page(self, plant: str, itype: str, offset: int) -> Optional[pd.DataFrame]:
+        """One /interaction page via A1/A2/A3 in g.VARIANTS order, as globiapi.fetch_page()."""
+        df = None
+        for i, (tag, params) in enumerate(g.VARIANTS.order(g.page_attempts(plant, itype, offset))):
+            if i:
+                metrics.count(f"fallback:{tag}")
+            df, final = await self.run_variant(tag, lambda t=tag, p=params: self.attempt(t, p))
+            if final:
+                break
+        return df
+
+    async def fetch_type(self, plant: str, itype: str) -> Tuple[List[pd.DataFrame], Optional[pd.DataFrame]]:
+        """All /interaction pages of one type, plus its B1 /taxon list (None if not needed/empty)."""
+        pages, offset = [], 0
+        while True:
+            df = await self.fetch_page(plant, itype, offset)
+            if df is None or df.empty:
+                break
+            pages.append(df)
+            if len(df) < g.PAGE_LIMIT:
+                break
+            offset += g.PAGE_LIMIT
+
+        if (pages and not g.ALWAYS_TAXON_FALLBACK) or not g.VARIANTS.usable("B1"):
+            return pages, None
+
+        url = g.taxon_url(plant, itype)
+
+        async def taxon_list():
+            r = await self.get(url, {"type": "csv"})
+            return g.parse_csv_text(r.text)
+
+        metrics.count("fallback:B1")
+        df2, _ = await self.run_variant("B1", taxon_list)
+        return pages, (df2 if df2 is not None and not df2.empty else None)
+
+    async def fetch_interactions_for_one(self, plant_raw: str) -> List[List[str]]:
+        """Same rows, in the same order, as globiapi.fetch_interactions_for_one()."""
+        plant = await self.resolve_name(plant_raw)
+        per_type = await asyncio.gather(*(self.fetch_type(plant, t) for t in g.INTERACTION_TYPES))
+
+        rows_out: List[List[str]] = []
+        seen_pairs: Set[Tuple[str, str]] = set()
+        for itype, (pages, df2) in zip(g.INTERACTION_TYPES, per_type):
+            for df in pages:
+                g.collect_page_rows(df, plant, itype, seen_pairs, rows_out)
+            if df2 is not None:
+                g.collect_taxon_rows(df2, plant, itype, seen_pairs, rows_out)
+        return rows_out
+
+
+# ===== Main =====
+async def run(names: List[str], out: CheckpointWriter) -> None:
+    todo = [n for n in names if n not in out]
+    metrics.start("globi_async", len(todo))
+    print(f"To fetch: {len(todo)} (species concurrency={GLOBI_SPECIES_CONCURRENCY}, "
+          f"rate={GLOBI_RATE}/s, per-host={GLOBI_HOST_CONCURRENCY})")
+
+    limits = httpx.Limits(max_connections=GLOBI_HOST_CONCURRENCY * 2)
+    async with httpx.AsyncClient(headers=dict(g.SESSION.headers), limits=limits) as client:
+        api = GlobiClient(client, TokenBucket(GLOBI_RATE, GLOBI_BURST))
+        species_sem = asyncio.Semaphore(GLOBI_SPECIES_CONCURRENCY)
+
+        async def one(plant: str) -> Optional[List[List[str]]]:
+            async with species_sem:
+                try:
+                    return await api.fetch_interactions_for_one(plant)
+                except Exception as e:
+                    print(f"[WARN] {plant} exception: {e}")
+                    metrics.species_failed(plant, e)
+                    return None
+
+        def commit(i: int, plant: str, rows: Optional[List[List[str]]]) -> None:
+            if rows is None:
+                return  # failed: not committed, retried on the next run
+            out.commit(plant, rows)
+            metrics.species_done(plant, len(rows))
+            print(f"({i}/{len(todo)}) {plant}: {len(rows)} rows")
+
+        t0 = time.perf_counter()
+        # committed in input order, so the file matches a sequential run; at most
+        # `window` species are started ahead of the oldest uncommitted one (as in
+        # ala_client.map_ordered), so finished rows never pile up behind a slow species
+        window = 2 * GLOBI_SPECIES_CONCURRENCY
+        pending: deque = deque()
+        for i, plant in enumerate(todo, 1):
+            pending.append((i, plant, asyncio.create_task(one(plant))))
+            if len(pending) >= window:
+                j, p, task = pending.popleft()
+                commit(j, p, await task)
+        while pending:
+            j, p, task = pending.popleft()
+            commit(j, p, await task)
+
+        secs = time.perf_counter() - t0
+        print(f"[stats] {len(todo)} species in {secs:.1f}s | requests={api.stats['requests']} "
+              f"| 429s={api.stats['429']} | cache hits={api.stats['cache_hits']}")
+        g.VARIANTS.report(len(todo))
+        metrics.summary()
+
+
+def main():
+    print(f"Working directory: {Path('.').resolve()}")
+
+    names = g.read_names(g.INPUT_CSV)
+    print(f"Total scientific names detected: {len(names)}")
+
+    with CheckpointWriter(g.OUTPUT_CSV, g.OUTPUT_HEADER) as out:
+        print(f"Already completed (checkpoint): {len(out.done)}")
+        asyncio.run(run(names, out))
+    print(f"Done ✅ Saved to: {g.OUTPUT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
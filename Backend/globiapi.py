@@ -13,30 +13,48 @@
 #       animal_taxon_name,
 #       interaction_type_raw   # exactly as returned by GloBI
 #
-# Request order per interaction type (per page):
+# Request variants per interaction type (per page):
 #   A1: /interaction CSV + fields
 #   A2: /interaction CSV (no fields)
 #   A3: /interaction JSON.v2
-#   If none returns rows for the type/page:
+#   If none returns rows for the type:
 #   B1: /taxon/{plant}/{interactionType} CSV (distinct list)
 #
+# Adaptive order: VARIANTS learns during the run which of A1/A2/A3 answers.
+#   Variants that have returned rows are tried first; one whose recent
+#   attempts mostly fail is skipped (probed again every VARIANT_PROBE_EVERY
+#   skips); an empty answer from a variant that has returned rows before is
+#   trusted instead of asking the next one. Stats are printed at the end.
+#
 # Pagination: limit/offset (PAGE_LIMIT).
-# Retries:    each attempt retried up to RETRY_EACH_STEP times.
-# Streaming:  append rows as soon as they are produced.
+# Retries:    a failing request is retried up to RETRY_EACH_STEP times;
+#             a valid empty answer is not retried.
+# Streaming:  each species is written in one write + fsync and then recorded in
+#             plant_animal_interactions.csv.done (resume point, see fetch_output.py).
+# Metrics:    latency per endpoint, retries, fallbacks, sleeps, rows/s and ETA
+#             go to fetch_metrics.py (JSON lines + summary table at exit).
+# Names:      /find resolutions are kept in the synonym cache of taxon_names.py,
+#             one per canonical name, across runs.
 
-import csv
 import io
+import os
 import time
+from collections import deque
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple, Set
 from urllib.parse import quote
 
 import pandas as pd
-import requests
+
+import fetch_metrics as metrics
+import taxon_names
+from fetch_output import CheckpointWriter
+from http_cache import CachedSession
 
 # ===== Configuration =====
 INPUT_CSV = "scientific_names.csv"
 OUTPUT_CSV = "plant_animal_interactions.csv"
+OUTPUT_HEADER = ["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"]
 
 HTTP_TIMEOUT = 60
 PAGE_LIMIT = 1024
@@ -44,7 +62,14 @@ RETRY_EACH_STEP = 2
 SLEEP_BETWEEN_PAGES = 0.15
 SLEEP_BETWEEN_SPECIES = 0.25
 
-API_BASE = "https://api.globalbioticinteractions.org"
+# Adaptive variant selection (see VariantStats)
+VARIANT_WINDOW = int(os.getenv("GLOBI_VARIANT_WINDOW", "20"))           # recent attempts kept per variant
+VARIANT_MIN_ATTEMPTS = int(os.getenv("GLOBI_VARIANT_MIN_ATTEMPTS", "6"))  # before a variant can be skipped
+VARIANT_SKIP_RATE = float(os.getenv("GLOBI_VARIANT_SKIP_RATE", "0.8"))    # recent failure rate that skips it
+VARIANT_PROBE_EVERY = int(os.getenv("GLOBI_VARIANT_PROBE_EVERY", "25"))   # skipped variants are retried this often
+ALWAYS_TAXON_FALLBACK = os.getenv("GLOBI_ALWAYS_B1", "0") == "1"          # old behaviour: B1 for every type
+
+API_BASE = os.getenv("GLOBI_API_BASE", "https://api.globalbioticinteractions.org")  # mock_sources.py for offline runs
 
 # EXACT interaction types to fetch (as-is, no normalization)
 INTERACTION_TYPES: List[str] = [
@@ -76,31 +101,25 @@ ROLE_BY_TYPE: Dict[str, str] = {
     "hasHost":          "targetTaxon",
 }
 
-# Reuse one HTTP session for stability/perf
-SESSION = requests.Session()
+# Reuse one HTTP session for stability/perf; GETs go through the on-disk cache
+# (http_cache.py, HTTP_CACHE_MODE=on|off|replay)
+SESSION = CachedSession()
 SESSION.headers.update({"User-Agent": "ViGrow/1.0 (academic use)"})
 
 
-def resolve_name_with_globi(name: str) -> str:
-    """Resolve to preferredName via /find; fallback to original."""
-    try:
-        r = SESSION.get(f"{API_BASE}/find", params={"name": name}, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
-        data = r.json()
-        item = data[0] if isinstance(data, list) and data else (data if isinstance(data, dict) else None)
-        if item:
-            resolved = (item.get("preferredName") or item.get("name") or name).strip()
-            return resolved or name
-    except Exception:
-        pass
+# ===== Response parsing (shared with globi_async.py) =====
+def preferred_name(data, name: str) -> str:
+    """Pick preferredName from a /find response; fallback to original."""
+    item = data[0] if isinstance(data, list) and data else (data if isinstance(data, dict) else None)
+    if item:
+        resolved = (item.get("preferredName") or item.get("name") or name).strip()
+        return resolved or name
     return name
 
 
-def request_csv(url: str, params: dict) -> Optional[pd.DataFrame]:
-    """GET CSV → DataFrame; return None if empty/invalid."""
-    r = SESSION.get(url, params=params, timeout=HTTP_TIMEOUT)
-    r.raise_for_status()
-    text = r.text.strip()
+def parse_csv_text(text: str) -> Optional[pd.DataFrame]:
+    """CSV body → DataFrame; None if empty/invalid."""
+    text = text.strip()
     if not text:
         return None
     df = pd.read_csv(io.StringIO(text))
@@ -109,13 +128,8 @@ def request_csv(url: str, params: dict) -> Optional[pd.DataFrame]:
     return df
 
 
-def request_json_interaction(params: dict) -> Optional[pd.DataFrame]:
-    """Fallback for /interaction in JSON.v2 format → DataFrame with canonical columns."""
-    p = params.copy()
-    p["type"] = "json.v2"
-    r = SESSION.get(f"{API_BASE}/interaction", params=p, timeout=HTTP_TIMEOUT)
-    r.raise_for_status()
-    data = r.json()
+def parse_json_interaction(data) -> Optional[pd.DataFrame]:
+    """/interaction JSON.v2 body → DataFrame with canonical columns."""
     recs = data.get("data") or data.get("records") or []
     rows = []
     for it in recs:
@@ -131,48 +145,241 @@ def request_json_interaction(params: dict) -> Optional[pd.DataFrame]:
     return pd.DataFrame(rows) if rows else None
 
 
-def ensure_output_with_header(output_csv: str) -> None:
-    """Create output file with header if missing."""
-    p = Path(output_csv)
-    if p.exists():
-        return
-    with open(output_csv, "w", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow([
-            "plant_scientific_name",
-            "animal_taxon_name",
-            "interaction_type_raw"
-        ])
-
-
-def load_already_done(output_csv: str) -> Set[str]:
-    """Checkpoint: set of plant names already present in output CSV."""
-    done = set()
-    p = Path(output_csv)
-    if not p.exists():
-        return done
+def page_attempts(plant: str, itype: str, offset: int) -> List[Tuple[str, dict]]:
+    """Params for the A1/A2/A3 attempts of one /interaction page, in try order."""
+    base = {
+        "interactionType": itype,
+        ROLE_BY_TYPE[itype]: plant,
+        "limit": PAGE_LIMIT,
+        "offset": offset,
+    }
+
+    # A1: CSV + fields
+    p1 = base.copy()
+    p1["type"] = "csv"
+    p1["fields"] = "source_taxon_name,target_taxon_name,interaction_type"
+
+    # A2: CSV (no fields)
+    p2 = base.copy()
+    p2["type"] = "csv"
+
+    # A3: JSON.v2 (request_json_interaction adds the type)
+    p3 = base.copy()
+    return [("A1", p1), ("A2", p2), ("A3", p3)]
+
+
+def taxon_url(plant: str, itype: str) -> str:
+    """B1 fallback: /taxon/{plant}/{interactionType} (distinct list, no pagination)."""
+    return f"{API_BASE}/taxon/{quote(plant)}/{itype}"
+
+
+def collect_page_rows(df: pd.DataFrame, plant: str, itype: str,
+                      seen_pairs: Set[Tuple[str, str]], rows_out: List[List[str]]) -> None:
+    """Append the counterpart taxa of one /interaction page, skipping seen pairs."""
+    pl_l = plant.lower()
+    for _, r in df.iterrows():
+        src = str(r.get("source_taxon_name") or "").strip()
+        tgt = str(r.get("target_taxon_name") or "").strip()
+        it_raw = str(r.get("interaction_type") or itype).strip()
+
+        # decide counterpart taxon from role result
+        animal = None
+        if src.lower() == pl_l:
+            animal = tgt
+        elif tgt.lower() == pl_l:
+            animal = src
+        else:
+            continue
+        if not animal:
+            continue
+
+        key = (animal.lower(), it_raw)
+        if key in seen_pairs:
+            continue
+        seen_pairs.add(key)
+        rows_out.append([plant, animal, it_raw])
+
+
+def collect_taxon_rows(df2: pd.DataFrame, plant: str, itype: str,
+                       seen_pairs: Set[Tuple[str, str]], rows_out: List[List[str]]) -> None:
+    """Append the taxa of a B1 /taxon list, skipping seen pairs."""
+    cols = [c for c in df2.columns if "name" in c.lower() or "taxon" in c.lower()]
+    if not cols:
+        cols = [df2.columns[0]]
+    for col in cols:
+        for s in df2[col].dropna().astype(str):
+            animal = s.strip()
+            if not animal:
+                continue
+            key = (animal.lower(), itype)
+            if key in seen_pairs:
+                continue
+            seen_pairs.add(key)
+            rows_out.append([plant, animal, itype])
+
+
+# ===== Adaptive variant selection (shared with globi_async.py) =====
+class VariantStats:
+    """
+    Per-run outcome and latency stats for the request variants (A1/A2/A3/B1).
+    Outcomes: "ok" (rows), "empty" (valid answer, no rows), "fail" (error).
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.recent: Dict[str, deque] = {}  # True = failed, last VARIANT_WINDOW attempts
+        self.http_calls = 0
+
+    def _get(self, tag: str) -> Dict[str, float]:
+        if tag not in self.stats:
+            self.stats[tag] = {"ok": 0, "empty": 0, "fail": 0, "skipped": 0, "secs": 0.0}
+            self.recent[tag] = deque(maxlen=VARIANT_WINDOW)
+        return self.stats[tag]
+
+    def record(self, tag: str, outcome: str, secs: float) -> None:
+        st = self._get(tag)
+        st[outcome] += 1
+        st["secs"] += secs
+        self.recent[tag].append(outcome == "fail")
+        self.http_calls += 1
+
+    def proven(self, tag: str) -> bool:
+        """Has returned rows this run: its empty answers are trusted."""
+        return self._get(tag)["ok"] > 0
+
+    def usable(self, tag: str) -> bool:
+        """False while the recent failure rate is too high (except on probe turns)."""
+        st = self._get(tag)
+        recent = self.recent[tag]
+        if len(recent) < VARIANT_MIN_ATTEMPTS or sum(recent) / len(recent) < VARIANT_SKIP_RATE:
+            return True
+        st["skipped"] += 1
+        return st["skipped"] % VARIANT_PROBE_EVERY == 0
+
+    def order(self, attempts: List[Tuple[str, dict]]) -> List[Tuple[str, dict]]:
+        """Variants by rows returned so far (most first, ties keep the given order), unusable ones dropped."""
+        ranked = sorted(attempts, key=lambda a: -self._get(a[0])["ok"])
+        return [a for a in ranked if self.usable(a[0])]
+
+    def report(self, species: int = 0) -> None:
+        for tag in sorted(self.stats):
+            st = self.stats[tag]
+            calls = st["ok"] + st["empty"] + st["fail"]
+            avg_ms = st["secs"] / calls * 1000 if calls else 0.0
+            print(f"[variants] {tag}: calls={calls} ok={st['ok']} empty={st['empty']} "
+                  f"fail={st['fail']} skipped={st['skipped']} avg={avg_ms:.0f}ms")
+        if species:
+            print(f"[variants] {self.http_calls} HTTP calls for {species} species "
+                  f"({self.http_calls / species:.1f}/species)")
+
+
+VARIANTS = VariantStats()
+
+
+# ===== HTTP =====
+def endpoint_of(url: str) -> str:
+    """Metrics label of a GloBI URL: globi/find, globi/interaction, globi/taxon."""
+    return "globi/" + url[len(API_BASE):].strip("/").split("/")[0]
+
+
+def http_get(url: str, params: dict):
+    """SESSION.get + raise_for_status, timed per endpoint in fetch_metrics."""
+    t0 = time.perf_counter()
+    try:
+        r = SESSION.get(url, params=params, timeout=HTTP_TIMEOUT)
+    except Exception:
+        metrics.observe(endpoint_of(url), time.perf_counter() - t0, "error")
+        raise
+    if getattr(r, "from_cache", False):
+        metrics.count("cache_hit")
+    else:
+        metrics.observe(endpoint_of(url), time.perf_counter() - t0, r.status_code)
+    r.raise_for_status()
+    return r
+
+
+def resolve_name_with_globi(name: str) -> str:
+    """Resolve to preferredName via /find (synonym cache first); fallback to original."""
+    def fetch(n: str) -> str:
+        return preferred_name(http_get(f"{API_BASE}/find", {"name": n}).json(), n)
     try:
-        df = pd.read_csv(p, encoding="utf-8", usecols=["plant_scientific_name"])
-        done.update(df["plant_scientific_name"].dropna().astype(str).unique().tolist())
+        return taxon_names.resolve("globi", name, fetch) or name
     except Exception:
         pass
-    return done
+    return name
 
 
-def append_row(output_csv: str, row: List[str]) -> None:
-    """Stream-append a single row."""
-    with open(output_csv, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+def request_csv(url: str, params: dict) -> Optional[pd.DataFrame]:
+    """GET CSV → DataFrame; return None if empty/invalid."""
+    r = http_get(url, params)
+    return parse_csv_text(r.text)
+
+
+def request_json_interaction(params: dict) -> Optional[pd.DataFrame]:
+    """Fallback for /interaction in JSON.v2 format → DataFrame with canonical columns."""
+    p = params.copy()
+    p["type"] = "json.v2"
+    r = http_get(f"{API_BASE}/interaction", p)
+    return parse_json_interaction(r.json())
+
+
+def read_names(input_csv: str) -> List[str]:
+    """Order-preserving unique, non-empty scientific names from the input CSV."""
+    df = pd.read_csv(input_csv, encoding="utf-8", keep_default_na=False)
+    if "scientific_name" not in df.columns:
+        raise ValueError("INPUT_CSV must contain column: scientific_name")
+    names_all = [str(x).strip() for x in df["scientific_name"].tolist() if str(x).strip()]
+
+    seen, names = set(), []
+    for n in names_all:
+        if n not in seen:
+            names.append(n); seen.add(n)
+    return names
+
+
+def run_variant(tag: str, request) -> Tuple[Optional[pd.DataFrame], bool]:
+    """
+    Call `request()` (one variant) with retries on errors, recording each try in
+    VARIANTS. Returns (df, final): final means no other variant should be asked.
+    """
+    df = None
+    for _ in range(RETRY_EACH_STEP + 1):
+        t0 = time.perf_counter()
+        try:
+            df = request()
+        except Exception:
+            VARIANTS.record(tag, "fail", time.perf_counter() - t0)
+            metrics.count("retry")
+            metrics.sleep(0.2, "retry")
+            continue
+        got = df is not None and not df.empty
+        VARIANTS.record(tag, "ok" if got else "empty", time.perf_counter() - t0)
+        return df, got or VARIANTS.proven(tag)
+    return df, False
+
+
+def fetch_page(plant: str, itype: str, offset: int) -> Optional[pd.DataFrame]:
+    """One /interaction page via A1/A2/A3 in VARIANTS order; None/empty if no rows."""
+    df = None
+    for i, (tag, params) in enumerate(VARIANTS.order(page_attempts(plant, itype, offset))):
+        if i:
+            metrics.count(f"fallback:{tag}")
+        if tag == "A3":
+            df, final = run_variant(tag, lambda p=params: request_json_interaction(p))
+        else:
+            df, final = run_variant(tag, lambda p=params: request_csv(f"{API_BASE}/interaction", p))
+        if final:
+            break
+    return df
 
 
 def fetch_interactions_for_one(plant_raw: str) -> List[List[str]]:
     """
     For a single plant:
       - Resolve name
-      - For each EXACT interaction type, use its ONE role and try:
-          A1: /interaction CSV + fields
-          A2: /interaction CSV (no fields)
-          A3: /interaction JSON.v2
-        If none returns rows for the type:
+      - For each EXACT interaction type, use its ONE role and page through
+        /interaction with A1/A2/A3 (adaptive order, see VariantStats)
+        If no page returns rows for the type:
           B1: /taxon/{plant}/{interactionType} CSV (distinct list)
       - De-duplicate within the plant on (animal.lower, interaction_type_raw)
       - Return rows ready to be written
@@ -182,115 +389,34 @@ def fetch_interactions_for_one(plant_raw: str) -> List[List[str]]:
     seen_pairs: Set[Tuple[str, str]] = set()  # (animal_lower, interaction_type_raw)
 
     for itype in INTERACTION_TYPES:
-        role = ROLE_BY_TYPE[itype]
-
         # ----- /interaction with pagination -----
         offset = 0
+        pages = 0
         while True:
-            df = None
-            attempts = []
-
-            base = {
-                "interactionType": itype,
-                role: plant,
-                "limit": PAGE_LIMIT,
-                "offset": offset,
-            }
-
-            # A1: CSV + fields
-            p1 = base.copy()
-            p1["type"] = "csv"
-            p1["fields"] = "source_taxon_name,target_taxon_name,interaction_type"
-            attempts.append(("A1", f"{API_BASE}/interaction", p1, request_csv))
-
-            # A2: CSV (no fields)
-            p2 = base.copy()
-            p2["type"] = "csv"
-            attempts.append(("A2", f"{API_BASE}/interaction", p2, request_csv))
-
-            # A3: JSON.v2
-            p3 = base.copy()
-            attempts.append(("A3", None, p3, request_json_interaction))
-
-            # run attempts
-            for tag, url, params, func in attempts:
-                ok = False
-                for _ in range(RETRY_EACH_STEP + 1):
-                    try:
-                        df = func(url, params) if url else func(params)
-                        if df is not None and not df.empty:
-                            ok = True
-                            break
-                    except requests.HTTPError:
-                        time.sleep(0.2)
-                    except Exception:
-                        time.sleep(0.2)
-                # if one attempt worked, stop trying others
-                if ok:
-                    break
-
+            df = fetch_page(plant, itype, offset)
             if df is None or df.empty:
-                # no data for this page → stop pagination for this type and go fallback
+                # no data for this page → stop pagination for this type
                 break
 
             # collect rows
-            pl_l = plant.lower()
-            for _, r in df.iterrows():
-                src = str(r.get("source_taxon_name") or "").strip()
-                tgt = str(r.get("target_taxon_name") or "").strip()
-                it_raw = str(r.get("interaction_type") or itype).strip()
-
-                # decide counterpart taxon from role result
-                animal = None
-                if src.lower() == pl_l:
-                    animal = tgt
-                elif tgt.lower() == pl_l:
-                    animal = src
-                else:
-                    continue
-                if not animal:
-                    continue
-
-                key = (animal.lower(), it_raw)
-                if key in seen_pairs:
-                    continue
-                seen_pairs.add(key)
-                rows_out.append([plant, animal, it_raw])
+            collect_page_rows(df, plant, itype, seen_pairs, rows_out)
+            pages += 1
 
             if len(df) < PAGE_LIMIT:
                 break
             offset += PAGE_LIMIT
-            time.sleep(SLEEP_BETWEEN_PAGES)
+            metrics.sleep(SLEEP_BETWEEN_PAGES, "between_pages")
 
         # ----- Fallback: /taxon/{plant}/{interactionType} CSV (distinct list, no pagination) -----
-        url = f"{API_BASE}/taxon/{quote(plant)}/{itype}"
-        df2 = None
-        got = False
-        for _ in range(RETRY_EACH_STEP + 1):
-            try:
-                df2 = request_csv(url, {"type": "csv"})
-                if df2 is not None and not df2.empty:
-                    got = True
-                    break
-            except requests.HTTPError:
-                time.sleep(0.2)
-            except Exception:
-                time.sleep(0.2)
-
-        if got:
-            cols = [c for c in df2.columns if "name" in c.lower() or "taxon" in c.lower()]
-            if not cols:
-                cols = [df2.columns[0]]
-            for col in cols:
-                for s in df2[col].dropna().astype(str):
-                    animal = s.strip()
-                    if not animal:
-                        continue
-                    key = (animal.lower(), itype)
-                    if key in seen_pairs:
-                        continue
-                    seen_pairs.add(key)
-                    rows_out.append([plant, animal, itype])
+        if pages and not ALWAYS_TAXON_FALLBACK:
+            continue
+        if not VARIANTS.usable("B1"):
+            continue
+        url = taxon_url(plant, itype)
+        metrics.count("fallback:B1")
+        df2, _ = run_variant("B1", lambda: request_csv(url, {"type": "csv"}))
+        if df2 is not None and not df2.empty:
+            collect_taxon_rows(df2, plant, itype, seen_pairs, rows_out)
 
     return rows_out
 
@@ -300,43 +426,38 @@ def main():
     print(f"Working directory: {cwd}")
 
     # 1) Load scientific names
-    df = pd.read_csv(INPUT_CSV, encoding="utf-8", keep_default_na=False)
-    if "scientific_name" not in df.columns:
-        raise ValueError("INPUT_CSV must contain column: scientific_name")
-    names_all = [str(x).strip() for x in df["scientific_name"].tolist() if str(x).strip()]
-
-    # Order-preserving unique
-    seen, names = set(), []
-    for n in names_all:
-        if n not in seen:
-            names.append(n); seen.add(n)
-
+    names = read_names(INPUT_CSV)
     print(f"Total scientific names detected: {len(names)}")
 
-    # 2) Prepare output header & checkpoint
-    ensure_output_with_header(OUTPUT_CSV)
-    done = load_already_done(OUTPUT_CSV)
-    print(f"Already completed (checkpoint): {len(done)}")
+    # 2) Open output + checkpoint
+    out = CheckpointWriter(OUTPUT_CSV, OUTPUT_HEADER)
+    print(f"Already completed (checkpoint): {len(out.done)}")
 
-    # 3) Iterate, fetch, and stream-append
+    # 3) Iterate, fetch, and commit one species at a time
     total = len(names)
-    for i, plant in enumerate(names, 1):
-        if plant in done:
-            print(f"({i}/{total}) Skip (done): {plant}")
-            continue
-
-        print(f"({i}/{total}) Fetching: {plant}")
-        try:
-            rows = fetch_interactions_for_one(plant)
-        except Exception as e:
-            print(f"[WARN] {plant} exception: {e}")
-            rows = []
-
-        for r in rows:
-            append_row(OUTPUT_CSV, r)
-
-        time.sleep(SLEEP_BETWEEN_SPECIES)
-
+    fetched = 0
+    metrics.start("globiapi", sum(1 for n in names if n not in out))
+    with out:
+        for i, plant in enumerate(names, 1):
+            if plant in out:
+                print(f"({i}/{total}) Skip (done): {plant}")
+                continue
+
+            print(f"({i}/{total}) Fetching: {plant}")
+            try:
+                rows = fetch_interactions_for_one(plant)
+            except Exception as e:
+                print(f"[WARN] {plant} exception: {e}")
+                metrics.species_failed(plant, e)
+                continue  # not committed: retried on the next run
+
+            out.commit(plant, rows)
+            metrics.species_done(plant, len(rows))
+            fetched += 1
+            metrics.sleep(SLEEP_BETWEEN_SPECIES, "between_species")
+
+    VARIANTS.report(fetched)
+    metrics.summary()
     print(f"Done ✅ Saved to: {OUTPUT_CSV}")
 
 
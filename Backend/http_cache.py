@@ -0,0 +1,177 @@
+# http_cache.py
+# Purpose: persistent HTTP response cache shared by the fetchers
+# (globiapi.py / globi_async.py, alaimage.py, alalocation.py).
+# - SQLite file (HTTP_CACHE_PATH), one row per GET keyed on the normalized
+#   URL + query params (host lowercased, params merged and sorted)
+# - Per-source TTL (SOURCE_TTL_DAYS by host); an expired entry is revalidated
+#   with If-None-Match / If-Modified-Since and kept on 304
+# - HTTP_CACHE_MODE:
+#     on     - serve fresh entries, fetch + store the rest (default)
+#     off    - plain requests, cache untouched
+#     replay - never touch the network; a miss raises CacheMiss
+#              (a requests.ConnectionError, so existing error handling applies)
+# - CachedSession is a drop-in requests.Session; lookup()/store() are the same
+#   cache for clients that do their own I/O (globi_async.py)
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# ---------- Configuration ----------
+HTTP_CACHE_MODE = os.getenv("HTTP_CACHE_MODE", "on").lower()
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "http_cache.sqlite")
+DEFAULT_TTL_DAYS = float(os.getenv("HTTP_CACHE_TTL_DAYS", "7"))
+
+# How long an answer from each source is trusted before it is revalidated
+SOURCE_TTL_DAYS: Dict[str, float] = {
+    "api.globalbioticinteractions.org": 30,
+    "biocache-ws.ala.org.au": 7,      # occurrence records keep arriving
+    "api.ala.org.au": 30,
+    "en.wikipedia.org": 30,
+}
+
+if HTTP_CACHE_MODE not in ("on", "off", "replay"):
+    raise SystemExit(f"HTTP_CACHE_MODE must be on, off or replay, got {HTTP_CACHE_MODE!r}")
+
+# not replayed: the stored body is already decoded and re-framed
+_DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    status     INTEGER NOT NULL,
+    headers    TEXT NOT NULL,
+    body       BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class CacheMiss(requests.ConnectionError):
+    """Raised in replay mode when a request is not in the cache."""
+
+
+# ---------- Keys ----------
+def cache_key(url: str, params: Optional[Mapping] = None) -> str:
+    """'GET <url>' with lowercased scheme/host and all query params sorted."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for k, v in (params or {}).items():
+        if v is None:
+            continue
+        for item in (v if isinstance(v, (list, tuple)) else [v]):
+            query.append((str(k), str(item)))
+    norm = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/",
+                       urlencode(sorted(query)), ""))
+    return f"GET {norm}"
+
+
+def ttl_seconds(url: str) -> float:
+    host = urlsplit(url).hostname or ""
+    return SOURCE_TTL_DAYS.get(host, DEFAULT_TTL_DAYS) * 86400
+
+
+# ---------- Storage ----------
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(HTTP_CACHE_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")   # several fetchers may share the file
+        _conn.execute(SCHEMA_SQL)
+        _conn.commit()
+    return _conn
+
+
+def lookup(url: str, params: Optional[Mapping] = None) -> Optional[Tuple[int, Dict[str, str], bytes, bool]]:
+    """Cached (status, headers, body, is_fresh) for a GET, or None."""
+    key = cache_key(url, params)
+    with _lock:
+        row = _db().execute(
+            "SELECT status, headers, body, fetched_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return None
+    status, headers, body, fetched_at = row
+    return status, json.loads(headers), body, time.time() - fetched_at < ttl_seconds(url)
+
+
+def store(url: str, params: Optional[Mapping], status: int, headers: Mapping[str, str], body: bytes) -> None:
+    kept = {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}
+    with _lock:
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, status, headers, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (cache_key(url, params), status, json.dumps(kept), body, time.time()),
+        )
+        conn.commit()
+
+
+def touch(url: str, params: Optional[Mapping] = None) -> None:
+    """Mark an entry fresh again after a 304."""
+    with _lock:
+        conn = _db()
+        conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), cache_key(url, params)))
+        conn.commit()
+
+
+def conditional_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """Revalidation headers for a stored response."""
+    h = CaseInsensitiveDict(headers)
+    out = {}
+    if h.get("ETag"):
+        out["If-None-Match"] = h["ETag"]
+    if h.get("Last-Modified"):
+        out["If-Modified-Since"] = h["Last-Modified"]
+    return out
+
+
+# ---------- requests integration ----------
+def build_response(url: str, status: int, headers: Mapping[str, str], body: bytes) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r.headers = CaseInsensitiveDict(headers)
+    r._content = body
+    r.url = url
+    r.reason = "OK" if status < 400 else ""
+    r.encoding = get_encoding_from_headers(r.headers)
+    r.from_cache = True
+    return r
+
+
+class CachedSession(requests.Session):
+    """requests.Session whose GETs go through the on-disk cache (per HTTP_CACHE_MODE)."""
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != "GET" or HTTP_CACHE_MODE == "off":
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+
+        cached = lookup(url, params)
+        if HTTP_CACHE_MODE == "replay":
+            if cached is None:
+                raise CacheMiss(f"not in cache: {cache_key(url, params)}")
+            return build_response(url, *cached[:3])
+        if cached is not None and cached[3]:
+            return build_response(url, *cached[:3])
+
+        req_headers = dict(headers or {})
+        if cached is not None:
+            req_headers.update(conditional_headers(cached[1]))
+        r = super().request(method, url, params=params, headers=req_headers, **kwargs)
+        if r.status_code == 304 and cached is not None:
+            touch(url, params)
+            return build_response(url, *cached[:3])
+        if r.status_code == 200:
+            store(url, params, r.status_code, r.headers, r.content)
+        return r
@@ -0,0 +1,308 @@
+# image_thumbs.py
+# Purpose: local thumbnails for the species / variety images, so the PlantCard
+# and PlantSpeciesCard grids stop loading hundreds of full-size remote images.
+# - Every distinct species_information_dataset.image_url and
+#   variety_details.image_url is downloaded ONCE (pluggable fetcher:
+#   IMAGE_SOURCE=http, or a local directory holding the files by name, e.g.
+#   for tests) and recorded in the image_cache table (url -> content hash)
+# - Thumbnails at THUMB_WIDTHS (never upscaled) are rendered in a process pool
+#   as WebP (or JPEG) and stored content-addressed:
+#     THUMB_DIR/<hash[:2]>/<hash>/<width>.webp
+#   so the same picture behind several URLs is stored and rendered once
+# - The backends serve them at /images/{hash}/{width} (router below) with
+#   immutable cache headers, and the list APIs return a thumbnail_url next to
+#   image_url (NULL until this script has processed the image)
+#
+# Run: python image_thumbs.py   (after load_to_pg.py; re-runs only fetch new URLs
+#      and the ones whose thumbnails are missing from THUMB_DIR,
+#      IMAGE_RETRY_FAILED=1 also retries the ones that failed before)
+
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+# ---------- Config ----------
+THUMB_DIR = os.getenv("THUMB_DIR", "image_thumbs")
+THUMB_WIDTHS = sorted({int(w) for w in os.getenv("THUMB_WIDTHS", "160,320,640").split(",") if w.strip()})
+THUMB_LIST_WIDTH = int(os.getenv("THUMB_LIST_WIDTH", "320"))   # width the list APIs link to
+THUMB_FORMAT = os.getenv("THUMB_FORMAT", "webp").lower()        # webp | jpeg
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", str(os.cpu_count() or 2)))   # resize processes
+IMAGE_SOURCE = os.getenv("IMAGE_SOURCE", "http")                # http | <directory>
+IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "8"))
+IMAGE_RETRY_FAILED = os.getenv("IMAGE_RETRY_FAILED", "0") == "1"
+IMAGE_UA = "ViGrow/1.0 (academic use)"
+
+CACHE_TABLE = "image_cache"
+CACHE_RECHECK_S = 30.0   # backends: how often to look for image_cache again while it is missing
+# (table, column) pairs whose URLs get thumbnails
+SOURCES = [("species_information_dataset", "image_url"), ("variety_details", "image_url")]
+
+EXT = {"webp": "webp", "jpeg": "jpg"}
+DEFAULT_EXT = EXT.get(THUMB_FORMAT, "webp")   # main() rejects any other THUMB_FORMAT
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+HASH_RE = re.compile(r"[0-9a-f]{32}")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# ---------- Paths ----------
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def thumb_path(h: str, width: int, ext: str = DEFAULT_EXT) -> Path:
+    return Path(THUMB_DIR) / h[:2] / h / f"{width}.{ext}"
+
+def has_thumbs(h: str) -> bool:
+    return all(thumb_path(h, w).exists() for w in THUMB_WIDTHS)
+
+def thumbnail_url(h: Optional[str], width: int = THUMB_LIST_WIDTH) -> Optional[str]:
+    """Relative URL of a thumbnail (served by `router`), or None if there is none yet."""
+    return f"/images/{h}/{width}" if h else None
+
+# ---------- Fetchers ----------
+def fetch_http(url: str) -> bytes:
+    import requests
+    r = requests.get(url.strip(), headers={"User-Agent": IMAGE_UA}, timeout=30)
+    r.raise_for_status()
+    return r.content
+
+class DirFetcher:
+    """Stand-in source: the file named like the URL's last path segment in `root`."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def __call__(self, url: str) -> bytes:
+        name = unquote(Path(urlparse(url.strip()).path).name)
+        if not name:
+            raise FileNotFoundError(f"no file name in {url}")
+        return (self.root / name).read_bytes()
+
+def make_fetcher(source: str = IMAGE_SOURCE) -> Callable[[str], bytes]:
+    if source == "http":
+        return fetch_http
+    if not os.path.isdir(source):
+        raise SystemExit(f"IMAGE_SOURCE must be http or a directory, got {source!r}")
+    return DirFetcher(source)
+
+# ---------- Rendering (worker processes) ----------
+def render_thumbs(h: str, data: bytes) -> str:
+    """Write every THUMB_WIDTHS thumbnail of one image (widest first, each from the previous)."""
+    from PIL import Image, ImageOps
+
+    im = Image.open(io.BytesIO(data))
+    widest = THUMB_WIDTHS[-1]
+    if im.width > widest:  # JPEG: decode at a reduced scale that is still >= the widest thumb
+        im.draft("RGB", (widest, max(1, im.height * widest // im.width)))
+    im = ImageOps.exif_transpose(im)
+    keep_alpha = THUMB_FORMAT == "webp" and im.mode in ("RGBA", "LA", "P")
+    im = im.convert("RGBA" if keep_alpha else "RGB")
+
+    ext = EXT[THUMB_FORMAT]
+    for w in reversed(THUMB_WIDTHS):
+        if im.width > w:
+            im = im.resize((w, max(1, round(im.height * w / im.width))), Image.LANCZOS)
+        path = thumb_path(h, w, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{ext}.tmp")
+        im.save(tmp, format=THUMB_FORMAT.upper(), quality=THUMB_QUALITY)
+        os.replace(tmp, path)
+    return h
+
+# ---------- Pipeline ----------
+def build(urls: List[str], fetcher: Callable[[str], bytes]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Download each URL once (IMAGE_FETCH_WORKERS threads) and render missing
+    thumbnails (THUMB_WORKERS processes). Yields (url, hash, None) or
+    (url, None, error) as URLs finish, in no particular order.
+    """
+    renders: Dict[str, Future] = {}     # hash -> render job, shared by URLs with the same bytes
+    waiting: Dict[Future, List[str]] = {}
+    todo = iter(urls)
+    with ThreadPoolExecutor(max_workers=IMAGE_FETCH_WORKERS) as io_pool, \
+            ProcessPoolExecutor(max_workers=THUMB_WORKERS) as cpu_pool:
+        fetches: Dict[Future, str] = {}
+
+        def refill():
+            # bounded read-ahead: downloaded bytes wait in memory until rendered
+            for url in todo:
+                fetches[io_pool.submit(fetcher, url)] = url
+                if len(fetches) >= 4 * IMAGE_FETCH_WORKERS:
+                    break
+
+        refill()
+        while fetches or waiting:
+            done, _ = wait(list(fetches) + list(waiting), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in waiting:
+                    for url in waiting.pop(fut):
+                        yield (url, fut.result(), None) if fut.exception() is None \
+                            else (url, None, f"render: {fut.exception()}"[:500])
+                    continue
+                url = fetches.pop(fut)
+                if fut.exception() is not None:
+                    yield url, None, f"fetch: {fut.exception()}"[:500]
+                    continue
+                data = fut.result()
+                h = content_hash(data)
+                job = renders.get(h)
+                if job is None and has_thumbs(h):
+                    yield url, h, None
+                elif job is not None and job not in waiting:  # same image, already rendered
+                    yield (url, h, None) if job.exception() is None \
+                        else (url, None, f"render: {job.exception()}"[:500])
+                else:
+                    if job is None:
+                        job = renders[h] = cpu_pool.submit(render_thumbs, h, data)
+                        waiting[job] = []
+                    waiting[job].append(url)
+            refill()
+
+# ---------- API (included by the backends) ----------
+router = APIRouter()
+
+@router.get("/images/{h}/{width}")
+def get_thumbnail(h: str, width: int):
+    """A rendered thumbnail; content-addressed, so it can be cached forever."""
+    if not HASH_RE.fullmatch(h) or width not in THUMB_WIDTHS:
+        raise HTTPException(status_code=404, detail="Unknown image")
+    for ext in (DEFAULT_EXT, *(e for e in MEDIA_TYPES if e != DEFAULT_EXT)):
+        path = thumb_path(h, width, ext)
+        if path.exists():
+            return FileResponse(path, media_type=MEDIA_TYPES[ext], headers={"Cache-Control": IMMUTABLE})
+    raise HTTPException(status_code=404, detail="Unknown image")
+
+class CacheTable:
+    """
+    The image_cache table, reflected on first use: a backend started before
+    image_thumbs.py first ran looks for it again every CACHE_RECHECK_S and
+    serves thumbnail URLs as soon as it exists.
+    """
+
+    def __init__(self, metadata, engine):
+        self.metadata, self.engine = metadata, engine
+        self._table = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The reflected Table, or None while it does not exist."""
+        if self._table is None and self._due():
+            from sqlalchemy import Table
+            from sqlalchemy.exc import NoSuchTableError
+            with self._lock:
+                if self._table is None and self._due():
+                    self._checked = time.monotonic()
+                    try:
+                        self._table = Table(CACHE_TABLE, self.metadata, autoload_with=self.engine)
+                    except NoSuchTableError:
+                        pass
+        return self._table
+
+    def _due(self) -> bool:
+        return self._checked is None or time.monotonic() - self._checked >= CACHE_RECHECK_S
+
+def thumb_hash_column(cache: CacheTable, url_col, label: str = "thumb_hash"):
+    """Select-able content hash of `url_col`'s image (NULL if not rendered)."""
+    from sqlalchemy import literal, select
+    cache_table = cache.get()
+    if cache_table is None:
+        return literal(None).label(label)
+    return (
+        select(cache_table.c.content_hash)
+        .where(cache_table.c.source_url == url_col, cache_table.c.status == "ok")
+        .scalar_subquery()
+        .label(label)
+    )
+
+# ---------- Main ----------
+def main():
+    import psycopg2
+    from psycopg2.extras import execute_batch
+    from load_to_pg import DB_CONFIG
+
+    # checked here, not at import: the backends import this module for the router
+    if THUMB_FORMAT not in EXT:
+        raise SystemExit(f"THUMB_FORMAT must be webp or jpeg, got {THUMB_FORMAT!r}")
+    if THUMB_LIST_WIDTH not in THUMB_WIDTHS:
+        raise SystemExit(f"THUMB_LIST_WIDTH {THUMB_LIST_WIDTH} is not one of THUMB_WIDTHS {THUMB_WIDTHS}")
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS public.{CACHE_TABLE} ("
+            "source_url TEXT PRIMARY KEY, content_hash TEXT, status TEXT NOT NULL, "
+            "error TEXT, fetched_at TIMESTAMPTZ NOT NULL DEFAULT now());"
+        )
+        union = " UNION ".join(
+            f'SELECT DISTINCT "{col}" AS url FROM public.{table} WHERE "{col}" ILIKE \'http%\''
+            for table, col in SOURCES
+        )
+        retry = "c.status <> 'ok'" if IMAGE_RETRY_FAILED else "FALSE"
+        cur.execute(
+            f"SELECT u.url, c.content_hash FROM ({union}) u LEFT JOIN public.{CACHE_TABLE} c "
+            f"ON c.source_url = u.url WHERE c.source_url IS NULL OR {retry} OR c.status = 'ok' "
+            "ORDER BY u.url;"
+        )
+        rows = cur.fetchall()   # urls as stored: image_cache joins on the exact value
+    # 'ok' rows whose files are gone (THUMB_DIR wiped or moved, new THUMB_WIDTHS / THUMB_FORMAT)
+    # are fetched and rendered again
+    on_disk: Dict[str, bool] = {}
+    urls, missing = [], 0
+    for url, h in rows:
+        if h is not None:
+            if h not in on_disk:
+                on_disk[h] = has_thumbs(h)
+            if on_disk[h]:
+                continue
+            missing += 1
+        urls.append(url)
+    print(f"[thumbs] {len(urls)} image URLs to process ({missing} with thumbnails missing on disk) "
+          f"| widths {THUMB_WIDTHS} {THUMB_FORMAT} "
+          f"| source {IMAGE_SOURCE} | {THUMB_WORKERS} resize processes")
+
+    upsert = (
+        f"INSERT INTO public.{CACHE_TABLE} (source_url, content_hash, status, error) "
+        "VALUES (%s, %s, %s, %s) ON CONFLICT (source_url) DO UPDATE SET "
+        "content_hash = EXCLUDED.content_hash, status = EXCLUDED.status, "
+        "error = EXCLUDED.error, fetched_at = now();"
+    )
+    t0 = time.perf_counter()
+    batch: List[Tuple] = []
+    ok = failed = 0
+    hashes = set()
+
+    def flush():
+        with conn, conn.cursor() as cur:
+            execute_batch(cur, upsert, batch)
+        batch.clear()
+
+    for url, h, err in build(urls, make_fetcher()):
+        if h:
+            ok += 1
+            hashes.add(h)
+            batch.append((url, h, "ok", None))
+        else:
+            failed += 1
+            print(f"[thumbs] {url}: {err}")
+            batch.append((url, None, "failed", err))
+        if len(batch) >= 200:
+            flush()
+    if batch:
+        flush()
+    conn.close()
+    secs = time.perf_counter() - t0
+    print(f"[thumbs] {ok} ok ({len(hashes)} distinct images), {failed} failed in {secs:.1f}s "
+          f"-> {THUMB_DIR}/")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
+import io
 import os
 import re
 import csv
-from typing import List, Dict, Tuple, Any
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Tuple, Any, Optional, Iterable, Iterator
 
 import psycopg2
 from psycopg2.extras import execute_batch
 
+from pg_loader import (
+    HASH_COL, staging_name, analyze_staging, swap_in,
+    row_hash, has_columns, upsert_changed,
+)
+from taxon_names import KEY_COLUMNS, canonical_key
+
 # ---------- DB config ----------
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -20,6 +30,20 @@ REL_CSV     = os.getenv("REL_CSV",     "relationship_dataset.csv")
 SPECIES_CSV = os.getenv("SPECIES_CSV", "species_information_dataset.csv")
 OBS_CSV     = os.getenv("OBS_CSV",     "species_occurrences_cleaned.csv")
 
+# ---------- load mode ----------
+# insert:      read whole CSV, execute_batch INSERTs (original behaviour)
+# copy:        stream each CSV through COPY ... FROM STDIN, bounded memory
+# incremental: diff keyed tables (relationships, species) by row_hash and apply
+#              only inserts/updates/deletes; other tables are rebuilt via COPY.
+#              The changes are applied in the transaction that swaps the
+#              rebuilt tables in, so readers never see one without the other
+LOAD_MODE = os.getenv("LOAD_MODE", "insert").lower()
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "5000"))
+# LOAD_WORKERS > 1: each rebuilt table is read, cast and COPYed into its staging
+# table by its own process + connection (implies COPY streaming); the staging
+# tables are still swapped in together in one final transaction
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "1"))
+
 # ---------- helpers ----------
 PG_IDENT_MAXLEN = 63
 IDENT_RE = re.compile(r"[^a-zA-Z0-9_]+")
@@ -59,6 +83,15 @@ def read_csv_dicts(path: str) -> Tuple[List[Dict[str, str]], List[str]]:
     headers = reader.fieldnames or []
     return rows, headers
 
+def read_csv_header(path: str) -> List[str]:
+    """Return only the header row, without reading the rest of the file."""
+    if not os.path.exists(path):
+        raise SystemExit(f"CSV not found: {path}")
+    with open(path, "rb") as fb:
+        dialect = sniff_dialect(fb.read(4096))
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        return next(csv.reader(f, dialect=dialect), [])
+
 # ---------- DDL builders ----------
 def ddl_relationships(table: str) -> Tuple[str, str]:
     drop_sql = f'DROP TABLE IF EXISTS public.{table} CASCADE;'
@@ -67,6 +100,9 @@ def ddl_relationships(table: str) -> Tuple[str, str]:
       plant_scientific_name TEXT NOT NULL,
       animal_taxon_name     TEXT NOT NULL,
       interaction_type_raw  TEXT NOT NULL,
+      plant_key             TEXT,
+      animal_key            TEXT,
+      row_hash              TEXT,
       PRIMARY KEY (plant_scientific_name, animal_taxon_name, interaction_type_raw)
     );
     """
@@ -91,7 +127,9 @@ def ddl_species_info(table: str) -> Tuple[str, str]:
       "Weeds of National Significance (WoNS) as at Feb. 2013" TEXT,
       "VIC State Notifiable Pests" TEXT,
       image_url TEXT,
-      summary TEXT
+      summary TEXT,
+      animal_key TEXT,
+      row_hash TEXT
     );
     """
     return drop_sql, create_sql
@@ -107,6 +145,14 @@ def ddl_observations(table: str, headers: List[str]) -> Tuple[str, str]:
     create_sql = f"CREATE TABLE public.{table} (\n      {cols_sql}\n);"
     return drop_sql, create_sql
 
+def ddl_key_indexes(table: str, cols: List[str]) -> List[str]:
+    """Indexes on the canonical name key columns the APIs join and filter on."""
+    return [f'CREATE INDEX ON public.{table} ("{c}");' for c in cols]
+
+def with_key_columns(headers: List[str]) -> List[str]:
+    """`headers` plus the key column of every taxon name column in it (taxon_names.KEY_COLUMNS)."""
+    return headers + [k for k, name in KEY_COLUMNS.items() if name in headers and k not in headers]
+
 # ---------- DML with SAFE placeholders ----------
 SAFE_KEY_RE = re.compile(r"[^a-zA-Z0-9_]")
 
@@ -129,6 +175,9 @@ def cast_value(header: str, value: Any) -> Any:
     """Cast CSV string to appropriate Python type for DB insert."""
     if value == "" or value is None:
         return None
+    if header in KEY_COLUMNS:
+        # `value` is the name column the key is derived from
+        return canonical_key(value) or None
     if header in ("decimalLatitude", "decimalLongitude"):
         try:
             return float(value)
@@ -147,62 +196,240 @@ def cast_value(header: str, value: Any) -> Any:
             return None
     return value  # default as text
 
-def batch_insert(conn, table: str, rows: List[Dict[str, str]], headers: List[str], page_size: int = 2000):
-    cols_sql = ", ".join(f'"{h}"' for h in headers)
-    safe_keys = make_unique_safe_keys(headers)
-    placeholders = ", ".join(f"%({safe_keys[h]})s" for h in headers)
+def batch_insert(conn, table: str, rows: List[Dict[str, str]], headers: List[str],
+                 page_size: int = 2000, with_hash: bool = False):
+    cols = headers + [HASH_COL] if with_hash else headers
+    cols_sql = ", ".join(f'"{h}"' for h in cols)
+    safe_keys = make_unique_safe_keys(cols)
+    placeholders = ", ".join(f"%({safe_keys[h]})s" for h in cols)
     sql = f'INSERT INTO public.{table} ({cols_sql}) VALUES ({placeholders})'
 
     params = []
     for r in rows:
         p = {}
         for h in headers:
-            p[safe_keys[h]] = cast_value(h, r.get(h))
+            p[safe_keys[h]] = cast_value(h, r.get(KEY_COLUMNS.get(h, h)))
+        if with_hash:
+            p[safe_keys[HASH_COL]] = row_hash([p[safe_keys[h]] for h in headers])
         params.append(p)
 
     with conn.cursor() as cur:
         execute_batch(cur, sql, params, page_size=page_size)
 
+# ---------- COPY streaming ----------
+def iter_cast_rows(path: str, headers: List[str]) -> Iterator[List[Any]]:
+    """
+    Stream the CSV, yielding only `headers` (in that order) passed through
+    cast_value; a key column is computed from its name column.
+    """
+    with open(path, "rb") as fb:
+        dialect = sniff_dialect(fb.read(4096))
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        reader = csv.reader(f, dialect=dialect)
+        src_headers = next(reader, [])
+        pos = {h: i for i, h in enumerate(src_headers)}  # last duplicate wins, like DictReader
+        cols = [(h, pos.get(KEY_COLUMNS.get(h, h))) for h in headers]
+        for row in reader:
+            if not row:  # DictReader skips blank lines too
+                continue
+            n = len(row)
+            yield [cast_value(h, row[i] if i is not None and i < n else None) for h, i in cols]
+
+def with_row_hash(rows: Iterable[List[Any]]) -> Iterator[List[Any]]:
+    for r in rows:
+        yield r + [row_hash(r)]
+
+class CsvCopyStream:
+    """
+    File-like source for cursor.copy_expert: pulls a chunk of already-cast rows
+    at a time and re-emits them as COPY-compatible CSV. Memory stays bounded
+    by COPY_CHUNK_ROWS; reads advance an offset into the current chunk, so
+    every byte is copied once whatever the chunk size.
+    """
+    def __init__(self, rows: Iterable[List[Any]], chunk_rows: int = COPY_CHUNK_ROWS):
+        self._rows = iter(rows)
+        self._chunk_rows = chunk_rows
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator="\n")
+        self._chunk = ""
+        self._pos = 0
+        self.rows = 0
+
+    def _fill(self) -> bool:
+        """Replace the consumed chunk with the next one; False at the end of the rows."""
+        batch = list(islice(self._rows, self._chunk_rows))
+        if not batch:
+            return False
+        self._out.seek(0)
+        self._out.truncate()
+        self._writer.writerows(batch)
+        self.rows += len(batch)
+        self._chunk, self._pos = self._out.getvalue(), 0
+        return True
+
+    def read(self, size: int = -1) -> str:
+        if size < 0:
+            parts = [self._chunk[self._pos:]]
+            while self._fill():
+                parts.append(self._chunk)
+            self._chunk, self._pos = "", 0
+            return "".join(parts)
+        if self._pos >= len(self._chunk) and not self._fill():
+            return ""
+        out = self._chunk[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
+
+def copy_insert(conn, table: str, path: str, headers: List[str], with_hash: bool = False) -> int:
+    """Stream `path` into public.<table> via COPY; return the number of rows sent."""
+    cols = headers + [HASH_COL] if with_hash else headers
+    cols_sql = ", ".join(f'"{h}"' for h in cols)
+    sql = f"COPY public.{table} ({cols_sql}) FROM STDIN WITH (FORMAT csv)"
+    rows = iter_cast_rows(path, headers)
+    stream = CsvCopyStream(with_row_hash(rows) if with_hash else rows)
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(sql, stream)
+    finally:
+        rows.close()
+    return stream.rows
+
+def load_rows(conn, table: str, path: str, rows: Optional[List[Dict[str, str]]],
+              headers: List[str], with_hash: bool = False) -> int:
+    """Insert pre-read rows, or stream the file with COPY when rows is None."""
+    if rows is None:
+        return copy_insert(conn, table, path, headers, with_hash)
+    batch_insert(conn, table, rows, headers, with_hash=with_hash)
+    return len(rows)
+
+def read_source(path: str) -> Tuple[Optional[List[Dict[str, str]]], List[str]]:
+    """Outside plain insert mode only the header is read up front; rows are streamed later."""
+    if LOAD_MODE != "insert" or LOAD_WORKERS > 1:
+        return None, read_csv_header(path)
+    return read_csv_dicts(path)
+
+def describe(rows: Optional[list]) -> str:
+    return "streaming" if rows is None else f"{len(rows)} rows"
+
+def build_staging(conn, spec: Dict[str, Any]) -> int:
+    """Create, fill, index and analyze public.<table>__staging for one table spec."""
+    stage = staging_name(spec["table"])
+    with conn.cursor() as cur:
+        drop, create = spec["ddl"](stage, *spec.get("ddl_args", ()))
+        cur.execute(drop); cur.execute(create)
+        n = load_rows(conn, stage, spec["path"], spec["rows"], spec["headers"],
+                      with_hash=spec["keys"] is not None)
+        for sql in ddl_key_indexes(stage, spec["index"]):
+            cur.execute(sql)
+        analyze_staging(cur, spec["table"])
+    return n
+
+def build_staging_job(spec: Dict[str, Any], conn=None) -> Tuple[str, int, float]:
+    """Build one staging table (on its own connection unless one is given); return timing."""
+    t0 = time.perf_counter()
+    own = conn is None
+    if own:
+        conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn:
+            n = build_staging(conn, spec)
+    finally:
+        if own:
+            conn.close()
+    return spec["name"], n, time.perf_counter() - t0
+
 # ---------- main ----------
 def main():
+    if LOAD_MODE not in ("insert", "copy", "incremental"):
+        raise SystemExit(f"Unknown LOAD_MODE: {LOAD_MODE} (expected insert, copy or incremental)")
+
     # relationships
-    rel_rows, rel_headers = read_csv_dicts(REL_CSV)
+    rel_rows, rel_headers = read_source(REL_CSV)
     need_rel = ["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"]
     if not set(need_rel).issubset(rel_headers):
         miss = set(need_rel) - set(rel_headers)
         raise SystemExit(f"{REL_CSV} missing columns: {miss}")
     rel_table = make_ident(REL_CSV)
-    print(f"[rel] {REL_CSV} -> public.{rel_table} ({len(rel_rows)} rows)")
+    print(f"[rel] {REL_CSV} -> public.{rel_table} ({describe(rel_rows)})")
 
     # species info
-    sp_rows, sp_headers = read_csv_dicts(SPECIES_CSV)
+    sp_rows, sp_headers = read_source(SPECIES_CSV)
     if "animal_taxon_name" not in sp_headers:
         raise SystemExit(f"{SPECIES_CSV} must contain 'animal_taxon_name'")
     sp_table = make_ident(SPECIES_CSV)
-    print(f"[species] {SPECIES_CSV} -> public.{sp_table} ({len(sp_rows)} rows)")
+    print(f"[species] {SPECIES_CSV} -> public.{sp_table} ({describe(sp_rows)})")
 
     # observations
-    obs_rows, obs_headers = read_csv_dicts(OBS_CSV)
+    obs_rows, obs_headers = read_source(OBS_CSV)
     obs_table = make_ident(OBS_CSV)
-    print(f"[obs] {OBS_CSV} -> public.{obs_table} ({len(obs_rows)} rows)")
+    print(f"[obs] {OBS_CSV} -> public.{obs_table} ({describe(obs_rows)})")
 
+    # keys: natural key for row_hash diffing (None = table is always rebuilt)
+    # headers gain the canonical key column of each name column (plant_key,
+    # animal_key); those are indexed and the APIs join on them
+    obs_cols = with_key_columns(obs_headers)
+    specs: List[Dict[str, Any]] = [
+        {"name": "rel", "table": rel_table, "path": REL_CSV, "rows": rel_rows,
+         "headers": with_key_columns(need_rel), "ddl": ddl_relationships, "keys": need_rel,
+         "index": ["plant_key", "animal_key"]},
+        {"name": "species", "table": sp_table, "path": SPECIES_CSV, "rows": sp_rows,
+         "headers": with_key_columns(sp_headers), "ddl": ddl_species_info, "keys": ["animal_taxon_name"],
+         "index": ["animal_key"]},
+        {"name": "obs", "table": obs_table, "path": OBS_CSV, "rows": obs_rows,
+         "headers": obs_cols, "ddl": ddl_observations, "ddl_args": (obs_cols,), "keys": None,
+         "index": ["animal_key"] if "animal_key" in obs_cols else []},
+    ]
+
+    # build into <table>__staging (or upsert in place), then swap rebuilt tables in together
     conn = psycopg2.connect(**DB_CONFIG)
     try:
+        counts: Dict[str, str] = {}
+        timings: Dict[str, float] = {}
+        to_rebuild: List[Dict[str, Any]] = []
+        to_upsert: List[Dict[str, Any]] = []
+        t_start = time.perf_counter()
+
         with conn:
-            with conn.cursor() as cur:
-                drop, create = ddl_relationships(rel_table)
-                cur.execute(drop); cur.execute(create)
-                batch_insert(conn, rel_table, rel_rows, need_rel)
+            for spec in specs:
+                incremental = False
+                if LOAD_MODE == "incremental" and spec["keys"]:
+                    # a live table without row_hash or a newer column is rebuilt instead
+                    with conn.cursor() as cur:
+                        incremental = has_columns(cur, spec["table"], spec["headers"] + [HASH_COL])
+                (to_upsert if incremental else to_rebuild).append(spec)
 
-                drop, create = ddl_species_info(sp_table)
-                cur.execute(drop); cur.execute(create)
-                batch_insert(conn, sp_table, sp_rows, sp_headers)
+        def apply_upserts() -> None:
+            # runs inside swap_in's transaction (again if the swap is retried)
+            for spec in to_upsert:
+                t0 = time.perf_counter()
+                stats = upsert_changed(conn, spec["table"], spec["keys"], spec["headers"],
+                                       iter_cast_rows(spec["path"], spec["headers"]))
+                changed = stats["inserted"] + stats["updated"] + stats["deleted"]
+                print(f"[{spec['name']}] incremental: changed={changed} "
+                      f"(+{stats['inserted']} ~{stats['updated']} -{stats['deleted']}, "
+                      f"unchanged={stats['unchanged']})")
+                counts[spec["name"]] = f"{changed} changed"
+                timings[spec["name"]] = time.perf_counter() - t0
+
+        if LOAD_WORKERS > 1 and len(to_rebuild) > 1:
+            with ProcessPoolExecutor(max_workers=min(LOAD_WORKERS, len(to_rebuild))) as ex:
+                results = list(ex.map(build_staging_job, to_rebuild))
+        else:
+            results = [build_staging_job(spec, conn) for spec in to_rebuild]
+        for name, n, secs in results:
+            counts[name] = str(n)
+            timings[name] = secs
 
-                drop, create = ddl_observations(obs_table, obs_headers)
-                cur.execute(drop); cur.execute(create)
-                batch_insert(conn, obs_table, obs_rows, obs_headers)
+        swap_in(conn, [spec["table"] for spec in to_rebuild], apply=apply_upserts)
 
-        print("[done] Loaded all three tables successfully.")
+        wall = time.perf_counter() - t_start
+        serial = sum(timings.values())
+        for name, secs in timings.items():
+            print(f"[time] {name}: {secs:.2f}s")
+        print(f"[time] total wall {wall:.2f}s | sum of tables {serial:.2f}s"
+              + (f" | speedup x{serial / wall:.2f}" if wall > 0 else ""))
+        print(f"[done] Loaded all three tables successfully ({LOAD_MODE}, workers={LOAD_WORKERS}): "
+              + ", ".join(f"{k}={v}" for k, v in counts.items()))
     finally:
         conn.close()
 
@@ -0,0 +1,221 @@
+# mock_sources.py
+# Purpose: local stand-in for the external APIs the fetchers call, so that
+# globiapi.py / globi_async.py, alaimage.py and alalocation.py can be run and
+# benchmarked offline (see bench_fetchers.py).
+# Requirements: fastapi, uvicorn
+#
+# One server, one prefix per source (point the fetchers' *_BASE env vars here):
+#   /globi/find, /globi/interaction, /globi/taxon/{plant}/{type}   GLOBI_API_BASE=<url>/globi
+#   /biocache/ws/occurrences/search                                 ALA_BIOCACHE_WS=<url>/biocache/ws
+#   /ala/species/guid/{name}, /ala/species/{guid}                   ALA_API_BASE=<url>/ala
+#   /wiki/api/rest_v1/page/summary/{title}                          WIKI_SUMMARY_BASE=<url>/wiki/api/rest_v1/page/summary
+#
+# Responses are synthetic and deterministic per name (crc32), or recorded: with
+# MOCK_RECORDINGS=<http_cache.sqlite> a request whose real URL is in that cache
+# is answered with the stored body.
+#
+# Fault injection (env):
+#   MOCK_LATENCY_MS / MOCK_JITTER_MS   delay per request (mean / +- uniform)
+#   MOCK_ERROR_RATE                    share of requests answered with HTTP 500
+#   MOCK_429_RATE / MOCK_RETRY_AFTER   share answered 429 with Retry-After seconds
+#   MOCK_REJECT_FIELDS=1               GloBI /interaction rejects `fields` (400)
+#   MOCK_SEED                          seed of the injection RNG
+# GET /__stats returns request counts per route and injected faults; POST /__reset clears them.
+#
+# Run: python mock_sources.py  (MOCK_PORT, default 8765)
+
+import asyncio
+import json
+import os
+import random
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+# ------------ Config ------------
+MOCK_PORT = int(os.getenv("MOCK_PORT", "8765"))
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "50"))
+MOCK_JITTER_MS = float(os.getenv("MOCK_JITTER_MS", "20"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_429_RATE = float(os.getenv("MOCK_429_RATE", "0"))
+MOCK_RETRY_AFTER = os.getenv("MOCK_RETRY_AFTER", "1")
+MOCK_REJECT_FIELDS = os.getenv("MOCK_REJECT_FIELDS", "0") == "1"
+MOCK_RECORDINGS = os.getenv("MOCK_RECORDINGS")
+RNG = random.Random(int(os.getenv("MOCK_SEED", "42")))
+
+# real base URL behind each prefix (to look up recorded responses)
+REAL_BASES = {
+    "/globi": "https://api.globalbioticinteractions.org",
+    "/biocache/ws": "https://biocache-ws.ala.org.au/ws",
+    "/ala": "https://api.ala.org.au",
+    "/wiki": "https://en.wikipedia.org",
+}
+
+# interactions per (plant, type): most types are empty, a few span several pages
+INTERACTION_COUNTS = [0, 0, 0, 0, 3, 12, 40, 1500]
+# cluster centres for synthetic occurrences (Melbourne, Geelong, Ballarat, Bendigo)
+CITIES = [(-37.81, 144.96), (-38.15, 144.36), (-37.56, 143.85), (-36.76, 144.28)]
+
+app = FastAPI(title="ViGrow fetcher mock sources", version="1.0.0")
+STATS: Counter = Counter()
+
+# ------------ Helpers ------------
+def h(*parts: str) -> int:
+    return zlib.crc32("|".join(parts).encode("utf-8"))
+
+def route_of(path: str) -> str:
+    for prefix, label in (("/globi/taxon/", "globi/taxon"), ("/ala/species/guid/", "ala/species/guid"),
+                          ("/ala/species/", "ala/species"), ("/wiki/", "wiki/summary")):
+        if path.startswith(prefix):
+            return label
+    return path.strip("/")
+
+def recorded(request: Request) -> Optional[Response]:
+    """Stored response for the real URL of this request (MOCK_RECORDINGS), if any."""
+    if not MOCK_RECORDINGS:
+        return None
+    import http_cache
+    http_cache.HTTP_CACHE_PATH = MOCK_RECORDINGS
+    path = request.scope.get("raw_path", b"").decode("latin-1") or request.url.path  # still %-encoded
+    for prefix, real in REAL_BASES.items():
+        if path.startswith(prefix + "/"):
+            url = real + path[len(prefix):] + (f"?{request.url.query}" if request.url.query else "")
+            hit = http_cache.lookup(url)
+            if hit is not None:
+                status, headers, body, _ = hit
+                ctype = next((v for k, v in headers.items() if k.lower() == "content-type"), None)
+                return Response(body, status_code=status, media_type=ctype)
+    return None
+
+@app.middleware("http")
+async def inject(request: Request, call_next):
+    """Latency, 500s and 429s in front of every source route; counts requests."""
+    path = request.url.path
+    if path.startswith("/__"):
+        return await call_next(request)
+    route = route_of(path)
+    STATS[f"requests:{route}"] += 1
+    STATS["requests"] += 1
+    delay = MOCK_LATENCY_MS + RNG.uniform(-MOCK_JITTER_MS, MOCK_JITTER_MS)
+    await asyncio.sleep(max(delay, 0) / 1000)
+    roll = RNG.random()
+    if roll < MOCK_429_RATE:
+        STATS["injected_429"] += 1
+        return PlainTextResponse("Too Many Requests", status_code=429,
+                                 headers={"Retry-After": MOCK_RETRY_AFTER})
+    if roll < MOCK_429_RATE + MOCK_ERROR_RATE:
+        STATS["injected_500"] += 1
+        return PlainTextResponse("Internal Server Error", status_code=500)
+    rec = recorded(request)
+    if rec is not None:
+        STATS["recorded"] += 1
+        return rec
+    return await call_next(request)
+
+# ------------ Control ------------
+@app.get("/__stats")
+def stats():
+    return dict(STATS)
+
+@app.post("/__reset")
+def reset():
+    STATS.clear()
+    return {"ok": True}
+
+# ------------ GloBI ------------
+def interactions(plant: str, itype: str) -> List[str]:
+    n = INTERACTION_COUNTS[h(plant, itype) % len(INTERACTION_COUNTS)]
+    return [f"Animalia {h(plant, itype) % 997} sp{k}" for k in range(n)]
+
+@app.get("/globi/find")
+def globi_find(name: str):
+    return [{"preferredName": name, "name": name}]
+
+@app.get("/globi/interaction")
+def globi_interaction(request: Request, interactionType: str, limit: int = 1024, offset: int = 0,
+                      type: str = "csv", fields: Optional[str] = None):
+    if fields and MOCK_REJECT_FIELDS:
+        return PlainTextResponse("unsupported parameter: fields", status_code=400)
+    q = request.query_params
+    plant = q.get("sourceTaxon") or q.get("targetTaxon") or ""
+    plant_is_source = "sourceTaxon" in q
+    page = interactions(plant, interactionType)[offset:offset + limit]
+    pairs = [(plant, a) if plant_is_source else (a, plant) for a in page]
+    if type == "json.v2":
+        return {"data": [{"source": {"name": s}, "target": {"name": t}, "interactionType": interactionType}
+                         for s, t in pairs]}
+    if not pairs:
+        return PlainTextResponse("", media_type="text/csv")
+    lines = ["source_taxon_name,target_taxon_name,interaction_type"]
+    lines += [f"{s},{t},{interactionType}" for s, t in pairs]
+    return PlainTextResponse("\n".join(lines), media_type="text/csv")
+
+@app.get("/globi/taxon/{plant}/{itype}")
+def globi_taxon(plant: str, itype: str):
+    names = interactions(plant, itype)
+    body = "taxon_name\n" + "\n".join(names) if names else ""
+    return PlainTextResponse(body, media_type="text/csv")
+
+# ------------ Biocache ------------
+def occurrence_total(name: str) -> int:
+    return [0, 40, 300, 1200, 4000][h(name, "occ") % 5]
+
+def occurrence(name: str, k: int) -> Dict:
+    r = random.Random(h(name, str(k)))
+    lat0, lon0 = CITIES[r.randrange(len(CITIES))] if r.random() < 0.7 else (r.uniform(-39, -34), r.uniform(141, 150))
+    return {
+        "decimalLatitude": round(lat0 + r.gauss(0, 0.05), 6),
+        "decimalLongitude": round(lon0 + r.gauss(0, 0.05), 6),
+        "eventDate": 946684800000 + r.randrange(25 * 365) * 86_400_000,
+        "occurrenceID": f"mock-{h(name) % 100000}-{k}",
+        "recordedBy": "mock",
+        "locality": "",
+        "stateProvince": "Victoria",
+        "country": "Australia",
+        "dataResourceName": "mock_sources",
+        "basisOfRecord": "HUMAN_OBSERVATION",
+    }
+
+def image_url(name: str) -> Optional[str]:
+    return None if h(name, "img") % 4 == 0 else f"https://images.example/{quote(name)}.jpg"
+
+@app.get("/biocache/ws/occurrences/search")
+def biocache_search(request: Request, q: str, pageSize: int = 10, start: int = 0):
+    fq = request.query_params.getlist("fq")
+    names = re.findall(r'"((?:[^"\\]|\\.)*)"', q)
+    if "multimedia:Image" in fq:
+        recs = [{"imageUrl": image_url(n), "scientificName": n} for n in names if image_url(n)]
+        return {"occurrences": recs[:pageSize], "totalRecords": len(recs)}
+    name = names[0] if names else ""
+    total = occurrence_total(name)
+    recs = [occurrence(name, k) for k in range(start, min(start + pageSize, total))]
+    return {"occurrences": recs, "totalRecords": total}
+
+# ------------ ALA species / Wikipedia ------------
+@app.get("/ala/species/guid/{name}")
+def ala_guid(name: str):
+    if h(name, "guid") % 3 == 0:
+        return JSONResponse({"message": "not found"}, status_code=404)
+    return {"guid": f"urn:lsid:mock:{h(name) % 1000003}"}
+
+@app.get("/ala/species/{guid}")
+def ala_species(guid: str):
+    return {"generalDescription": f"Mock description for {guid}. It lives in Victoria."}
+
+@app.get("/wiki/api/rest_v1/page/summary/{title}")
+def wiki_summary(title: str):
+    return {"extract": f"{title.replace('_', ' ')} is a species in the mock encyclopaedia."}
+
+if __name__ == "__main__":
+    import uvicorn
+    print(f"[mock] serving on http://127.0.0.1:{MOCK_PORT} "
+          f"(latency {MOCK_LATENCY_MS}ms, 500s {MOCK_ERROR_RATE:.0%}, 429s {MOCK_429_RATE:.0%})")
+    print(json.dumps({k: f"http://127.0.0.1:{MOCK_PORT}{v}" for k, v in {
+        "GLOBI_API_BASE": "/globi", "ALA_BIOCACHE_WS": "/biocache/ws", "ALA_API_BASE": "/ala",
+        "WIKI_SUMMARY_BASE": "/wiki/api/rest_v1/page/summary"}.items()}, indent=2))
+    uvicorn.run(app, host="127.0.0.1", port=MOCK_PORT, log_level="warning")
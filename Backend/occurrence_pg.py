@@ -0,0 +1,215 @@
+# occurrence_pg.py
+# Purpose: Postgres sink for alalocation.py (OCC_SINK=pg) — occurrences go
+# straight from the biocache pages into the table the APIs read, skipping
+# species_occurrences.csv -> clean_observations.py -> load_to_pg.py.
+# - Only the columns clean_observations.py keeps are sent (OUTPUT_HEADER minus
+#   its DROP_COLS); lat/lon as DOUBLE PRECISION, eventDate converted in flight
+#   to epoch milliseconds (BIGINT, the type load_to_pg.py gives the column)
+# - Every page is COPYed into the UNLOGGED table <live>__ingest as it arrives,
+#   on the fetching thread's own connection, in the same transaction that saves
+#   the species' paging cursor (occurrence_ingest_cursor, with the THIN settings
+#   it was made under): an interrupted species resumes at its next page with
+#   nothing lost or duplicated
+# - When a species is complete it is moved into the live table and recorded in
+#   occurrence_ingest_done in ONE transaction: the APIs see it at once, and a
+#   crash never leaves a half species live (done species are skipped on resume);
+#   the move fills animal_key (taxon_names.canonical_key) when the live table has it
+# - Every per-species statement is an index lookup: the ingest table is indexed
+#   on animal_taxon_name, the cursor / done tables have it as primary key, and
+#   the live table is filtered on its indexed animal_key (a live table loaded
+#   before the key columns existed falls back to the name, a full scan)
+# - A later load_to_pg.py run rebuilds the live table from the CSVs; truncate
+#   occurrence_ingest_done to ingest every species again after that
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set
+
+import psycopg2
+
+from clean_observations import DROP_COLS
+from load_to_pg import DB_CONFIG, OBS_CSV, ddl_key_indexes, ddl_observations, make_ident, with_key_columns
+from pg_loader import copy_tuples, has_columns
+from taxon_names import canonical_key
+
+# ---------- Tables ----------
+LIVE_TABLE = make_ident(OBS_CSV)            # species_occurrences_cleaned
+INGEST_TABLE = f"{LIVE_TABLE}__ingest"
+DONE_TABLE = "occurrence_ingest_done"
+CURSOR_TABLE = "occurrence_ingest_cursor"
+
+# ---------- Values ----------
+def event_ms(value) -> Optional[int]:
+    """eventDate as epoch milliseconds: biocache sends ms; ISO dates are converted (UTC if naive)."""
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PgOccurrenceSink:
+    def __init__(self, header: Sequence[str]):
+        self.header = list(header)
+        self.cols = [c for c in self.header if c not in DROP_COLS]
+        self._pos = [self.header.index(c) for c in self.cols]
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        self.conn = psycopg2.connect(**DB_CONFIG)
+        self.has_key = False
+        self._setup()
+
+    # ---------- Setup ----------
+    def _setup(self) -> None:
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s);", (f"public.{LIVE_TABLE}",))
+            if cur.fetchone()[0] is None:
+                _, create = ddl_observations(LIVE_TABLE, with_key_columns(self.cols))
+                cur.execute(create)
+                for sql in ddl_key_indexes(LIVE_TABLE, ["animal_key"]):
+                    cur.execute(sql)
+            self.has_key = has_columns(cur, LIVE_TABLE, ["animal_key"])
+            if not self.has_key:
+                print(f"[occurrence_pg] {LIVE_TABLE} has no animal_key column (loaded by an older "
+                      f"load_to_pg.py): replacing a species scans the whole table")
+            cur.execute(
+                f"CREATE UNLOGGED TABLE IF NOT EXISTS public.{INGEST_TABLE} "
+                f"(LIKE public.{LIVE_TABLE} INCLUDING DEFAULTS);"
+            )
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS {INGEST_TABLE}_animal_idx "
+                f"ON public.{INGEST_TABLE} (animal_taxon_name);"
+            )
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS public.{DONE_TABLE} ("
+                "animal_taxon_name TEXT PRIMARY KEY, row_count INTEGER NOT NULL, "
+                "finished_at TIMESTAMPTZ NOT NULL DEFAULT now());"
+            )
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS public.{CURSOR_TABLE} ("
+                "animal_taxon_name TEXT PRIMARY KEY, next_start INTEGER NOT NULL, "
+                "kept INTEGER NOT NULL, seen TEXT NOT NULL, thin TEXT NOT NULL DEFAULT 'exact');"
+            )
+            # cursor tables made before the THIN settings were saved with the cursor
+            cur.execute(
+                f"ALTER TABLE public.{CURSOR_TABLE} ADD COLUMN IF NOT EXISTS thin TEXT NOT NULL DEFAULT 'exact';"
+            )
+            # ingest rows are only valid together with their cursor (e.g. after the
+            # UNLOGGED table was emptied by a server crash, start those species over)
+            cur.execute(
+                f"DELETE FROM public.{INGEST_TABLE} i WHERE NOT EXISTS "
+                f"(SELECT 1 FROM public.{CURSOR_TABLE} c WHERE c.animal_taxon_name = i.animal_taxon_name);"
+            )
+            cur.execute(
+                f"DELETE FROM public.{CURSOR_TABLE} c WHERE c.kept > 0 AND NOT EXISTS "
+                f"(SELECT 1 FROM public.{INGEST_TABLE} i WHERE i.animal_taxon_name = c.animal_taxon_name);"
+            )
+
+    def done(self) -> Set[str]:
+        """Species already moved into the live table."""
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(f"SELECT animal_taxon_name FROM public.{DONE_TABLE};")
+            return {r[0] for r in cur.fetchall()}
+
+    # ---------- Pages (worker threads) ----------
+    def _thread_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = psycopg2.connect(**DB_CONFIG)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def load_cursor(self, species: str) -> Optional[Dict]:
+        """Paging cursor saved with the species' last ingested page, or None."""
+        with self._thread_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"SELECT next_start, kept, seen, thin FROM public.{CURSOR_TABLE} WHERE animal_taxon_name = %s;",
+                (species,),
+            )
+            row = cur.fetchone()
+        return None if row is None else {"start": row[0], "kept": row[1], "seen": row[2], "thin": row[3]}
+
+    def copy_page(self, species: str, rows: List[List[str]], cursor: Dict) -> None:
+        """
+        COPY one page of OUTPUT_HEADER rows (kept columns only) into the ingest
+        table and save `cursor` in the same transaction.
+        """
+        out = []
+        for r in rows:
+            vals = [r[i] for i in self._pos]
+            out.append([
+                event_ms(v) if c == "eventDate"
+                else _to_float(v) if c in ("decimalLatitude", "decimalLongitude")
+                else (v if v != "" else None)
+                for c, v in zip(self.cols, vals)
+            ])
+        with self._thread_conn() as conn, conn.cursor() as cur:
+            if out:
+                copy_tuples(cur, f"public.{INGEST_TABLE}", self.cols, out)
+            cur.execute(
+                f"INSERT INTO public.{CURSOR_TABLE} (animal_taxon_name, next_start, kept, seen, thin) "
+                "VALUES (%s, %s, %s, %s, %s) ON CONFLICT (animal_taxon_name) DO UPDATE "
+                "SET next_start = EXCLUDED.next_start, kept = EXCLUDED.kept, seen = EXCLUDED.seen, "
+                "thin = EXCLUDED.thin;",
+                (species, cursor["start"], cursor["kept"], cursor["seen"], cursor.get("thin", "exact")),
+            )
+
+    # ---------- Species (main thread) ----------
+    def finish(self, species: str) -> int:
+        """Move a complete species into the live table and mark it done; returns its row count."""
+        cols_sql = ", ".join(f'"{c}"' for c in self.cols)
+        params = {"species": species, "key": canonical_key(species) or None}
+        key_col, key_val = (', "animal_key"', ", %(key)s") if self.has_key else ("", "")
+        # the key narrows the delete to the indexed rows of this taxon; the name keeps
+        # other spellings of it (their own species) untouched
+        by_key = "animal_key = %(key)s AND " if self.has_key and params["key"] else ""
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM public.{LIVE_TABLE} WHERE {by_key}animal_taxon_name = %(species)s;", params
+            )
+            cur.execute(
+                f"INSERT INTO public.{LIVE_TABLE} ({cols_sql}{key_col}) "
+                f"SELECT {cols_sql}{key_val} FROM public.{INGEST_TABLE} WHERE animal_taxon_name = %(species)s;",
+                params,
+            )
+            n = cur.rowcount
+            cur.execute(f"DELETE FROM public.{INGEST_TABLE} WHERE animal_taxon_name = %s;", (species,))
+            cur.execute(f"DELETE FROM public.{CURSOR_TABLE} WHERE animal_taxon_name = %s;", (species,))
+            cur.execute(
+                f"INSERT INTO public.{DONE_TABLE} (animal_taxon_name, row_count) VALUES (%s, %s) "
+                "ON CONFLICT (animal_taxon_name) DO UPDATE "
+                "SET row_count = EXCLUDED.row_count, finished_at = now();",
+                (species, n),
+            )
+        return n
+
+    def close(self) -> None:
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(f"ANALYZE public.{LIVE_TABLE};")
+        self.conn.close()
+        for conn in self._conns:
+            conn.close()
+
+    def __enter__(self) -> "PgOccurrenceSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
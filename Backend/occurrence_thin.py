@@ -0,0 +1,184 @@
+# occurrence_thin.py
+# Purpose: per-species dedupe / spatial thinning for alalocation.py.
+# - THIN_MODE=exact (default): drop points whose 6-decimal lat/lon was already kept
+# - THIN_MODE=grid: keep ONE point per THIN_CELL_M-metre grid cell per species
+#   (and per year of eventDate with THIN_BY_YEAR=1) — dense city clusters
+#   collapse to one point per cell, sparse areas keep what they have
+# - Keys are single 64-bit ints, kept in a set or, with THIN_BLOOM_BITS > 0, in
+#   a fixed-size Bloom filter (constant memory; a false positive drops a point
+#   that was actually new, at the rate printed with the stats)
+# - The seen-state packs into a string for alalocation's per-page cursor; a
+#   packed Bloom filter carries its bits / hashes and only unpacks under the
+#   same THIN_BLOOM_* settings (signature() names them too)
+# - ThinStats counts kept / dropped points over the whole run
+
+import base64
+import hashlib
+import math
+import os
+import sys
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set, Union
+
+# ---------------------------- Config ----------------------------
+THIN_MODE = os.getenv("THIN_MODE", "exact").lower()            # exact | grid
+THIN_CELL_M = float(os.getenv("THIN_CELL_M", "1000"))         # grid cell edge, metres
+THIN_BY_YEAR = os.getenv("THIN_BY_YEAR", "1") == "1"          # grid: one point per cell per year
+THIN_BLOOM_BITS = int(os.getenv("THIN_BLOOM_BITS", "0"))      # 0 = exact set; e.g. 1048576 (128 KiB)
+THIN_BLOOM_HASHES = int(os.getenv("THIN_BLOOM_HASHES", "7"))
+
+if THIN_MODE not in ("exact", "grid"):
+    raise SystemExit(f"THIN_MODE must be exact or grid, got {THIN_MODE!r}")
+if THIN_CELL_M < 1:
+    raise SystemExit("THIN_CELL_M must be at least 1 metre")
+
+M_PER_DEG = 111_320.0   # metres per degree of latitude (and of longitude at the equator)
+
+# ---------------------------- Keys ----------------------------
+def coord_key(lat_s: str, lon_s: str) -> int:
+    """Normalized lat/lon as one 64-bit int (two 32-bit microdegree halves)."""
+    lat_u = round(float(lat_s) * 1_000_000) & 0xFFFFFFFF
+    lon_u = round(float(lon_s) * 1_000_000) & 0xFFFFFFFF
+    return (lat_u << 32) | lon_u
+
+def event_year(value) -> int:
+    """Year of an eventDate (epoch ms or ISO text); 0 if unknown."""
+    if value is None or value == "":
+        return 0
+    text = str(value).strip()
+    if len(text) > 4 and text.lstrip("-").replace(".", "", 1).isdigit():
+        try:
+            return datetime.fromtimestamp(float(text) / 1000, tz=timezone.utc).year
+        except (OverflowError, OSError, ValueError):
+            return 0
+    return int(text[:4]) if text[:4].isdigit() else 0
+
+def cell_key(lat: float, lon: float, year: int = 0) -> int:
+    """
+    Grid cell of a point as one int: 12 bits year | 25 bits row | 26 bits column.
+    Rows are THIN_CELL_M of latitude; columns are THIN_CELL_M of longitude at the
+    row's centre latitude, so cells stay roughly square away from the equator.
+    """
+    lat = min(max(lat, -90.0), 90.0)
+    row = int((lat + 90.0) * M_PER_DEG // THIN_CELL_M)
+    centre = (row + 0.5) * THIN_CELL_M / M_PER_DEG - 90.0
+    m_per_deg_lon = M_PER_DEG * max(math.cos(math.radians(centre)), 1e-6)
+    col = int(((lon + 180.0) % 360.0) * m_per_deg_lon // THIN_CELL_M)
+    yr = min(max(year - 1600, 0), 0xFFF) if year else 0
+    return (yr << 51) | ((row & 0x1FFFFFF) << 26) | (col & 0x3FFFFFF)
+
+def point_key(lat_s: str, lon_s: str, event_date) -> int:
+    """Dedupe key of a point under THIN_MODE."""
+    if THIN_MODE == "exact":
+        return coord_key(lat_s, lon_s)
+    year = event_year(event_date) if THIN_BY_YEAR else 0
+    return cell_key(float(lat_s), float(lon_s), year)
+
+# ---------------------------- Seen-state ----------------------------
+class BloomFilter:
+    """Fixed-size set of int keys: no false negatives, false positives possible."""
+
+    def __init__(self, bits: int, hashes: int, data: Optional[bytes] = None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: int):
+        d = hashlib.blake2b(key.to_bytes(8, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.data[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: int) -> None:
+        for p in self._positions(key):
+            self.data[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+Seen = Union[Set[int], BloomFilter]
+
+def new_seen() -> Seen:
+    return BloomFilter(THIN_BLOOM_BITS, THIN_BLOOM_HASHES) if THIN_BLOOM_BITS > 0 else set()
+
+def signature() -> str:
+    """Settings a saved seen-state is only valid under."""
+    sig = "exact" if THIN_MODE == "exact" else f"grid:{THIN_CELL_M:g}:{'year' if THIN_BY_YEAR else 'all'}"
+    if THIN_BLOOM_BITS > 0:
+        sig += f":bloom:{THIN_BLOOM_BITS}x{THIN_BLOOM_HASHES}"
+    return sig
+
+def pack_seen(seen: Seen) -> str:
+    """
+    Seen-state as text: 'bloom:<bits>:<hashes>:<count>:' + base64 bits, or
+    base64 of little-endian uint64 keys.
+    """
+    if isinstance(seen, BloomFilter):
+        return (f"bloom:{seen.bits}:{seen.hashes}:{seen.count}:"
+                + base64.b64encode(bytes(seen.data)).decode("ascii"))
+    a = array("Q", sorted(seen))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return base64.b64encode(a.tobytes()).decode("ascii")
+
+def unpack_seen(packed: str) -> Seen:
+    """
+    Inverse of pack_seen. Raises ValueError when the state was packed under other
+    THIN_BLOOM_BITS / THIN_BLOOM_HASHES (its bit positions would mean nothing).
+    """
+    if packed.startswith("bloom:"):  # ':' never occurs in base64
+        parts = packed.split(":")
+        if len(parts) != 5:
+            raise ValueError("packed Bloom filter without its bits / hashes (older format)")
+        bits, hashes, count = int(parts[1]), int(parts[2]), int(parts[3])
+        if (bits, hashes) != (THIN_BLOOM_BITS, THIN_BLOOM_HASHES):
+            raise ValueError(f"packed Bloom filter has {bits} bits x {hashes} hashes, "
+                             f"THIN_BLOOM_BITS / THIN_BLOOM_HASHES are {THIN_BLOOM_BITS} x {THIN_BLOOM_HASHES}")
+        bloom = BloomFilter(bits, hashes, base64.b64decode(parts[4]))
+        bloom.count = count
+        return bloom
+    if THIN_BLOOM_BITS > 0:
+        raise ValueError("packed key set, but THIN_BLOOM_BITS asks for a Bloom filter")
+    a = array("Q")
+    a.frombytes(base64.b64decode(packed))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return set(a)
+
+# ---------------------------- Stats ----------------------------
+class ThinStats:
+    """Run totals, shared by the worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"kept": 0, "dropped_dup": 0, "dropped_nocoord": 0, "dropped_cap": 0}
+        self.max_fp = 0.0
+
+    def add(self, kept: int, dup: int, nocoord: int, cap: int, seen: Seen) -> None:
+        with self._lock:
+            self.counts["kept"] += kept
+            self.counts["dropped_dup"] += dup
+            self.counts["dropped_nocoord"] += nocoord
+            self.counts["dropped_cap"] += cap
+            if isinstance(seen, BloomFilter):
+                self.max_fp = max(self.max_fp, seen.false_positive_rate())
+
+    def report(self) -> None:
+        c = self.counts
+        seen_total = sum(c.values())
+        pct = c["kept"] / seen_total * 100 if seen_total else 0.0
+        label = "duplicate coord" if THIN_MODE == "exact" else "same cell"
+        print(f"[thin] mode={signature()} | kept {c['kept']} of {seen_total} ({pct:.1f}%) | "
+              f"dropped: {label} {c['dropped_dup']}, no coords {c['dropped_nocoord']}, "
+              f"over cap {c['dropped_cap']}"
+              + (f" | bloom {THIN_BLOOM_BITS} bits, worst false-positive rate {self.max_fp:.2e}"
+                 if THIN_BLOOM_BITS > 0 else ""))
+
+STATS = ThinStats()
@@ -0,0 +1,194 @@
+# pg_loader.py
+# Purpose: shared helpers for the loader scripts that rebuild whole tables.
+# - Each table is built as public.<table>__staging (load, indexes, ANALYZE)
+# - The staging tables are swapped in with ALTER TABLE ... RENAME inside one
+#   short transaction, so API readers only ever wait for the rename itself
+# - lock_timeout keeps the swap from queueing behind long reads (a queued
+#   ACCESS EXCLUSIVE lock would block new readers); the swap is retried instead
+# - The live tables are dropped without CASCADE: a view or foreign key outside
+#   the swapped set that depends on one makes the swap fail and names it,
+#   instead of being dropped silently
+# - Incremental mode: tables with a row_hash column are diffed against the CSV
+#   by natural key and only inserts/updates/deletes are applied; swap_in can
+#   run them in the swap transaction, so they go live with the swapped tables
+
+import csv
+import hashlib
+import io
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2 import errors
+
+# ---------- Configuration ----------
+STAGING_SUFFIX = "__staging"
+HASH_COL = "row_hash"
+SWAP_LOCK_TIMEOUT_MS = int(os.getenv("SWAP_LOCK_TIMEOUT_MS", "2000"))
+SWAP_RETRIES = int(os.getenv("SWAP_RETRIES", "5"))
+
+# ---------- Staging ----------
+def staging_name(table: str) -> str:
+    """Name of the staging table that is built before being swapped in."""
+    return f"{table}{STAGING_SUFFIX}"
+
+def drop_staging(cur, table: str) -> None:
+    """Remove a leftover staging table from an earlier failed run."""
+    cur.execute(f"DROP TABLE IF EXISTS public.{staging_name(table)} CASCADE;")
+
+def analyze_staging(cur, table: str) -> None:
+    """Refresh planner statistics on the staging table before it goes live."""
+    cur.execute(f"ANALYZE public.{staging_name(table)};")
+
+# ---------- Swap ----------
+def _rename_dependents(cur, table: str) -> None:
+    """Rename indexes, sequences and constraints still carrying the staging prefix."""
+    prefix = staging_name(table)
+    cur.execute(
+        """
+        SELECT c.relname, c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('i', 'S')
+          AND left(c.relname, %s) = %s
+        """,
+        (len(prefix), prefix),
+    )
+    for name, kind in cur.fetchall():
+        kw = "INDEX" if kind == "i" else "SEQUENCE"
+        cur.execute(f'ALTER {kw} public."{name}" RENAME TO "{table}{name[len(prefix):]}";')
+
+    # index-backed constraints were renamed with their index above
+    cur.execute(
+        """
+        SELECT conname
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass
+          AND contype NOT IN ('p', 'u', 'x')
+          AND left(conname, %s) = %s
+        """,
+        (f"public.{table}", len(prefix), prefix),
+    )
+    for (name,) in cur.fetchall():
+        cur.execute(
+            f'ALTER TABLE public.{table} RENAME CONSTRAINT "{name}" TO "{table}{name[len(prefix):]}";'
+        )
+
+def swap_in(conn, tables: List[str], apply: Optional[Callable[[], None]] = None) -> None:
+    """
+    Replace every live table in `tables` with its staging table in ONE transaction.
+    `apply` (e.g. incremental upserts on other tables) runs first in that same
+    transaction, and again on every retry.
+    All changes become visible together; on lock timeout the swap is retried.
+    Fails (SystemExit, nothing swapped or applied) if other objects depend on a live table.
+    """
+    for attempt in range(1, SWAP_RETRIES + 1):
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT_MS}ms';")
+                    if apply is not None:
+                        apply()
+                    if tables:
+                        # one statement, so foreign keys between the swapped tables do not block it
+                        cur.execute(f"DROP TABLE IF EXISTS {', '.join(f'public.{t}' for t in tables)};")
+                    for t in tables:
+                        cur.execute(f"ALTER TABLE public.{staging_name(t)} RENAME TO {t};")
+                        _rename_dependents(cur, t)
+            if tables:
+                print(f"[swap] live -> {', '.join(tables)}")
+            return
+        except errors.LockNotAvailable:
+            wait = 0.5 * attempt
+            print(f"[swap] lock timeout ({attempt}/{SWAP_RETRIES}), retry in {wait:.1f}s")
+            time.sleep(wait)
+        except errors.DependentObjectsStillExist as e:
+            raise SystemExit(
+                f"Could not swap in {tables}: other objects depend on the live table(s) "
+                f"and would be dropped with them:\n{e.diag.message_detail}\n"
+                f"Drop them before the load and recreate them after it."
+            )
+    raise SystemExit(f"Could not swap in {tables}: readers kept the tables locked")
+
+# ---------- Incremental upsert ----------
+def row_hash(values: Sequence[Any]) -> str:
+    """Stable content hash of one row; NULL and empty string hash differently."""
+    h = hashlib.sha1()
+    for v in values:
+        h.update(b"\x00" if v is None else b"\x01" + str(v).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+def has_columns(cur, table: str, cols: List[str]) -> bool:
+    """True if public.<table> exists and has every column in `cols`."""
+    cur.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        """,
+        (table,),
+    )
+    have = {r[0] for r in cur.fetchall()}
+    return bool(have) and set(cols) <= have
+
+def copy_tuples(cur, table: str, cols: List[str], rows: Iterable[Sequence[Any]]) -> None:
+    """COPY one in-memory batch of already-cast rows (None -> NULL) into `table`."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    buf.seek(0)
+    cols_sql = ", ".join(f'"{c}"' for c in cols)
+    cur.copy_expert(f"COPY {table} ({cols_sql}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def upsert_changed(conn, table: str, key_cols: List[str], cols: List[str],
+                   rows: Iterable[Sequence[Any]]) -> Dict[str, int]:
+    """
+    Diff `rows` (values in `cols` order, already cast) against public.<table>
+    by natural key + row_hash and apply only the changes, inside the caller's
+    transaction (several tables can share it). Returns inserted/updated/deleted/unchanged counts.
+    """
+    key_pos = [cols.index(k) for k in key_cols]
+    with conn.cursor() as cur:
+        keys_sql = ", ".join(f'"{k}"' for k in key_cols)
+        cur.execute(f'SELECT {keys_sql}, {HASH_COL} FROM public.{table}')
+        existing: Dict[Tuple, str] = {tuple(r[:-1]): r[-1] for r in cur.fetchall()}
+
+        incoming: Dict[Tuple, Tuple[Sequence[Any], str]] = {}
+        for r in rows:
+            incoming[tuple(r[i] for i in key_pos)] = (r, row_hash(r))  # last duplicate wins
+
+        changed, stats = [], {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        for key, (r, h) in incoming.items():
+            old = existing.get(key)
+            if old == h:
+                stats["unchanged"] += 1
+                continue
+            stats["inserted" if old is None else "updated"] += 1
+            changed.append(list(r) + [h])
+        deleted = [k for k in existing if k not in incoming]
+        stats["deleted"] = len(deleted)
+
+        if changed:
+            cur.execute(f"CREATE TEMP TABLE _upsert (LIKE public.{table} INCLUDING DEFAULTS) ON COMMIT DROP;")
+            copy_tuples(cur, "_upsert", cols + [HASH_COL], changed)
+            all_cols = ", ".join(f'"{c}"' for c in cols + [HASH_COL])
+            set_sql = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in cols + [HASH_COL] if c not in key_cols)
+            cur.execute(
+                f"INSERT INTO public.{table} ({all_cols}) SELECT {all_cols} FROM _upsert "
+                f"ON CONFLICT ({keys_sql}) DO UPDATE SET {set_sql};"
+            )
+            cur.execute("DROP TABLE _upsert;")
+
+        if deleted:
+            cur.execute(
+                f"CREATE TEMP TABLE _delete ON COMMIT DROP AS "
+                f"SELECT {keys_sql} FROM public.{table} WITH NO DATA;"
+            )
+            copy_tuples(cur, "_delete", key_cols, deleted)
+            match = " AND ".join(f't."{k}" = d."{k}"' for k in key_cols)
+            cur.execute(f"DELETE FROM public.{table} t USING _delete d WHERE {match};")
+            cur.execute("DROP TABLE _delete;")
+
+        if changed or deleted:
+            cur.execute(f"ANALYZE public.{table};")
+    return stats
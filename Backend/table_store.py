@@ -0,0 +1,207 @@
+# table_store.py
+# Purpose: one read/write layer for the intermediate tables of the cleaning pipeline
+# (ala.py -> aladatacleaning.py -> clean_observations.py -> alacleanspieces.py).
+# - Tables are addressed by name ("filtered_merged"); the file is <name>.parquet
+#   or <name>.csv depending on PIPELINE_FORMAT (parquet | csv)
+# - Parquet keeps dtypes, so nothing is re-inferred or re-parsed between stages,
+#   and read_frame(name, columns) only decodes the requested columns;
+#   read_frame(..., categorical=True) keeps repeated text as categoricals
+# - SCHEMAS pins column types on write (and on CSV read) so every stage sees the
+#   same dtypes whichever format is on disk
+# - Reads fall back to the other format, so existing CSVs keep working
+# - CSV stays the format at the boundary: alacleanspieces.py exports the CSVs
+#   that load_to_pg.py reads
+# - iter_frames / FrameWriter stream a table chunk by chunk in bounded memory;
+#   every write goes to a temp file that is renamed into place on success
+
+import csv
+import os
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet needs pyarrow; fall back to CSV without it
+    pa = pq = None
+
+# ---------- Configuration ----------
+PIPELINE_FORMAT = os.getenv("PIPELINE_FORMAT", "parquet").lower()
+if PIPELINE_FORMAT == "parquet" and pq is None:
+    print("[table_store] pyarrow not installed, using CSV intermediates")
+    PIPELINE_FORMAT = "csv"
+if PIPELINE_FORMAT not in ("parquet", "csv"):
+    raise SystemExit(f"PIPELINE_FORMAT must be parquet or csv, got {PIPELINE_FORMAT!r}")
+
+# ---------- Schemas ----------
+# text: str with NaN for missing; float: float64. Columns not listed keep the
+# dtype pandas gives them.
+_NAMES = {
+    "plant_scientific_name": "text",
+    "animal_taxon_name": "text",
+    "animal_taxon_name_x": "text",
+    "animal_taxon_name_y": "text",
+    "interaction_type_raw": "text",
+}
+_TAXONOMY = {c: "text" for c in [
+    "Species", "Scientific Name Authorship", "Taxon Rank", "Kingdom", "Phylum",
+    "Class", "Order", "Family", "Genus", "Vernacular Name",
+]}
+
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    "filtered_merged": {**_NAMES, **_TAXONOMY},
+    "relationship_dataset": dict(_NAMES),
+    "species_information_dataset": {
+        "animal_taxon_name": "text", **_TAXONOMY,
+        "Victoria : Conservation Status": "text",
+        "EPBC Act Threatened Species": "text",
+        "Weeds of National Significance (WoNS) as at Feb. 2013": "text",
+        "VIC State Notifiable Pests": "text",
+        "image_url": "text",
+        "summary": "text",
+    },
+    "species_occurrences_cleaned": {
+        "animal_taxon_name": "text",
+        "decimalLatitude": "float",
+        "decimalLongitude": "float",
+        "eventDate": "float",   # epoch ms; float64 as blanks are NaN (load_to_pg makes it BIGINT)
+    },
+}
+
+# ---------- Paths ----------
+def frame_path(name: str, fmt: Optional[str] = None) -> str:
+    """File that write_frame(name) produces in the configured format."""
+    return f"{name}.{fmt or PIPELINE_FORMAT}"
+
+def existing_path(name: str) -> str:
+    """File to read for `name`: the configured format first, else the other one."""
+    other = "csv" if PIPELINE_FORMAT == "parquet" else "parquet"
+    for fmt in (PIPELINE_FORMAT, other):
+        p = frame_path(name, fmt)
+        if os.path.exists(p) and (fmt == "csv" or pq is not None):
+            return p
+    raise FileNotFoundError(f"No {frame_path(name)} (or {frame_path(name, other)}) found")
+
+# ---------- Read ----------
+def frame_columns(name: str) -> List[str]:
+    """Column names of a stored table without loading its rows."""
+    path = existing_path(name)
+    if path.endswith(".parquet"):
+        return [c for c in pq.read_schema(path).names if not c.startswith("__index_level_")]
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+def read_frame(name: str, columns: Optional[List[str]] = None, categorical: bool = False) -> pd.DataFrame:
+    """
+    Load a stored table. `columns` is pushed down to the reader (parquet column
+    projection / read_csv usecols); every requested column must exist.
+    categorical=True loads the schema's text columns as pandas categoricals
+    (each distinct string stored once, rows hold integer codes).
+    """
+    path = existing_path(name)
+    schema = SCHEMAS.get(name, {})
+    text = [c for c, kind in schema.items() if kind == "text" and (columns is None or c in columns)]
+    if path.endswith(".parquet"):
+        if categorical:
+            present = set(pq.read_schema(path).names)
+            table = pq.read_table(path, columns=columns, read_dictionary=[c for c in text if c in present])
+            return table.to_pandas()
+        return _none_to_nan(pd.read_parquet(path, columns=columns), name)
+    dtypes = {c: (str if kind == "text" else "float64") for c, kind in schema.items()}
+    if categorical:
+        dtypes.update({c: "category" for c in text})
+    return pd.read_csv(path, usecols=columns, dtype=dtypes)
+
+def iter_frames(name: str, chunk_rows: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield a stored table in chunks of at most `chunk_rows` rows. CSV chunks are
+    read as text (missing -> NaN): per-chunk type inference could give the same
+    column int in one chunk and float in the next, changing how it is written.
+    """
+    path = existing_path(name)
+    if path.endswith(".parquet"):
+        # pre_buffer keeps every row group read so far cached: memory would grow with the file
+        pf = pq.ParquetFile(path, pre_buffer=False)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _none_to_nan(batch.to_pandas(), name)
+        return
+    yield from pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunk_rows)
+
+def _none_to_nan(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    for col, kind in SCHEMAS.get(name, {}).items():
+        if kind == "text" and col in df.columns and df[col].dtype == object:
+            df[col] = df[col].where(df[col].notna(), float("nan"))  # None -> NaN, as read_csv
+    return df
+
+# ---------- Write ----------
+def _apply_schema(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    schema = SCHEMAS.get(name, {})
+    cols = [c for c in schema if c in df.columns]
+    if not cols:
+        return df
+    df = df.copy()
+    for col in cols:
+        if schema[col] == "float":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        else:
+            s = df[col]
+            df[col] = s.where(s.isna(), s.astype(str))  # keep NaN, stringify the rest
+    return df
+
+class FrameWriter:
+    """
+    Append DataFrame chunks to a .parquet or .csv file through <path>.tmp.
+    Used as a context manager: the temp file replaces `path` only if the block
+    exits cleanly, so a crash mid-write leaves the previous file untouched.
+    With `table`, every chunk gets that table's SCHEMAS (as write_frame does).
+    """
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None, table: Optional[str] = None):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.columns = columns  # header of the empty table written if no chunk arrives
+        self.table = table
+        self.rows = 0
+        self._started = False
+        self._csv = None
+        self._pq = None
+
+    def __enter__(self) -> "FrameWriter":
+        if not self.path.endswith(".parquet"):
+            self._csv = open(self.tmp, "w", encoding="utf-8", newline="")
+        return self
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.table is not None:
+            df = _apply_schema(df, self.table)
+        if self._csv is not None:
+            df.to_csv(self._csv, index=False, header=not self._started)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=False,
+                                         schema=self._pq.schema if self._pq else None)
+            if self._pq is None:
+                self._pq = pq.ParquetWriter(self.tmp, table.schema)
+            self._pq.write_table(table)
+        self._started = True
+        self.rows += len(df)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None and not self._started:
+            self.write(pd.DataFrame(columns=self.columns or []))
+        if self._csv is not None:
+            self._csv.close()
+        if self._pq is not None:
+            self._pq.close()
+        if exc_type is not None:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+            return
+        os.replace(self.tmp, self.path)
+
+def write_frame(df: pd.DataFrame, name: str) -> str:
+    """Write `df` as <name>.<PIPELINE_FORMAT> (temp file + rename); returns the path."""
+    path = frame_path(name)
+    with FrameWriter(path) as w:
+        w.write(_apply_schema(df, name))
+    return path
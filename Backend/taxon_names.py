@@ -0,0 +1,211 @@
+# taxon_names.py
+# Purpose: one definition of "the same taxon name" for the whole pipeline.
+# - clean_name(): display form: whitespace collapsed and trimmed, case kept
+# - canonical_key(): match form: lowercase, single spaces, authorship
+#   ("(Linnaeus, 1758)", "Labill.", "A.Cunn. ex Benth."), rank markers
+#   (subsp., var., f., cv., sp., spp., cf., aff.) and subgenus parentheses
+#   removed. "Apis  mellifera Linnaeus, 1758", "Apis Mellifera" and
+#   "apis mellifera" share the key "apis mellifera": the word after the genus
+#   (or a rank marker) is the epithet whatever its case, later capitalised
+#   words start the authorship. Results are LRU-cached.
+# - canonical_keys(): the same for a pandas Series, computed once per distinct value
+# - Synonym cache: resolutions from GloBI (/find preferredName) and ALA
+#   (species guid) are stored per (source, canonical key) in memory and in a
+#   SQLite file (TAXON_CACHE_PATH), so a name is resolved once across runs
+#   however it is spelled
+# - Key columns: the loaders store KEY_COLUMNS (plant_key, animal_key) next to
+#   the name columns, indexed; name_key() gives the APIs that column (or
+#   lower(name) on a table loaded before the key columns existed), name_keys()
+#   does the same for tables joined on it, all of them the same way
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ---------- Configuration ----------
+TAXON_CACHE_PATH = os.getenv("TAXON_CACHE_PATH", "taxon_names.sqlite")
+TAXON_CACHE_TTL_DAYS = float(os.getenv("TAXON_CACHE_TTL_DAYS", "90"))
+KEY_LRU_SIZE = 1 << 16
+
+# key column -> name column it is derived from
+KEY_COLUMNS: Dict[str, str] = {
+    "plant_key": "plant_scientific_name",
+    "animal_key": "animal_taxon_name",
+}
+NAME_TO_KEY = {name: key for key, name in KEY_COLUMNS.items()}
+
+# tokens that are dropped but do not end the name
+RANK_MARKERS = {
+    "subsp.", "subsp", "ssp.", "ssp", "var.", "var", "f.", "forma", "cv.", "cv",
+    "sp.", "sp", "spp.", "spp", "cf.", "cf", "aff.", "aff", "nr.", "agg.", "s.l.", "s.s.",
+}
+# lowercase words that start an author citation ("de Vriese", "van Steenis")
+AUTHOR_PARTICLES = {"ex", "et", "&", "in", "de", "van", "von", "der", "du", "la", "le", "d'"}
+HYBRID_MARKERS = {"x", "×"}
+
+_SPACE_RE = re.compile(r"\s+")
+_PAREN_RE = re.compile(r"\([^()]*\)")
+_EDGE_PUNCT = ",;:"
+
+# ---------- Names ----------
+def clean_name(name):
+    """Collapse inner whitespace and trim; keeps case. Non-strings are returned as is."""
+    if not isinstance(name, str):
+        return name
+    return _SPACE_RE.sub(" ", name).strip()
+
+
+def _is_epithet_slot_word(tok: str, raw: str, nxt: str) -> bool:
+    """A word right after the genus / a rank marker, in any case ("Apis Mellifera")."""
+    return (tok.replace("-", "").isalpha() and not raw.endswith(",")
+            and not (nxt[:4].isdigit()) and tok.lower() not in AUTHOR_PARTICLES)
+
+
+@lru_cache(maxsize=KEY_LRU_SIZE)
+def _key(name: str) -> str:
+    text = _PAREN_RE.sub(" ", unicodedata.normalize("NFKC", name))
+    raw = [t for t in text.split() if t.strip(_EDGE_PUNCT)]
+    tokens = [t.strip(_EDGE_PUNCT) for t in raw]
+    if not tokens:
+        return ""
+    kept, in_author, slot = [tokens[0]], False, True
+    for i in range(1, len(tokens)):
+        tok, low = tokens[i], tokens[i].lower()
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if low in RANK_MARKERS:
+            in_author, slot = False, True   # "Solanum lycopersicum L. var. cerasiforme"
+            continue
+        if in_author:
+            continue
+        if low in HYBRID_MARKERS:
+            kept.append("×")
+            continue
+        if slot and _is_epithet_slot_word(tok, raw[i], nxt):
+            kept.append(tok)
+        elif tok[0].islower() and low not in AUTHOR_PARTICLES:
+            kept.append(tok)
+        else:
+            in_author = True    # capitalised word, year or particle: authorship
+        slot = False
+    return " ".join(kept).lower()
+
+
+def canonical_key(name) -> str:
+    """Match key of a taxon name ("" for missing / blank names)."""
+    if not isinstance(name, str):
+        return ""
+    return _key(name)
+
+
+def canonical_keys(names: pd.Series) -> pd.Series:
+    """canonical_key() of every row, computed once per distinct value."""
+    codes, uniques = pd.factorize(names)
+    keys = np.array([canonical_key(u) for u in uniques] + [""], dtype=object)  # slot -1: missing
+    return pd.Series(keys[codes], index=names.index, name=names.name)
+
+# ---------- Synonym cache ----------
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS synonyms (
+    source     TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    resolved   TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (source, key)
+);
+"""
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_memory: Dict[Tuple[str, str], str] = {}
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(TAXON_CACHE_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")   # several fetchers may share the file
+        _conn.execute(SCHEMA_SQL)
+        _conn.commit()
+    return _conn
+
+
+def lookup(source: str, name: str) -> Optional[str]:
+    """Cached resolution of `name` from `source` ("globi", "ala"), or None."""
+    key = canonical_key(name)
+    if not key:
+        return None
+    with _lock:
+        hit = _memory.get((source, key))
+        if hit is not None:
+            return hit
+        row = _db().execute(
+            "SELECT resolved, fetched_at FROM synonyms WHERE source = ? AND key = ?", (source, key)
+        ).fetchone()
+        if row is None or time.time() - row[1] > TAXON_CACHE_TTL_DAYS * 86400:
+            return None
+        _memory[(source, key)] = row[0]
+        return row[0]
+
+
+def remember(source: str, name: str, resolved: str) -> None:
+    """Store a resolution (memory + disk); blank names or answers are not stored."""
+    key = canonical_key(name)
+    if not key or not resolved:
+        return
+    with _lock:
+        _memory[(source, key)] = resolved
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO synonyms (source, key, resolved, fetched_at) VALUES (?, ?, ?, ?)",
+            (source, key, resolved, time.time()),
+        )
+        conn.commit()
+
+
+def resolve(source: str, name: str, fetch: Callable[[str], Optional[str]]) -> Optional[str]:
+    """
+    Cached resolution of `name`, else fetch(name) (stored when it returns a
+    value). Exceptions from fetch propagate and nothing is stored.
+    """
+    hit = lookup(source, name)
+    if hit is not None:
+        return hit
+    resolved = fetch(name)
+    if resolved:
+        remember(source, name, resolved)
+    return resolved
+
+# ---------- SQL ----------
+def name_key(table, name_col: str) -> Tuple[object, Callable[[str], str]]:
+    """
+    (column expression, key function) for exact-match lookups on a name
+    column: the precomputed key column with canonical_key, or lower(name)
+    with str.lower on a table loaded before the key columns existed.
+    """
+    (expr,), to_key = name_keys((table, name_col))
+    return expr, to_key
+
+def name_keys(*columns: Tuple[object, str]) -> Tuple[List[object], Callable[[str], str]]:
+    """
+    name_key() for (table, name column) pairs that are joined with each other,
+    resolved together: all on their key columns, or all on lower(name) if any
+    table lacks its key column, so a join never compares a key with a lowered
+    name (which matches almost nothing).
+    """
+    missing = [f"{t.name}.{NAME_TO_KEY.get(c) or c + ' key'}" for t, c in columns
+               if NAME_TO_KEY.get(c) is None or NAME_TO_KEY[c] not in t.c]
+    if not missing:
+        return [t.c[NAME_TO_KEY[c]] for t, c in columns], canonical_key
+    from sqlalchemy import func
+    if len(columns) > 1:
+        print(f"[taxon_names] no {', '.join(missing)} (run load_to_pg.py): matching "
+              f"{', '.join(f'{t.name}.{c}' for t, c in columns)} on lower(name)")
+    return [func.lower(t.c[c]) for t, c in columns], lambda v: (v or "").lower()
@@ -0,0 +1,101 @@
+# conftest.py
+# Purpose: shared setup for the Backend tests (run from Backend/: python -m pytest tests)
+# - Backend/ goes on sys.path, so the scripts import as modules
+# - Postgres tests run against a throwaway server from pgserver
+#   (pip install pgserver), started on first use. DB_* and DB_URL are pointed
+#   at it before any script is imported, so no test can reach a real database.
+#   Without pgserver the tests that take `pg` are skipped
+# - api_schema: the tables the iteration*_backend.py APIs reflect at import,
+#   with the columns the tests use
+
+import os
+import shutil
+import sys
+import tempfile
+
+import psycopg2
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# ---------- Throwaway Postgres ----------
+PGDATA = tempfile.mkdtemp(prefix="backend_tests_pg_")
+os.environ.update({
+    "DB_HOST": PGDATA,          # unix socket directory
+    "DB_PORT": "5432",
+    "DB_NAME": "postgres",
+    "DB_USER": "postgres",
+    "DB_PASSWORD": "",
+    "DB_URL": f"postgresql+psycopg2://postgres:@/postgres?host={PGDATA}",
+})
+DB_CONFIG = {"host": PGDATA, "port": 5432, "dbname": "postgres", "user": "postgres"}
+
+
+@pytest.fixture(scope="session")
+def pg():
+    """connect() for the throwaway server; the server is removed after the session."""
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip("pgserver not installed (pip install pgserver)")
+    server = pgserver.get_server(PGDATA, cleanup_mode="delete")
+    yield lambda: psycopg2.connect(**DB_CONFIG)
+    server.cleanup()
+    shutil.rmtree(PGDATA, ignore_errors=True)
+
+
+def reset_schema(connect) -> None:
+    """Drop every table: each test module starts from an empty public schema."""
+    conn = connect()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    conn.close()
+
+
+@pytest.fixture
+def db(pg):
+    """Empty public schema and an autocommit connection to it."""
+    reset_schema(pg)
+    conn = pg()
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+# ---------- API tables ----------
+API_SCHEMA = """
+CREATE TABLE epic3_companion_planting (
+  plant TEXT NOT NULL, neighbour TEXT NOT NULL, good_or_bad TEXT NOT NULL, why TEXT,
+  PRIMARY KEY (plant, neighbour));
+CREATE TABLE epic7_plants_overview (
+  plant_name TEXT PRIMARY KEY, type TEXT, sunshine TEXT, plant_spacing_cm INTEGER,
+  hardiness TEXT, seasons TEXT[]);
+CREATE TABLE community_gardens (
+  id INTEGER PRIMARY KEY, name TEXT, address TEXT, lat DOUBLE PRECISION, lng DOUBLE PRECISION);
+CREATE TABLE variety_details (
+  plant_name TEXT, variety TEXT, overview TEXT, image_url TEXT);
+CREATE TABLE sowing_plants (
+  plant_name TEXT, plant_url TEXT, image_url TEXT);
+CREATE TABLE species_information_dataset (
+  animal_taxon_name TEXT, animal_key TEXT, "Vernacular Name" TEXT, "Kingdom" TEXT,
+  "Phylum" TEXT, "Class" TEXT, "Order" TEXT, "Family" TEXT, "Genus" TEXT, image_url TEXT);
+CREATE TABLE relationship_dataset (
+  plant_scientific_name TEXT, animal_taxon_name TEXT, interaction_type_raw TEXT,
+  plant_key TEXT, animal_key TEXT);
+CREATE TABLE species_occurrences_cleaned (
+  animal_taxon_name TEXT, animal_key TEXT, "decimalLatitude" DOUBLE PRECISION,
+  "decimalLongitude" DOUBLE PRECISION, "eventDate" TIMESTAMP);
+"""
+
+
+@pytest.fixture(scope="module")
+def api_schema(pg):
+    """The reflected API tables, empty; yields connect()."""
+    reset_schema(pg)
+    conn = pg()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(API_SCHEMA)
+    conn.close()
+    return pg
@@ -0,0 +1,59 @@
+# test_alacleanspieces.py
+# alacleanspieces.py drops species rows by its rule, per row on the exact name,
+# and carries the drop into relationship / occurrences on
+# taxon_names.canonical_key: spelling / authorship variants of a dropped name go
+# too, unless a kept species has the same key.
+
+import pandas as pd
+import pytest
+
+import alacleanspieces
+import table_store
+
+WEEDS = "Weeds of National Significance (WoNS) as at Feb. 2013"
+PESTS = "VIC State Notifiable Pests"
+
+# (animal_taxon_name, Kingdom, weeds flag, pests flag)
+SPECIES = [
+    ("Puccinia graminis Pers.", "Fungi", "", ""),           # dropped
+    ("Lavandula", "Plantae", "", ""),                       # dropped
+    ("Lavandula angustifolia", "Plantae", "Yes", ""),       # flagged: kept
+    ("Apis mellifera Linnaeus, 1758", "Animalia", "", ""),
+    ("Lavandula 'Hidcote'", "Animalia", "", ""),            # same key as Lavandula, but an animal: kept
+    ("Cuscuta campestris Yunck.", "Plantae", "", ""),       # dropped
+    ("Cuscuta campestris", "Plantae", "", "Yes"),           # same key, pest-flagged: kept
+]
+KEPT_SPECIES = ["Lavandula angustifolia", "Apis mellifera Linnaeus, 1758", "Lavandula 'Hidcote'",
+                "Cuscuta campestris"]
+OTHER_NAMES = ["Puccinia graminis", "puccinia  graminis", "Puccinia graminis Pers.",
+               "Puccinia graminis subsp. tritici", "Lavandula", "Lavandula angustifolia",
+               "Cuscuta campestris", "Apis mellifera", "Apis Mellifera", None]
+# only the Puccinia graminis spellings go: lavandula and cuscuta campestris are keys of kept species
+KEPT_OTHER = OTHER_NAMES[3:]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_drops_every_spelling_of_a_dropped_species(tmp_path, monkeypatch, fmt):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(table_store, "PIPELINE_FORMAT", fmt)
+    monkeypatch.setattr(alacleanspieces, "OBS_CHUNK_ROWS", 2)
+    table_store.write_frame(pd.DataFrame({
+        "animal_taxon_name": [s[0] for s in SPECIES],
+        "Kingdom": [s[1] for s in SPECIES],
+        WEEDS: [s[2] for s in SPECIES],
+        PESTS: [s[3] for s in SPECIES],
+    }), alacleanspieces.SPECIES)
+    table_store.write_frame(pd.DataFrame({"plant_scientific_name": "Rosa", "animal_taxon_name": OTHER_NAMES}),
+                            alacleanspieces.REL)
+    table_store.write_frame(pd.DataFrame({"animal_taxon_name": OTHER_NAMES,
+                                          "decimalLatitude": -37.8, "decimalLongitude": 144.9}),
+                            alacleanspieces.OBS)
+
+    alacleanspieces.main()
+
+    def names(path):
+        return pd.read_csv(path)["animal_taxon_name"].replace({float("nan"): None}).tolist()
+
+    assert names(alacleanspieces.SPECIES_CSV) == KEPT_SPECIES
+    assert names(alacleanspieces.REL_CSV) == KEPT_OTHER
+    assert names(alacleanspieces.OBS_CSV) == KEPT_OTHER
@@ -0,0 +1,106 @@
+# test_alalocation_resume.py
+# alalocation.py (CSV sink) against mock_sources.py: runs SIGKILLed right after
+# a mid-species page was saved, resumed until done, must give the same
+# species_occurrences.csv as one uninterrupted run.
+
+import os
+import re
+import signal
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("uvicorn")
+import bench_fetchers as bench  # noqa: E402  (mock server helpers)
+import mock_sources  # noqa: E402
+
+SCRIPT = os.path.join(bench.HERE, "alalocation.py")
+# a page line of a species that has more pages to go: "... / est 4000 | start -> 1000"
+MID_SPECIES = re.compile(r"/ est (\d+) \| start -> (\d+)")
+
+
+@pytest.fixture(scope="module")
+def mock(monkeypatch_module):
+    monkeypatch_module.setenv("MOCK_LATENCY_MS", "30")
+    monkeypatch_module.setenv("MOCK_JITTER_MS", "20")
+    port = bench.free_port()
+    proc = bench.start_mock(port)
+    yield f"http://127.0.0.1:{port}"
+    proc.terminate()
+    proc.wait(timeout=10)
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    mp = pytest.MonkeyPatch()
+    yield mp
+    mp.undo()
+
+
+def species() -> list:
+    """12 names, several of them spanning many biocache pages."""
+    names = bench.species_names(400)
+    big = [n for n in names if mock_sources.occurrence_total(n) >= 1200][:6]
+    small = [n for n in names if 0 < mock_sources.occurrence_total(n) < 1200][:6]
+    return [n for pair in zip(big, small) for n in pair]
+
+
+def start(work, base):
+    env = {**os.environ, **bench.mock_env(base), "ALA_RATE": "100", "ALA_WORKERS": "4",
+           "FETCH_METRICS_FILE": ""}
+    return subprocess.Popen([sys.executable, SCRIPT], cwd=work, env=env, text=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+def run_to_end(work, base) -> str:
+    proc = start(work, base)
+    out, _ = proc.communicate(timeout=600)
+    assert proc.returncode == 0, out
+    return out
+
+
+def run_and_kill(work, base, after: int):
+    """Run until the `after`-th mid-species page line, then SIGKILL; (killed, output so far)."""
+    proc = start(work, base)
+    seen, lines = 0, []
+    for line in proc.stdout:
+        lines.append(line)
+        m = MID_SPECIES.search(line)
+        if m and int(m.group(2)) < int(m.group(1)):
+            seen += 1
+            if seen >= after:
+                proc.send_signal(signal.SIGKILL)
+                break
+    proc.wait(timeout=60)
+    return proc.returncode == -signal.SIGKILL, "".join(lines)
+
+
+def test_kill_and_resume_matches_uninterrupted_run(mock, tmp_path):
+    names = species()
+    ref, work = tmp_path / "ref", tmp_path / "resumed"
+    for d in (ref, work):
+        d.mkdir()
+        bench.write_input(d / "filtered_merged.csv", names)
+
+    run_to_end(ref, mock)
+
+    kills, logs = 0, []
+    for i in range(40):
+        killed, log = run_and_kill(work, mock, after=1 + i % 3)
+        logs.append(log)
+        if not killed:
+            break
+        kills += 1
+    logs.append(run_to_end(work, mock))    # finishes the rest, or finds nothing left to do
+
+    assert kills >= 3
+    assert sum(log.count("resuming at start") for log in logs) >= 3
+    expected = (ref / "species_occurrences.csv").read_bytes()
+    assert (work / "species_occurrences.csv").read_bytes() == expected
+    assert not any((work / "species_occurrences.pages").iterdir())
+
+    rows = expected.decode().splitlines()[1:]
+    keys = [tuple(r.split(",")[:3]) for r in rows]
+    assert len(keys) == len(set(keys))     # no coordinate twice within a species
+    assert {r.split(",")[0] for r in rows} == {n for n in names if mock_sources.occurrence_total(n)}
@@ -0,0 +1,52 @@
+# test_clean_observations.py
+# clean_observations.py streams species_occurrences.csv in chunks: the stored
+# table must equal the one-shot read (typed by the same schema), whatever the
+# chunk size, including a blank eventDate that only a late chunk has.
+
+import random
+
+import pandas as pd
+import pytest
+
+import clean_observations
+import table_store
+
+HEADER = ["animal_taxon_name", "decimalLatitude", "decimalLongitude", "eventDate", "occurrenceID",
+          "recordedBy", "locality", "stateProvince", "country", "dataResourceName", "basisOfRecord"]
+
+
+def write_source(path, rows: int = 200) -> None:
+    rnd = random.Random(3)
+    lines = [",".join(HEADER)]
+    for i in range(rows):
+        date = "" if i == rows - 1 else str(rnd.randint(946684800, 1735689600) * 1000)
+        lat = "abc" if i == 50 else f"-37.{rnd.randint(0, 999999):06d}"
+        name = "NA" if i == 7 else f"Apis species{i % 13}"
+        lines.append(f'{name},{lat},144.{i:04d},{date},id{i},"Smith, J",,VIC,AU,src,HUMAN_OBSERVATION')
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+@pytest.mark.parametrize("chunk_rows", [1, 64, 100000])
+def test_streamed_matches_one_shot_read(tmp_path, monkeypatch, fmt, chunk_rows):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(table_store, "PIPELINE_FORMAT", fmt)
+    monkeypatch.setattr(clean_observations, "OBS_CHUNK_ROWS", chunk_rows)
+    write_source(tmp_path / "species_occurrences.csv")
+
+    clean_observations.clean_observations()
+    got = table_store.read_frame(clean_observations.OUTPUT)
+
+    raw = pd.read_csv(tmp_path / "species_occurrences.csv", usecols=lambda c: c not in clean_observations.DROP_COLS)
+    expected = table_store._apply_schema(raw, clean_observations.OUTPUT)
+    pd.testing.assert_frame_equal(got, expected)
+    assert list(got.columns) == ["animal_taxon_name", "decimalLatitude", "decimalLongitude", "eventDate"]
+    assert got["eventDate"].isna().sum() == 1 and got["decimalLatitude"].isna().sum() == 1
+
+
+def test_header_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(table_store, "PIPELINE_FORMAT", "parquet")
+    (tmp_path / "species_occurrences.csv").write_text(",".join(HEADER) + "\n", encoding="utf-8")
+    clean_observations.clean_observations()
+    assert table_store.frame_columns(clean_observations.OUTPUT) == HEADER[:4]
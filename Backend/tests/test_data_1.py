@@ -0,0 +1,109 @@
+# test_data_1.py
+# data_1.py's vectorized cleaning and chunked variety read against the
+# original load (bench_data_1.per_cell_variety: default read_csv, per-cell
+# clean_plant_name / strip_learn_more), for several chunk sizes.
+# The text read changes three things on purpose, asserted explicitly below:
+# NA-like cells ("NA", ...) stay as written instead of becoming "", numbers
+# stay as written ("60", not 60.0) even in all-numeric columns, and an empty
+# Category gives plant_name "" instead of "nan".
+
+import csv
+import os
+import random
+
+import pandas as pd
+import pytest
+
+import data_1
+from bench_data_1 import DB_COLUMNS, clean_plant_name, per_cell_variety, strip_learn_more
+
+SOWING_CSV = os.path.join(data_1.__file__.rsplit(os.sep, 1)[0], "sowing_chart_wide_with_links_and_category.csv")
+
+
+# ---------- Fixture CSV ----------
+CATEGORIES = ["Tomato Seeds", "Asparagus Crowns", "  Garlic Bulbs seed ", "Rhubarb Crowns Seeds",
+              "Potato Tubers", "Seed", "Mint Cuttings ", "Bean", "Raspberry Canes?", ""]
+PIECES = ["Easy to grow.", "Learn more about tomatoes.", "learn  MORE about  x", "Sow  thinly.",
+          "Learn more about Learn more about y.. z.", "  double  spaces  ", "\ttab\t\tsep", "",
+          "60", "NA", "a.b", "learn more about it. Then learn more\nabout that."]
+COLUMNS = ["Category", "Variety", "Overview", "Quick_Method", "Quick_PlantSpacing", "Quick_PlantHeight",
+           "Quick_DaysUntilMaturity", "Preparation", "HowToSow", "HowToGrow", "HowToHarvest",
+           "SourceURL", "ImageURL"]     # Notes is missing on purpose
+
+
+def write_variety(path, rows: int = 300) -> None:
+    rnd = random.Random(5)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNS)
+        for i in range(rows):
+            row = [rnd.choice(CATEGORIES), f"Variety {i}"]
+            row += [" ".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 4))) for _ in COLUMNS[2:4]]
+            row += ["30cm" if i % 2 else "", "60" if i % 3 else "",
+                    "60" if i < 100 else rnd.choice(["75", "", "60-80 days"])]
+            row += [" ".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 4))) for _ in COLUMNS[7:11]]
+            row += [f"https://example.org/{i}", ""]
+            w.writerow(row)
+
+
+def intended_variety(path, old: pd.DataFrame) -> pd.DataFrame:
+    """The old rows with the cells the text read keeps as written put back."""
+    parsed = pd.read_csv(path)                                    # the old read
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)     # what was in the file
+    new = old.copy()
+    lost = parsed["Category"].isna()
+    new.loc[lost, "plant_name"] = raw.loc[lost, "Category"].apply(clean_plant_name)
+    for db_col, csv_col in DB_COLUMNS.items():
+        if csv_col not in raw.columns:
+            continue
+        clean = strip_learn_more if csv_col in data_1.VARIETY_TEXT_COLS else (lambda v: v)
+        # NA tokens parsed to NaN, and whole columns parsed to numbers
+        lost = parsed[csv_col].isna() | pd.api.types.is_numeric_dtype(parsed[csv_col])
+        new.loc[lost, db_col] = raw.loc[lost, csv_col].apply(clean)
+    return new.astype(object)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 100, 100000])
+def test_variety_matches_per_cell_cleaning(tmp_path, monkeypatch, chunk_rows):
+    path = tmp_path / "variety.csv"
+    write_variety(path)
+    monkeypatch.setattr(data_1, "SOWING_CSV", SOWING_CSV)
+    monkeypatch.setattr(data_1, "VARIETY_CSV", str(path))
+    monkeypatch.setattr(data_1, "VARIETY_CHUNK_ROWS", chunk_rows)
+
+    got = pd.concat(list(data_1.load_and_transform()["variety"]), ignore_index=True).astype(object)
+    old = per_cell_variety(path).astype(object)
+    pd.testing.assert_frame_equal(got, intended_variety(path, old))
+
+    # every cell that differs from the old load is one of the intended changes
+    changed = got.ne(old)
+    assert set(changed.columns[changed.any()]) == {"plant_name", "overview", "quick_method", "quick_plant_height",
+                                                   "preparation", "how_to_sow", "how_to_grow", "how_to_harvest"}
+    # NA tokens are kept
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    for db_col, csv_col in [("overview", "Overview"), ("quick_method", "Quick_Method")]:
+        na = raw[csv_col] == "NA"
+        assert na.any()
+        assert (old.loc[na, db_col] == "").all() and (got.loc[na, db_col] == "NA").all()
+    # all-numeric columns stay text
+    assert set(old["quick_plant_height"]) == {60.0, ""}
+    assert set(got["quick_plant_height"]) == {"60", ""}
+    assert got.loc[0, "quick_days_until_maturity"] == old.loc[0, "quick_days_until_maturity"] == "60"
+    # empty Category -> "" (was "nan")
+    assert set(old.loc[changed["plant_name"], "plant_name"]) == {"nan"}
+    assert set(got.loc[changed["plant_name"], "plant_name"]) == {""}
+
+
+def test_sowing_names_match_per_cell_cleaning(tmp_path, monkeypatch):
+    write_variety(tmp_path / "variety.csv", rows=1)
+    monkeypatch.setattr(data_1, "SOWING_CSV", SOWING_CSV)
+    monkeypatch.setattr(data_1, "VARIETY_CSV", str(tmp_path / "variety.csv"))
+    sow = data_1.load_and_transform()["sowing"]
+    raw = pd.read_csv(SOWING_CSV)["Plant"]
+    assert set(sow["plant_name"]) == {clean_plant_name(v) for v in raw}
+
+
+def test_text_only_blanks_non_strings():
+    s = pd.Series(["a", 1, 2.5, None, float("nan"), True, ""], dtype=object)
+    assert data_1._text_only(s).tolist() == ["a", "", "", "", "", "", ""]
+    assert data_1._text_only(pd.Series([1.0, 2.0])).tolist() == ["", ""]
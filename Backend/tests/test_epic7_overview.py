@@ -0,0 +1,137 @@
+# test_epic7_overview.py
+# epic7_plants_lists_create.py's one-pass build against the original per-plant
+# queries (four per plant, kept below as the reference) on fixture tables with
+# case variants, blank / tab-only / NULL cells and tied modes.
+
+import random
+from collections import Counter
+
+import pytest
+
+import epic7_plants_lists_create as epic7
+
+FIXTURE_SQL = """
+CREATE TABLE epic3_companion_planting (plant TEXT, neighbour TEXT, good_or_bad TEXT, why TEXT);
+CREATE TABLE sowing_plants (
+  plant_name TEXT PRIMARY KEY, plant_url TEXT,
+  jan SMALLINT, feb SMALLINT, mar SMALLINT, apr SMALLINT, may SMALLINT, jun SMALLINT,
+  jul SMALLINT, aug SMALLINT, sep SMALLINT, oct SMALLINT, nov SMALLINT, dec SMALLINT,
+  category_raw TEXT, categories TEXT[]);
+CREATE TABLE variety_details (
+  id BIGSERIAL PRIMARY KEY, plant_name TEXT, quick_position TEXT,
+  quick_plant_spacing TEXT, quick_hardiness_lifecycle TEXT);
+"""
+POSITIONS = ["Full sun", "Part shade, sheltered", "full sun", "Part shade", "  ", "\t", None]
+SPACINGS = ["30cm", "Approx 45 cm", "61 cm apart", "", " ", None, "n/a"]
+HARDINESS = ["Frost tender", "Half hardy annual", "Hardy perennial", "", None, "unknown"]
+CATEGORIES = [(["herb"], "Herb"), (["fruit", "vegetable"], "Fruit; Vegetable"), (None, "Flower, Bulb"),
+              ([], ""), (["Tree"], None)]
+
+
+def fill(cur, plants: int, varieties_per_plant: int, seed: int = 3) -> None:
+    rnd = random.Random(seed)
+    names = [f"Plant{i}" for i in range(plants)]
+    pairs = [(rnd.choice(names), rnd.choice(names)) for _ in range(plants * 3)]
+    pairs += [("All", "Plant1"), (" Plant2 ", "plant3"), ("", "Plant4")]
+    cur.executemany("INSERT INTO epic3_companion_planting VALUES (%s, %s, 'good', NULL)", pairs)
+    for i, name in enumerate(names):
+        if i % 7 == 6:
+            continue                                   # no sowing row
+        cats, raw = CATEGORIES[i % len(CATEGORIES)]
+        months = [rnd.choice([0, 1, 1, None]) for _ in range(12)]
+        cur.execute("INSERT INTO sowing_plants VALUES (%s, NULL, " + ", ".join(["%s"] * 12) + ", %s, %s)",
+                    [name if i % 3 else name.upper()] + months + [raw, cats])
+        for _ in range(rnd.randint(0, varieties_per_plant)):
+            cur.execute("INSERT INTO variety_details (plant_name, quick_position, quick_plant_spacing, "
+                        "quick_hardiness_lifecycle) VALUES (%s, %s, %s, %s)",
+                        (rnd.choice([name, name.lower()]), rnd.choice(POSITIONS),
+                         rnd.choice(SPACINGS), rnd.choice(HARDINESS)))
+
+
+def ties(values):
+    """All values sharing the highest count (the candidates of a tie-break)."""
+    if not values:
+        return {None}
+    c = Counter(values)
+    top = max(c.values())
+    return {k for k, v in c.items() if v == top}
+
+
+def reference_rows(cur):
+    """The original build: four queries per plant. Sunshine / hardiness are tie sets."""
+    cur.execute("""
+        WITH u AS (SELECT plant AS name FROM epic3_companion_planting
+                   UNION SELECT neighbour AS name FROM epic3_companion_planting)
+        SELECT DISTINCT TRIM(name) FROM u
+        WHERE name IS NOT NULL AND TRIM(name) <> '' AND LOWER(TRIM(name)) <> 'all'
+        ORDER BY 1 ASC;
+    """)
+    out = {}
+    for (pname,) in cur.fetchall():
+        cur.execute("""SELECT categories, category_raw, jan,feb,mar,apr,may,jun,jul,aug,sep,oct,nov,dec
+                       FROM sowing_plants WHERE LOWER(plant_name) = LOWER(%s) LIMIT 1;""", (pname,))
+        type_val, seasons_val = None, []
+        sp_row = cur.fetchone()
+        if sp_row:
+            type_val = epic7.pick_type_from_categories(sp_row[0], sp_row[1])
+            seasons_val = epic7.months_to_seasons([i + 1 for i, v in enumerate(sp_row[2:]) if v == 1])
+        cur.execute("""SELECT quick_position FROM variety_details WHERE LOWER(plant_name) = LOWER(%s)
+                       AND quick_position IS NOT NULL AND TRIM(quick_position) <> ''""", (pname,))
+        sunshine = ties([epic7.first_token_before_comma(r[0]) for r in cur.fetchall() if r[0]])
+        cur.execute("""SELECT quick_plant_spacing FROM variety_details WHERE LOWER(plant_name) = LOWER(%s)
+                       AND quick_plant_spacing IS NOT NULL AND TRIM(quick_plant_spacing) <> ''""", (pname,))
+        nums = [epic7.extract_cm_number(s) for s in (r[0] for r in cur.fetchall())]
+        nums = [n for n in nums if n is not None]
+        spacing = epic7.ceil_to_20(max(nums)) if nums else None
+        cur.execute("""SELECT quick_hardiness_lifecycle FROM variety_details WHERE LOWER(plant_name) = LOWER(%s)
+                       AND quick_hardiness_lifecycle IS NOT NULL AND TRIM(quick_hardiness_lifecycle) <> ''""",
+                    (pname,))
+        hard = [epic7.normalize_hardiness(r[0]) for r in cur.fetchall() if r[0]]
+        out[pname] = (type_val, sunshine, spacing, ties([h for h in hard if h]), seasons_val)
+    return out
+
+
+def built_rows(cur):
+    cur.execute("SELECT plant_name, type, sunshine, plant_spacing_cm, hardiness, seasons FROM epic7_plants_overview")
+    return {r[0]: r[1:] for r in cur.fetchall()}
+
+
+@pytest.fixture
+def tables(db):
+    with db.cursor() as cur:
+        cur.execute(FIXTURE_SQL)
+        fill(cur, plants=60, varieties_per_plant=8)
+    return db
+
+
+@pytest.mark.parametrize("tie_break", ["alpha", "random"])
+def test_one_pass_build_matches_per_plant_queries(tables, monkeypatch, tie_break):
+    monkeypatch.setattr(epic7, "TIE_BREAK", tie_break)
+    with tables.cursor() as cur:
+        expected = reference_rows(cur)
+        epic7.main()
+        got = built_rows(cur)
+
+    assert got.keys() == expected.keys()
+    assert any(len(e[1]) > 1 or len(e[3]) > 1 for e in expected.values())   # the fixture has ties
+    for name, (type_val, sun, spacing, hard, seasons) in expected.items():
+        g = got[name]
+        assert (g[0], g[2], g[4]) == (type_val, spacing, seasons), name
+        if tie_break == "alpha":
+            assert g[1] == min(sun, key=lambda v: (v is None, v)), name
+            assert g[3] == min(hard, key=lambda v: (v is None, v)), name
+        else:
+            assert g[1] in sun and g[3] in hard, name
+
+
+def test_alpha_tie_break_is_deterministic(monkeypatch):
+    monkeypatch.setattr(epic7, "TIE_BREAK", "alpha")
+    rows = [("Part sun", "10cm", "Hardy"), ("Full sun", "20cm", "Frost tender")] * 3
+    picks = {epic7.build_overview_row("X", None, rows[i:] + rows[:i])[:5] for i in range(len(rows))}
+    assert picks == {("X", None, "Full sun", 20, "Frost Hardy")}
+
+
+def test_unknown_tie_break_rejected(monkeypatch):
+    monkeypatch.setattr(epic7, "TIE_BREAK", "alphabetical")
+    with pytest.raises(SystemExit, match="TIE_BREAK"):
+        epic7.main()
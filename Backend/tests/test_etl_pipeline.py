@@ -0,0 +1,45 @@
+# test_etl_pipeline.py
+# etl_pipeline.py scheduling without running the scripts: a stage waits for its
+# upstreams and reruns whenever one of them ran.
+
+import threading
+import time
+
+import pytest
+
+import etl_pipeline
+
+
+@pytest.fixture
+def fake_run(tmp_path, monkeypatch):
+    """Stages "run" for 0.1 s each; returns the (stage, start, end) log."""
+    monkeypatch.setattr(etl_pipeline, "STATE_PATH", str(tmp_path / "state.json"))
+    monkeypatch.setattr(etl_pipeline, "_resolve", lambda p: p)            # every file "exists"
+    monkeypatch.setattr(etl_pipeline, "fingerprint", lambda state, stage: "same")
+    log, lock = [], threading.Lock()
+
+    def run_script(stage):
+        t0 = time.monotonic()
+        time.sleep(0.1)
+        with lock:
+            log.append((stage["name"], t0, time.monotonic()))
+        return {"code": 0, "output": "", "secs": 0.1}
+
+    monkeypatch.setattr(etl_pipeline, "run_script", run_script)
+    return log
+
+
+def test_data_2_runs_after_data_1_and_again_with_it(fake_run):
+    # both finished before with today's inputs, except data_1's changed since
+    etl_pipeline.save_state({"files": {}, "stages": {"data_1": {"fingerprint": "old"},
+                                                     "data_2": {"fingerprint": "same"}}})
+    results = etl_pipeline.run_pipeline(etl_pipeline.select_stages(["data_2"]))
+
+    assert {n: r["status"] for n, r in results.items()} == {"data_1": "ran", "data_2": "ran"}
+    (first, _, end_1), (second, start_2, _) = fake_run
+    assert (first, second) == ("data_1", "data_2") and start_2 >= end_1
+
+
+def test_epic7_waits_for_both_sowing_stages():
+    deps = {s["name"]: s["deps"] for s in etl_pipeline.select_stages(["epic7_plants_lists_create"])}
+    assert {"data_1", "data_2"} <= set(deps["epic7_plants_lists_create"])
@@ -0,0 +1,52 @@
+# test_fetch_metrics.py
+# fetch_metrics.py's JSON lines: one file handle for the whole run, every line
+# on disk as soon as it is written, closed by summary().
+
+import json
+import threading
+
+import pytest
+
+import fetch_metrics
+
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(fetch_metrics, "FETCH_METRICS_FILE", str(path))
+    monkeypatch.setattr(fetch_metrics, "FETCH_METRICS_EVERY", 3600.0)
+    opened = []
+
+    def counting_open(*args, **kwargs):
+        f = open(*args, **kwargs)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr(fetch_metrics, "open", counting_open, raising=False)
+    return path, opened
+
+
+def test_one_handle_flushed_and_closed(metrics_file):
+    path, opened = metrics_file
+    m = fetch_metrics.FetchMetrics()
+    m.start("test", 400)
+
+    def work(t):
+        for i in range(100):
+            m.species_done(f"t{t} s{i}", i)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    lines = [json.loads(x) for x in path.read_text(encoding="utf-8").splitlines()]   # before summary
+    assert [x["event"] for x in lines] == ["start"] + ["species"] * 400
+    assert len(opened) == 1 and not opened[0].closed
+
+    m.summary()
+    assert opened[0].closed
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 402 and json.loads(lines[-1])["event"] == "summary"
+    assert len(opened) == 1
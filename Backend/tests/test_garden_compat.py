@@ -0,0 +1,138 @@
+# test_garden_compat.py
+# /garden/compatibility (iteration3_backend.py) on the shipped companion CSV:
+# matrix semantics, degrees, incremental deltas, request validation and the
+# cache following table changes.
+
+import importlib
+import os
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import epic3_companion_planting as epic3
+
+CSV = os.path.join(os.path.dirname(epic3.__file__), epic3._default_csv_from_script())
+
+
+@pytest.fixture(scope="module")
+def api(api_schema):
+    rows = epic3.load_csv(CSV)
+    conn = api_schema()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO epic3_companion_planting VALUES (%(plant)s, %(neighbour)s, %(good_or_bad)s, %(why)s)",
+            rows,
+        )
+    conn.close()
+    mod = importlib.import_module("iteration3_backend")
+    mod.COMPAT_CHECK_S = 0
+    mod._compat.update(version=None, matrix=None)
+    return mod, rows
+
+
+def _pairs(rows):
+    """Expected pair relations straight from the CSV rows (bad wins, "All" expanded)."""
+    names = {r[k].lower() for r in rows for k in ("plant", "neighbour")} - {"all"}
+    explicit, every = {}, {}
+    for r in rows:
+        p, n, v = r["plant"].lower(), r["neighbour"].lower(), 1 if r["good_or_bad"] == "good" else -1
+        if p == "all":
+            every[n] = v
+        else:
+            explicit[(p, n)] = v
+    pairs = {}
+    for a in names:
+        for b in names:
+            if a >= b:
+                continue
+            vals = [explicit.get((a, b), every.get(b, 0)), explicit.get((b, a), every.get(a, 0))]
+            pairs[(a, b)] = -1 if -1 in vals else (1 if 1 in vals else 0)
+    return pairs
+
+
+def test_matrix_matches_csv(api):
+    mod, rows = api
+    names, index, pair = mod.get_compat_matrix()
+    assert (pair == pair.T).all() and not np.diagonal(pair).any()
+    for (a, b), v in _pairs(rows).items():
+        assert pair[index[a], index[b]] == v, (a, b)
+    # "All" rows are kept: Basil suits every plant without an explicit bad pair
+    basil = index["basil"]
+    assert (pair[basil] == 1).sum() > len(names) // 2
+
+
+def test_degrees_count_each_pair_once(api):
+    mod, rows = api
+    plants = ["Tomato", "Basil", "Carrot", "Dill", "Bulb Onion"]
+    r = TestClient(mod.app).post("/garden/compatibility", json={"plants": plants}).json()
+    expected = _pairs(rows)
+    keys = [p.lower() for p in plants]
+    good = sum(expected[tuple(sorted((a, b)))] == 1 for i, a in enumerate(keys) for b in keys[i + 1:])
+    bad = sum(expected[tuple(sorted((a, b)))] == -1 for i, a in enumerate(keys) for b in keys[i + 1:])
+    assert (r["good_relation_count"], r["bad_relation_count"]) == (good, bad)
+    assert sum(r["good_degree"].values()) == 2 * good
+    assert sum(r["bad_degree"].values()) == 2 * bad
+    assert r["score"] == round((good - bad) / 10, 4)
+
+
+def test_incremental_delta_matches_full(api):
+    mod, _ = api
+    client = TestClient(mod.app)
+    names, _, _ = mod.get_compat_matrix()
+    rnd = random.Random(7)
+    current = rnd.sample(names, 8)
+    prev = client.post("/garden/compatibility", json={"plants": current}).json()
+    for _ in range(20):
+        removed = rnd.sample(current, rnd.randint(0, 2))
+        added = rnd.sample([n for n in names if n not in current], rnd.randint(0, 3))
+        d = client.post("/garden/compatibility",
+                        json={"previous": current, "added": added, "removed": removed}).json()
+        current = d["plants"]
+        full = client.post("/garden/compatibility", json={"plants": current}).json()
+        for kind in ("good", "bad"):
+            assert prev[f"{kind}_relation_count"] + d[f"{kind}_relation_count_delta"] == full[f"{kind}_relation_count"]
+            deg = dict(prev[f"{kind}_degree"])
+            for n, v in d[f"{kind}_degree_delta"].items():
+                deg[n] = deg.get(n, 0) + v
+            assert {n: deg.get(n, 0) for n in current} == full[f"{kind}_degree"]
+        prev = full
+
+
+def test_unknown_names_reported(api):
+    mod, _ = api
+    r = TestClient(mod.app).post("/garden/compatibility", json={
+        "previous": ["Tomato", "Nope"], "added": ["Basil", "Zzz"], "removed": ["Gone"]}).json()
+    assert r["unknown"] == {"previous": ["Nope"], "added": ["Zzz"], "removed": ["Gone"]}
+    assert r["plants"] == ["Tomato", "Basil"]
+
+
+@pytest.mark.parametrize("body", [
+    {"plants": "Tomato"},
+    {"plants": ["Tomato", 3]},
+    {"previous": ["Tomato"], "added": "Basil"},
+])
+def test_bad_bodies_rejected(api, body):
+    mod, _ = api
+    assert TestClient(mod.app).post("/garden/compatibility", json=body).status_code == 422
+
+
+def test_matrix_follows_table_changes(api):
+    mod, _ = api
+    client = TestClient(mod.app)
+    before = client.post("/garden/compatibility", json={"plants": ["Tomato", "Zucchinix"]}).json()
+    assert before["unknown"] == ["Zucchinix"]
+
+    conn = epic3.psycopg2.connect(**epic3.DB_CONFIG)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO epic3_companion_planting VALUES ('Tomato', 'Zucchinix', 'bad', 'test')")
+    try:
+        after = client.post("/garden/compatibility", json={"plants": ["Tomato", "Zucchinix"]}).json()
+        assert after["unknown"] == [] and after["bad_relation_count"] == 1
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM epic3_companion_planting WHERE neighbour = 'Zucchinix'")
+        conn.close()
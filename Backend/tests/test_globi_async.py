@@ -0,0 +1,136 @@
+# test_globi_async.py
+# globi_async.py without the network: the token bucket's waiting and the
+# bounded, in-order species window of run(); and against mock_sources.py, the
+# same rows per species as globiapi.fetch_interactions_for_one().
+
+import asyncio
+import time
+
+import pytest
+
+import bench_fetchers as bench  # mock server helpers
+import fetch_metrics
+import globi_async
+import globiapi
+import http_cache
+import taxon_names
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_file(monkeypatch):
+    monkeypatch.setattr(fetch_metrics, "FETCH_METRICS_FILE", "")
+
+
+def test_bucket_waits_outside_its_lock():
+    async def scenario():
+        bucket = globi_async.TokenBucket(rate=10, burst=1)
+        await bucket.acquire()                       # the one saved-up token
+        waiters = [asyncio.create_task(bucket.acquire()) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        assert not bucket._lock.locked()             # everyone is sleeping, nobody holds it
+        t0 = time.monotonic()
+        await asyncio.gather(*waiters)
+        return time.monotonic() - t0
+
+    # three more tokens at 10/s: about 0.3 s (minus the 0.02 s already waited)
+    assert 0.2 <= asyncio.run(scenario()) < 0.6
+
+
+def test_pause_applies_to_sleeping_waiters():
+    async def scenario():
+        bucket = globi_async.TokenBucket(rate=100, burst=1)
+        await bucket.acquire()
+        t0 = time.monotonic()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        bucket.pause(0.3)                            # a 429 while the waiter sleeps
+        await waiter
+        return time.monotonic() - t0
+
+    assert asyncio.run(scenario()) >= 0.3
+
+
+class FakeOut:
+    def __init__(self):
+        self.committed = []
+        self.rows = {}
+
+    def __contains__(self, name):
+        return False
+
+    def commit(self, name, rows):
+        self.committed.append(name)
+        self.rows[name] = rows
+
+
+def test_run_keeps_order_and_bounds_the_window(monkeypatch):
+    monkeypatch.setattr(globi_async, "GLOBI_SPECIES_CONCURRENCY", 2)
+    names = [f"Plant{i}" for i in range(30)]
+    out = FakeOut()
+    started = []
+    ahead = []
+
+    async def fetch(self, plant):
+        started.append(plant)
+        ahead.append(len(started) - len(out.committed))
+        await asyncio.sleep(0.2 if plant == "Plant0" else 0.001)   # the first species is slow
+        if plant == "Plant5":
+            raise RuntimeError("boom")
+        return [[plant, "x"]]
+
+    monkeypatch.setattr(globi_async.GlobiClient, "fetch_interactions_for_one", fetch)
+    asyncio.run(globi_async.run(names, out))
+
+    assert out.committed == [n for n in names if n != "Plant5"]   # input order, failure skipped
+    assert sorted(started) == sorted(names)
+    assert max(ahead) <= 2 * 2                       # never more than the window in flight
+
+
+# ---------- Against mock_sources.py ----------
+@pytest.fixture(scope="module")
+def mock():
+    pytest.importorskip("uvicorn")
+    mp = pytest.MonkeyPatch()
+    mp.setenv("MOCK_LATENCY_MS", "2")
+    mp.setenv("MOCK_JITTER_MS", "0")
+    port = bench.free_port()
+    proc = bench.start_mock(port)
+    yield f"http://127.0.0.1:{port}"
+    proc.terminate()
+    proc.wait(timeout=10)
+    mp.undo()
+
+
+@pytest.fixture
+def globi_mock(mock, tmp_path, monkeypatch):
+    """Both fetchers pointed at the mock: no HTTP cache, fresh synonym cache, fast bucket."""
+    monkeypatch.setattr(globiapi, "API_BASE", f"{mock}/globi")
+    monkeypatch.setattr(globiapi, "SLEEP_BETWEEN_PAGES", 0)
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_MODE", "off")
+    monkeypatch.setattr(taxon_names, "TAXON_CACHE_PATH", str(tmp_path / "taxon_names.sqlite"))
+    monkeypatch.setattr(taxon_names, "_conn", None)
+    monkeypatch.setattr(globi_async, "GLOBI_RATE", 1000)
+    monkeypatch.setattr(globi_async, "GLOBI_BURST", 100)
+    yield
+    if taxon_names._conn is not None:
+        taxon_names._conn.close()
+
+
+@pytest.mark.parametrize("always_b1", [False, True])
+def test_same_rows_as_globiapi(globi_mock, monkeypatch, always_b1):
+    # 6 species: empty types, short lists and two-page (1500 row) types
+    names = bench.species_names(6)
+    monkeypatch.setattr(globiapi, "ALWAYS_TAXON_FALLBACK", always_b1)
+
+    monkeypatch.setattr(globiapi, "VARIANTS", globiapi.VariantStats())
+    expected = {name: globiapi.fetch_interactions_for_one(name) for name in names}
+
+    monkeypatch.setattr(globiapi, "VARIANTS", globiapi.VariantStats())
+    out = FakeOut()
+    asyncio.run(globi_async.run(names, out))
+
+    assert out.committed == names
+    assert out.rows == expected
+    assert sum(len(rows) > globiapi.PAGE_LIMIT for rows in expected.values()) >= 3
+    assert all(expected.values())
+    assert all(r[0] == name for name, rows in expected.items() for r in rows)
@@ -0,0 +1,74 @@
+# test_image_thumbs.py
+# image_thumbs.py: bad THUMB_* settings only stop the script (not the APIs
+# importing it), image_cache is picked up by a running backend once it exists,
+# and 'ok' rows whose files are gone are rendered again.
+
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import MetaData, create_engine
+
+import image_thumbs
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+@pytest.mark.parametrize("env", [{"THUMB_FORMAT": "gif"}, {"THUMB_LIST_WIDTH": "500"}])
+def test_bad_settings_stop_main_not_import(env):
+    code = "import image_thumbs; image_thumbs.main()"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=image_thumbs.__file__.rsplit(os.sep, 1)[0],
+                          env={**os.environ, **env}, capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert "Traceback" not in proc.stderr and "THUMB_" in proc.stderr   # SystemExit from main()
+    imported = subprocess.run([sys.executable, "-c", "import image_thumbs"],
+                              cwd=image_thumbs.__file__.rsplit(os.sep, 1)[0], env={**os.environ, **env})
+    assert imported.returncode == 0
+
+
+def test_cache_table_found_after_backend_start(db, monkeypatch):
+    engine = create_engine(os.environ["DB_URL"], future=True)
+    cache = image_thumbs.CacheTable(MetaData(), engine)
+    assert cache.get() is None
+    with db.cursor() as cur:
+        cur.execute(f"CREATE TABLE {image_thumbs.CACHE_TABLE} (source_url TEXT PRIMARY KEY, "
+                    "content_hash TEXT, status TEXT NOT NULL, error TEXT)")
+    assert cache.get() is None                               # not looked for again yet
+    monkeypatch.setattr(image_thumbs, "CACHE_RECHECK_S", 0.0)
+    assert cache.get() is not None and "content_hash" in cache.get().c
+    engine.dispose()
+
+
+def test_missing_files_rendered_again(db, tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    for i, color in enumerate(["red", "blue"]):
+        PIL.new("RGB", (800, 600), color).save(src / f"img{i}.png")
+    with db.cursor() as cur:
+        cur.execute("CREATE TABLE species_information_dataset (image_url TEXT);"
+                    "CREATE TABLE variety_details (image_url TEXT);"
+                    "INSERT INTO species_information_dataset VALUES ('http://x/img0.png'), ('http://x/gone.png');"
+                    "INSERT INTO variety_details VALUES ('http://x/img1.png');")
+    thumbs = tmp_path / "thumbs"
+    monkeypatch.setattr(image_thumbs, "THUMB_DIR", str(thumbs))
+    monkeypatch.setattr(image_thumbs, "THUMB_WORKERS", 1)
+    monkeypatch.setattr(image_thumbs, "make_fetcher", lambda: image_thumbs.DirFetcher(str(src)))
+
+    def cache_rows():
+        with db.cursor() as cur:
+            cur.execute(f"SELECT source_url, status, content_hash FROM {image_thumbs.CACHE_TABLE} ORDER BY 1")
+            return cur.fetchall()
+
+    image_thumbs.main()
+    first = cache_rows()
+    assert [r[1] for r in first] == ["failed", "ok", "ok"]
+    hashes = [r[2] for r in first if r[1] == "ok"]
+    assert all(image_thumbs.has_thumbs(h) for h in hashes)
+
+    for h in hashes[:1]:                                     # one image's files lost
+        for w in image_thumbs.THUMB_WIDTHS:
+            image_thumbs.thumb_path(h, w).unlink()
+    image_thumbs.main()
+    assert cache_rows() == first
+    assert all(image_thumbs.has_thumbs(h) for h in hashes)
@@ -0,0 +1,86 @@
+# test_load_to_pg.py
+# load_to_pg.main() in incremental mode against a real server: the upserts of
+# the keyed tables are applied in the transaction that swaps the rebuilt
+# observations table in, so a failed swap leaves them unapplied too.
+
+import csv
+
+import pytest
+
+import load_to_pg
+
+REL = [("Malus domestica", "Apis mellifera", "visitsFlowersOf"),
+       ("Malus domestica", "Bombus terrestris", "visitsFlowersOf")]
+SPECIES = [("Apis mellifera", "Animalia", "European Honey Bee"),
+           ("Bombus terrestris", "Animalia", "Buff-tailed Bumblebee")]
+OBS = [("Apis mellifera", "-37.8"), ("Bombus terrestris", "-37.9")]
+
+
+def write_csv(path, header, rows) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+@pytest.fixture
+def load(db, tmp_path, monkeypatch):
+    """write(rel, species, obs) the three CSVs; run(mode) loads them."""
+    paths = {name: tmp_path / f"{name}.csv" for name in
+             ("relationship_dataset", "species_information_dataset", "species_occurrences_cleaned")}
+    monkeypatch.setattr(load_to_pg, "REL_CSV", str(paths["relationship_dataset"]))
+    monkeypatch.setattr(load_to_pg, "SPECIES_CSV", str(paths["species_information_dataset"]))
+    monkeypatch.setattr(load_to_pg, "OBS_CSV", str(paths["species_occurrences_cleaned"]))
+    monkeypatch.setattr(load_to_pg, "LOAD_WORKERS", 1)
+
+    class Load:
+        @staticmethod
+        def write(rel, species, obs):
+            write_csv(paths["relationship_dataset"],
+                      ["plant_scientific_name", "animal_taxon_name", "interaction_type_raw"], rel)
+            write_csv(paths["species_information_dataset"],
+                      ["animal_taxon_name", "Kingdom", "Vernacular Name"], species)
+            write_csv(paths["species_occurrences_cleaned"], ["animal_taxon_name", "decimalLatitude"], obs)
+
+        @staticmethod
+        def run(mode):
+            monkeypatch.setattr(load_to_pg, "LOAD_MODE", mode)
+            load_to_pg.main()
+
+    return Load
+
+
+def live(db):
+    with db.cursor() as cur:
+        cur.execute("SELECT animal_taxon_name, \"Vernacular Name\" FROM species_information_dataset ORDER BY 1")
+        species = cur.fetchall()
+        cur.execute("SELECT count(*) FROM relationship_dataset")
+        rel = cur.fetchone()[0]
+        cur.execute("SELECT count(*) FROM species_occurrences_cleaned")
+        obs = cur.fetchone()[0]
+    return species, rel, obs
+
+
+def test_incremental_changes_go_live_with_the_swap(db, load, capsys):
+    load.write(REL, SPECIES, OBS)
+    load.run("copy")
+    before = live(db)
+    assert before == ([(n, v) for n, _, v in SPECIES], 2, 2)
+
+    # both keyed tables change, and the rebuilt observations table cannot be swapped in
+    species = [SPECIES[0][:2] + ("Honey Bee",), SPECIES[1], ("Vespula germanica", "Animalia", "European Wasp")]
+    load.write(REL + [("Malus domestica", "Vespula germanica", "visitsFlowersOf")], species, OBS * 2)
+    with db.cursor() as cur:
+        cur.execute("CREATE VIEW obs_view AS SELECT * FROM species_occurrences_cleaned;")
+    with pytest.raises(SystemExit, match="obs_view"):
+        load.run("incremental")
+    assert live(db) == before
+
+    with db.cursor() as cur:
+        cur.execute("DROP VIEW obs_view;")
+    capsys.readouterr()
+    load.run("incremental")
+    out = capsys.readouterr().out
+    assert "[species] incremental: changed=2 (+1 ~1 -0, unchanged=1)" in out
+    assert "[rel] incremental: changed=1 (+1 ~0 -0, unchanged=2)" in out
+    assert live(db) == ([(n, v) for n, _, v in species], 3, 4)
@@ -0,0 +1,99 @@
+# test_occurrence_pg.py
+# occurrence_pg.PgOccurrenceSink against a real server: pages, resume after a
+# restart, publishing a species, and index-only plans for the per-species SQL.
+
+import re
+
+import psycopg2.extensions
+
+from occurrence_pg import CURSOR_TABLE, DONE_TABLE, INGEST_TABLE, LIVE_TABLE, PgOccurrenceSink
+
+HEADER = ["animal_taxon_name", "decimalLatitude", "decimalLongitude", "eventDate", "occurrenceID",
+          "recordedBy", "locality", "stateProvince", "country", "dataResourceName", "basisOfRecord"]
+
+
+def page(species: str, n: int, start: int = 0):
+    return [[species, f"-37.{i:04d}", "144.9", "2020-01-02T03:04:05Z", f"id{i}", "me", "", "VIC",
+             "AU", "src", "HUMAN_OBSERVATION"] for i in range(start, start + n)]
+
+
+def publish(sink, species: str, pages: int = 2, per_page: int = 50) -> int:
+    for p in range(pages):
+        sink.copy_page(species, page(species, per_page, p * per_page),
+                       {"start": (p + 1) * per_page, "kept": (p + 1) * per_page, "seen": ""})
+    return sink.finish(species)
+
+
+class LoggingCursor(psycopg2.extensions.cursor):
+    log = []
+
+    def execute(self, query, vars=None):
+        LoggingCursor.log.append(self.mogrify(query, vars).decode())
+        return super().execute(query, vars)
+
+
+def test_pages_resume_and_publish(db):
+    with PgOccurrenceSink(HEADER) as sink:
+        assert sink.has_key
+        assert publish(sink, "Apis mellifera") == 100
+        assert publish(sink, "Apis mellifera") == 100        # re-publishing replaces, never duplicates
+        sink.copy_page("Bombus terrestris", page("Bombus terrestris", 10), {"start": 10, "kept": 10, "seen": "x"})
+        sink.copy_page("Vespa crabro", page("Vespa crabro", 10),
+                       {"start": 10, "kept": 10, "seen": "y", "thin": "grid:1000:year"})
+
+    with PgOccurrenceSink(HEADER) as sink:                    # restart: cursor and ingest rows kept
+        assert sink.done() == {"Apis mellifera"}
+        assert sink.load_cursor("Bombus terrestris") == {"start": 10, "kept": 10, "seen": "x", "thin": "exact"}
+        sink.copy_page("Bombus terrestris", page("Bombus terrestris", 5, 10), {"start": 15, "kept": 15, "seen": "y"})
+        assert sink.finish("Bombus terrestris") == 15
+        assert sink.load_cursor("Vespa crabro")["thin"] == "grid:1000:year"   # alalocation checks it
+        assert sink.load_cursor("Bombus terrestris") is None
+
+    with db.cursor() as cur:
+        cur.execute(f'SELECT animal_taxon_name, animal_key, count(*), min("eventDate") FROM {LIVE_TABLE} '
+                    "GROUP BY 1, 2 ORDER BY 1")
+        assert cur.fetchall() == [
+            ("Apis mellifera", "apis mellifera", 100, 1577934245000),
+            ("Bombus terrestris", "bombus terrestris", 15, 1577934245000),
+        ]
+        cur.execute(f"SELECT DISTINCT animal_taxon_name FROM {INGEST_TABLE}")
+        assert cur.fetchall() == [("Vespa crabro",)]           # only the unfinished species
+
+
+def test_cursor_without_ingest_rows_starts_over(db):
+    with PgOccurrenceSink(HEADER) as sink:
+        sink.copy_page("Apis mellifera", page("Apis mellifera", 10), {"start": 10, "kept": 10, "seen": ""})
+    with db.cursor() as cur:
+        cur.execute(f"TRUNCATE {INGEST_TABLE}")                 # what a crash does to an UNLOGGED table
+    with PgOccurrenceSink(HEADER) as sink:
+        assert sink.load_cursor("Apis mellifera") is None
+
+
+def test_per_species_statements_use_indexes(db):
+    species = [f"Benchgenus species{i:04d}" for i in range(300)]
+    with PgOccurrenceSink(HEADER) as sink:
+        for name in species:
+            publish(sink, name, pages=1, per_page=100)
+        for name in species[:150]:                           # in-flight species with saved pages
+            sink.copy_page(name, page(name, 100), {"start": 100, "kept": 100, "seen": ""})
+    with db.cursor() as cur:
+        cur.execute(f"ANALYZE {LIVE_TABLE}; ANALYZE {INGEST_TABLE}; ANALYZE {CURSOR_TABLE}; ANALYZE {DONE_TABLE};")
+
+    LoggingCursor.log = []
+    with PgOccurrenceSink(HEADER) as sink:
+        sink.conn.cursor_factory = LoggingCursor
+        sink.finish(species[0])
+    statements = [q for q in LoggingCursor.log if q.lstrip().startswith(("DELETE", "INSERT"))]
+    assert any("animal_key = 'benchgenus species0000'" in q for q in statements)
+
+    plans = []
+    with db.cursor() as cur:
+        cur.execute("BEGIN")
+        for q in statements:
+            cur.execute("EXPLAIN " + q)
+            plans.append("\n".join(r[0] for r in cur.fetchall()))
+        cur.execute("ROLLBACK")
+    # the big tables; the cursor table only holds the species in flight and may be scanned
+    for q, plan in zip(statements, plans):
+        assert not {LIVE_TABLE, INGEST_TABLE} & set(re.findall(r"Seq Scan on (\w+)", plan)), (q, plan)
+
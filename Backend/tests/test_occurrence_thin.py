@@ -0,0 +1,60 @@
+# test_occurrence_thin.py
+# occurrence_thin.py's packed seen-state: round trips, and a saved state is
+# refused under other THIN_BLOOM_* settings instead of silently misreading it.
+
+import pytest
+
+import occurrence_thin as thin
+
+
+@pytest.fixture
+def bloom(monkeypatch):
+    monkeypatch.setattr(thin, "THIN_BLOOM_BITS", 1001)        # not a whole number of bytes
+    monkeypatch.setattr(thin, "THIN_BLOOM_HASHES", 5)
+
+
+KEYS = [thin.coord_key(f"-37.{i:04d}", "144.9") for i in range(40)]
+
+
+def test_set_round_trip():
+    seen = thin.new_seen()
+    seen.update(KEYS)
+    assert thin.unpack_seen(thin.pack_seen(seen)) == set(KEYS)
+
+
+def test_bloom_round_trip(bloom):
+    seen = thin.new_seen()
+    for k in KEYS:
+        seen.add(k)
+    back = thin.unpack_seen(thin.pack_seen(seen))
+    assert (back.bits, back.hashes, back.count) == (1001, 5, len(KEYS))
+    assert all(k in back for k in KEYS)
+    assert back.data == seen.data
+
+
+def test_signature_names_the_bloom_settings(monkeypatch):
+    assert thin.signature() == "exact"
+    sigs = set()
+    for bits, hashes in [(1001, 5), (1001, 7), (2048, 5)]:
+        monkeypatch.setattr(thin, "THIN_BLOOM_BITS", bits)
+        monkeypatch.setattr(thin, "THIN_BLOOM_HASHES", hashes)
+        sigs.add(thin.signature())
+    assert len(sigs) == 3 and "exact" not in sigs
+
+
+@pytest.mark.parametrize("bits, hashes", [(1001, 7), (2048, 5), (0, 5)])
+def test_bloom_state_refused_under_other_settings(bloom, monkeypatch, bits, hashes):
+    seen = thin.new_seen()
+    seen.add(KEYS[0])
+    packed = thin.pack_seen(seen)
+    monkeypatch.setattr(thin, "THIN_BLOOM_BITS", bits)
+    monkeypatch.setattr(thin, "THIN_BLOOM_HASHES", hashes)
+    with pytest.raises(ValueError):
+        thin.unpack_seen(packed)
+
+
+def test_older_bloom_format_and_key_set_refused(bloom):
+    with pytest.raises(ValueError):
+        thin.unpack_seen("bloom:3:AAAA")                      # no bits / hashes saved
+    with pytest.raises(ValueError):
+        thin.unpack_seen(thin.pack_seen(set(KEYS)))          # a set, but a filter is configured
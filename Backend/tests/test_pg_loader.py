@@ -0,0 +1,121 @@
+# test_pg_loader.py
+# pg_loader.swap_in against a real server: readers running through repeated
+# swaps, lock-timeout retries and dependents that must not be dropped.
+
+import threading
+import time
+
+import pytest
+
+import pg_loader
+from pg_loader import analyze_staging, drop_staging, staging_name, swap_in
+
+
+def build(conn, table: str, rows: int) -> None:
+    with conn.cursor() as cur:
+        drop_staging(cur, table)
+        cur.execute(f"CREATE TABLE public.{staging_name(table)} (id INTEGER PRIMARY KEY, v TEXT);")
+        cur.execute(f"INSERT INTO public.{staging_name(table)} SELECT g, 'x' || g FROM generate_series(1, %s) g;",
+                    (rows,))
+        cur.execute(f"CREATE INDEX ON public.{staging_name(table)} (v);")
+        analyze_staging(cur, table)
+    conn.commit()
+
+
+def test_readers_see_old_or_new_table_during_swaps(db, pg):
+    conn = pg()
+    build(conn, "t", 1000)
+    swap_in(conn, ["t"])
+
+    stop = threading.Event()
+    counts, failures, slowest = [], [], [0.0]
+
+    def reader():
+        c = pg()
+        c.autocommit = True
+        with c.cursor() as cur:
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    cur.execute("SELECT count(*), max(id) FROM t")
+                    counts.append(cur.fetchone())
+                except Exception as e:  # a missing / half-built table would land here
+                    failures.append(e)
+                slowest[0] = max(slowest[0], time.perf_counter() - t0)
+        c.close()
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for r in readers:
+        r.start()
+    try:
+        for i in range(1, 11):
+            build(conn, "t", 1000 + i)
+            swap_in(conn, ["t"])
+    finally:
+        stop.set()
+        for r in readers:
+            r.join()
+        conn.close()
+
+    assert not failures
+    assert counts and all(n == m and 1000 <= n <= 1010 for n, m in counts)
+    assert slowest[0] < 2.0
+    with db.cursor() as cur:
+        cur.execute("SELECT relname FROM pg_class WHERE relname LIKE 't%%' AND relkind IN ('r', 'i')")
+        names = {r[0] for r in cur.fetchall()}
+    assert names == {"t", "t_pkey", "t_v_idx"}
+
+
+def test_swap_waits_for_a_long_reader(db, pg, monkeypatch):
+    monkeypatch.setattr(pg_loader, "SWAP_LOCK_TIMEOUT_MS", 100)
+    conn = pg()
+    build(conn, "t", 10)
+    swap_in(conn, ["t"])
+    build(conn, "t", 20)
+
+    holder = pg()
+    with holder.cursor() as cur:
+        cur.execute("SELECT count(*) FROM t")   # transaction stays open: ACCESS SHARE held
+    threading.Timer(0.8, holder.commit).start()
+    t0 = time.perf_counter()
+    swap_in(conn, ["t"])                      # times out, retries, then succeeds
+    assert time.perf_counter() - t0 >= 0.8
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM t")
+        assert cur.fetchone()[0] == 20
+    holder.close()
+    conn.close()
+
+
+def test_swap_refuses_to_drop_dependents(db, pg):
+    conn = pg()
+    build(conn, "t", 10)
+    swap_in(conn, ["t"])
+    with conn.cursor() as cur:
+        cur.execute("CREATE VIEW t_view AS SELECT id FROM t;")
+    conn.commit()
+    build(conn, "t", 20)
+
+    with pytest.raises(SystemExit, match="t_view"):
+        swap_in(conn, ["t"])
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM t_view")
+        assert cur.fetchone()[0] == 10        # live table and view untouched
+    conn.close()
+
+
+def test_swap_keeps_foreign_keys_between_swapped_tables(db, pg):
+    conn = pg()
+    for _ in range(2):
+        with conn.cursor() as cur:
+            for t in ("child", "parent"):
+                drop_staging(cur, t)
+            cur.execute(f"CREATE TABLE {staging_name('parent')} (id INTEGER PRIMARY KEY);")
+            cur.execute(f"CREATE TABLE {staging_name('child')} ("
+                        f"id INTEGER REFERENCES {staging_name('parent')}(id));")
+        conn.commit()
+        swap_in(conn, ["child", "parent"])
+    with conn.cursor() as cur:
+        cur.execute("SELECT confrelid::regclass::text FROM pg_constraint WHERE contype = 'f'")
+        assert [r[0] for r in cur.fetchall()] == ["parent"]
+    conn.close()
@@ -0,0 +1,50 @@
+# test_taxon_names.py
+# taxon_names.name_keys(): tables joined on a name are all matched on their key
+# columns, or all on lower(name) when one of them was loaded without its key.
+
+import os
+
+from sqlalchemy import Column, MetaData, Table, Text, create_engine, func, select
+
+import taxon_names
+
+NAME = "Apis mellifera Linnaeus, 1758"
+
+
+def tables(metadata, rel_has_key: bool):
+    species = Table("species", metadata, Column("animal_taxon_name", Text), Column("animal_key", Text))
+    rel_cols = [Column("animal_taxon_name", Text)] + ([Column("animal_key", Text)] if rel_has_key else [])
+    return species, Table("rel", metadata, *rel_cols)
+
+
+def test_all_key_columns():
+    species, rel = tables(MetaData(), rel_has_key=True)
+    (s_key, r_key), to_key = taxon_names.name_keys((species, "animal_taxon_name"), (rel, "animal_taxon_name"))
+    assert s_key is species.c.animal_key and r_key is rel.c.animal_key
+    assert to_key(NAME) == "apis mellifera"
+
+
+def test_one_missing_key_column_lowers_both_sides(capsys):
+    species, rel = tables(MetaData(), rel_has_key=False)
+    (s_key, r_key), to_key = taxon_names.name_keys((species, "animal_taxon_name"), (rel, "animal_taxon_name"))
+    assert str(s_key) == str(func.lower(species.c.animal_taxon_name))
+    assert str(r_key) == str(func.lower(rel.c.animal_taxon_name))
+    assert to_key(NAME) == NAME.lower()
+    assert "rel.animal_key" in capsys.readouterr().out
+
+
+def test_mixed_tables_still_join(db):
+    with db.cursor() as cur:
+        cur.execute("CREATE TABLE species (animal_taxon_name TEXT, animal_key TEXT);"
+                    "CREATE TABLE rel (animal_taxon_name TEXT);"
+                    "INSERT INTO species VALUES (%s, %s); INSERT INTO rel VALUES (%s);",
+                    (NAME, taxon_names.canonical_key(NAME), NAME))
+    engine = create_engine(os.environ["DB_URL"], future=True)
+    metadata = MetaData()
+    species = Table("species", metadata, autoload_with=engine)
+    rel = Table("rel", metadata, autoload_with=engine)
+    (s_key, r_key), to_key = taxon_names.name_keys((species, "animal_taxon_name"), (rel, "animal_taxon_name"))
+    stmt = select(func.count()).select_from(species.join(rel, s_key == r_key)).where(s_key == to_key(NAME))
+    with engine.connect() as conn:
+        assert conn.execute(stmt).scalar() == 1
+    engine.dispose()